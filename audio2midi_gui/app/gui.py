@@ -5,6 +5,7 @@ import sys
 import os
 import json
 import logging
+import threading
 from datetime import datetime
 from pathlib import Path
 from PySide6.QtWidgets import (
@@ -13,20 +14,31 @@ from PySide6.QtWidgets import (
     QCheckBox, QDialog, QFormLayout, QLineEdit, QDialogButtonBox, QListWidget,
     QListWidgetItem, QSplitter, QFrame
 )
-from PySide6.QtCore import Qt, QThread, Signal, QTimer
+from PySide6.QtCore import Qt, Signal, QTimer
 from PySide6.QtGui import QKeySequence, QShortcut, QAction
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import librosa
-import pygame.midi
-import multiprocessing as mp
-from backend.separation import separate
-from backend.instrument_detect import analyze_stem, choose_transcription_model
-from backend.transcribe import transcribe_stem_to_midi
+from functools import partial
+from backend import registry, metrics
+from backend.separation import separate_resident, default_device
+from backend.scheduler import Scheduler, Task, stem_task, stem_result
+from backend.instrument_detect import detect_instruments
+from backend.shm import SharedAudioPool
+from backend.peaks import load_peaks
+from backend.threads import plan, POLICIES
 from backend.midi_writer import write_midi_from_notes
+from backend.cache import StemCache, TranscriptionCache
 
 SETTINGS_FILE = Path.home() / "audio2midi_settings.json"
 LOGS_DIR = Path("logs")
+# Per-stage timings of every run (AUDIO2MIDI_METRICS overrides); summarized as .prom on exit
+METRICS_FILE = LOGS_DIR / "metrics.jsonl"
+
+# Transcription combo box entries -> transcribe_stem_to_midi model names
+TRANSCRIPTION_MODELS = {
+    "Auto": "auto",
+    "OnsetsFrames": "onsets_frames",
+    "CREPE": "crepe_monophonic",
+    "MT3": "mt3",
+}
 
 # Debug logging
 DEBUG = os.environ.get('DEBUG', '0') == '1'
@@ -34,123 +46,12 @@ if DEBUG:
     logging.basicConfig(filename=LOGS_DIR / f"debug_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log",
                         level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class JobQueue:
-    def __init__(self):
-        self.queue = []
-        self.running = False
-
-    def add_job(self, func, *args, callback=None):
-        self.queue.append((func, args, callback))
-
-    def start(self):
-        if not self.running:
-            self.running = True
-            self.process_next()
-
-    def process_next(self):
-        if self.queue:
-            func, args, callback = self.queue.pop(0)
-            worker = WorkerThread(func, *args)
-            worker.finished.connect(lambda result: self.on_job_done(result, callback))
-            worker.start()
-        else:
-            self.running = False
-
-    def on_job_done(self, result, callback):
-        if callback:
-            callback(result)
-        self.process_next()
-
-    def cancel(self):
-        self.queue.clear()
-        self.running = False
-
-class Orchestrator:
-    def __init__(self, gui):
-        self.gui = gui
-        self.pool = mp.Pool(mp.cpu_count())
-        self.gpu_lock = mp.Lock()
-
-    def transcribe_all_stems(self, stems, model, device):
-        results = []
-        gpu_jobs = []
-        cpu_jobs = []
-
-        for stem in stems:
-            stem_path = stem['path']
-            midi_path = Path(stem_path).with_suffix('.mid')
-            if midi_path.exists() and not self.gui.force_rerun:
-                self.gui.log(f"Cached: {midi_path}")
-                continue
-
-            instrument = self.detect_instrument(stem_path)
-            trans_model = choose_transcription_model({'instrument': instrument})
-
-            if trans_model in ['mt3', 'onsets_frames'] and device == 'cuda':
-                gpu_jobs.append((stem_path, instrument, model, device))
-            else:
-                cpu_jobs.append((stem_path, instrument, model, device))
-
-        # Run GPU jobs serially
-        for job in gpu_jobs:
-            result = self.transcribe_single(*job)
-            results.append(result)
-
-        # Run CPU jobs in parallel
-        if cpu_jobs:
-            cpu_results = self.pool.map(self.transcribe_single, cpu_jobs)
-            results.extend(cpu_results)
-
-        return results
-
-    def transcribe_single(self, stem_path, instrument, model, device):
-        try:
-            midi_path, summary = transcribe_stem_to_midi(stem_path, instrument_hint=instrument, model=model, device=device)
-            return summary
-        except Exception as e:
-            logging.error(f"Transcription failed for {stem_path}: {e}", exc_info=True)
-            return None
-
-    def detect_instruments(self, stems):
-        return [self.detect_instrument(stem['path']) for stem in stems]
-
-class WorkerThread(QThread):
-    progress = Signal(int)
-    log = Signal(str)
-    finished = Signal(object)
-
-    def __init__(self, func, *args):
-        super().__init__()
-        self.func = func
-        self.args = args
-
-    def run(self):
-        try:
-            result = self.func(*self.args)
-            self.finished.emit(result)
-        except Exception as e:
-            self.log.emit(f"Error: {e}")
-            if DEBUG:
-                logging.exception("Worker error")
-
-class WorkerThread(QThread):
-    progress = Signal(int)
-    log = Signal(str)
-    finished = Signal(object)
-
-    def __init__(self, func, *args):
-        super().__init__()
-        self.func = func
-        self.args = args
-
-    def run(self):
-        try:
-            result = self.func(*self.args)
-            self.finished.emit(result)
-        except Exception as e:
-            self.log.emit(f"Error: {e}")
-
 class Audio2MIDIGUI(QMainWindow):
+    backend_loaded = Signal(str, bool)
+    task_event = Signal(object)
+    # (callback, argument) pairs handed from the scheduler thread to the GUI thread
+    invoke = Signal(object, object)
+
     def __init__(self):
         super().__init__()
         self.settings = self.load_settings()
@@ -158,12 +59,56 @@ class Audio2MIDIGUI(QMainWindow):
         self.stems = []
         self.midis = {}
         self.force_rerun = False
-        self.job_queue = JobQueue()
-        self.orchestrator = Orchestrator(self)
+        self.midi_out = None
+        self.warm_reported = set()
+        # Spawned workers: forking a process that runs Qt and model threads is unsafe
+        # One worker using every core by default: the GUI converts one file at a time, and each
+        # worker process holds its own copy of every model
+        split = plan(self.settings.get("thread_policy", "latency"))
+        metrics.configure(metrics.metrics_path() or METRICS_FILE)
+        self.scheduler = Scheduler(cpu_slots=split['processes'], gpu_slots=1, mp_context='spawn',
+                                   worker_threads=split['threads'], on_event=self.task_event.emit)
+        self.scheduler.start()
+        # Stems are decoded once here and mapped by every worker that needs them
+        self.shared_audio = SharedAudioPool()
         self.setAcceptDrops(True)
         self.init_ui()
+        self.backend_loaded.connect(self.on_backend_loaded)
+        self.task_event.connect(self.on_task_event)
+        self.invoke.connect(lambda callback, arg: callback(arg))
+        # Models load in the background once the window is up
+        QTimer.singleShot(0, self.warm_up_backends)
+
+    def warm_up_backends(self):
+        # Only what the current options use; anything else loads on first use
+        names = registry.worker_backends(self.sep_combo.currentText().lower(),
+                                         TRANSCRIPTION_MODELS.get(self.trans_combo.currentText(), 'auto'),
+                                         self.device_combo.currentText())
+        if not self.scheduler.processes:
+            registry.warm_up(names, on_loaded=self.backend_loaded.emit)
+        else:
+            # Conversions run in the worker processes, so that is where the models must be loaded:
+            # one task per worker slot; they run at once, so each normally loads into its own process
+            for _ in range(self.scheduler.slots['cpu']):
+                self.scheduler.submit(Task(registry.warm_worker, args=(names,), name="warm up", on_finish=self.on_workers_warmed))
+            # GPU tasks run in this process (see separate_stems); checking for a GPU imports torch, so off-thread
+            threading.Thread(target=self.warm_gpu_backends, name="gpu-warm-up", daemon=True).start()
         self.init_midi()
 
+    def warm_gpu_backends(self):
+        if default_device() == 'cuda':
+            registry.warm_up(['demucs'], on_loaded=lambda name, ok: self.backend_loaded.emit(f"{name} (GPU)", ok))
+
+    def on_workers_warmed(self, task):
+        # Scheduler thread; every worker reports the same backends, so log each once
+        for name, ok in (task.result or {}).items():
+            if name not in self.warm_reported:
+                self.warm_reported.add(name)
+                self.backend_loaded.emit(name, ok)
+
+    def on_backend_loaded(self, name, ok):
+        self.log(f"Backend ready: {name}" if ok else f"Backend unavailable: {name}")
+
     # ... existing code ...
 
     def dragEnterEvent(self, event):
@@ -200,10 +145,11 @@ class Audio2MIDIGUI(QMainWindow):
         file_layout.addWidget(open_btn)
         layout.addLayout(file_layout)
 
-        # Waveform
-        self.figure = plt.Figure()
-        self.canvas = FigureCanvas(self.figure)
-        layout.addWidget(self.canvas)
+        # Waveform (matplotlib is imported on the first plot)
+        self.figure = None
+        self.peaks = None
+        self.waveform_layout = QVBoxLayout()
+        layout.addLayout(self.waveform_layout)
 
         # Options
         options_group = QGroupBox("Options")
@@ -289,60 +235,170 @@ class Audio2MIDIGUI(QMainWindow):
             self.file_label.setText(Path(path).name)
             self.plot_waveform()
 
+    def ensure_canvas(self):
+        if self.figure is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+            from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
+
+            self.figure = Figure()
+            self.canvas = FigureCanvas(self.figure)
+            self.canvas.mpl_connect('scroll_event', self.on_waveform_scroll)
+            self.waveform_layout.addWidget(NavigationToolbar2QT(self.canvas, self))
+            self.waveform_layout.addWidget(self.canvas)
+
     def plot_waveform(self):
         if self.audio_path:
-            audio, sr = librosa.load(self.audio_path, sr=None)
-            self.figure.clear()
-            ax = self.figure.add_subplot(111)
-            ax.plot(audio)
-            ax.set_title("Waveform")
-            self.canvas.draw()
+            # The peak pyramid is built (or read from next to the file) off the UI thread
+            self.scheduler.submit(Task(load_peaks, args=(self.audio_path,), resource='io',
+                                       on_finish=self.in_gui(self.on_peaks_ready),
+                                       name=f"peaks {Path(self.audio_path).name}"))
+
+    def on_peaks_ready(self, task):
+        if task.args[0] != self.audio_path:
+            return  # another file was opened meanwhile
+        if task.state != 'done':
+            self.log(f"Waveform failed: {task.error}")
+            return
+        self.peaks = task.result
+        self.ensure_canvas()
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        ax.set_title("Waveform")
+        ax.set_autoscale_on(False)
+        ax.set_xlim(0, self.peaks.duration)
+        ax.set_ylim(-1, 1)
+        ax.callbacks.connect('xlim_changed', lambda ax: self.draw_peaks())
+        self.waveform_ax = ax
+        self.waveform_fill = None
+        self.draw_peaks()
+
+    def draw_peaks(self):
+        # Only the visible range, at one min/max pair per pixel, is ever drawn
+        ax = self.waveform_ax
+        start, end = ax.get_xlim()
+        times, mins, maxs = self.peaks.window(start, end, ax.bbox.width)
+        if self.waveform_fill is not None:
+            self.waveform_fill.remove()
+        self.waveform_fill = ax.fill_between(times, mins, maxs, step='post', linewidth=0)
+        self.canvas.draw_idle()
+
+    def on_waveform_scroll(self, event):
+        if self.peaks is None or event.xdata is None:
+            return
+        scale = 1 / 1.25 if event.button == 'up' else 1.25
+        start, end = self.waveform_ax.get_xlim()
+        span = min((end - start) * scale, self.peaks.duration)
+        start = min(max(0.0, event.xdata - (event.xdata - start) * scale), self.peaks.duration - span)
+        self.waveform_ax.set_xlim(start, start + span)
+
+    def in_gui(self, callback):
+        # Task callbacks run on the scheduler thread; hop to the GUI thread
+        return lambda task: self.invoke.emit(callback, task)
 
     def separate_stems(self):
         if not self.audio_path:
             return
         out_dir = Path(self.audio_path).parent / "stems"
         device = self.device_combo.currentText()
-        self.job_queue.add_job(separate, self.audio_path, str(out_dir), device=device, callback=self.on_separation_done)
-        self.job_queue.start()
-
-    def on_separation_done(self, result):
-        if isinstance(result, list):
-            self.stems = result
+        backend = self.sep_combo.currentText().lower()
+        cache = None if self.force_rerun_check.isChecked() else self.stem_cache()
+        # On CUDA separation takes the GPU slot and runs in this process, where the warmed engine lives
+        self.scheduler.submit(Task(separate_resident, args=(self.audio_path, str(out_dir)),
+                                   kwargs={'device': device, 'backend': backend, 'cache': cache},
+                                   resource='gpu' if device == 'cuda' else 'cpu',
+                                   on_finish=self.in_gui(self.on_separation_done),
+                                   name=f"separate {Path(self.audio_path).name}"))
+
+    def update_stems_list(self):
+        self.stems_list.clear()
+        for stem in self.stems:
+            label = Path(stem['path']).stem
+            if not stem.get('active', True):
+                label += " (silent, skipped)"
+            self.stems_list.addItem(label)
+
+    def stem_cache(self):
+        return StemCache(Path(self.settings.get("model_cache", "models")) / "stems")
+
+    def notes_cache(self):
+        return TranscriptionCache(Path(self.settings.get("model_cache", "models")) / "notes")
+
+    def on_separation_done(self, task):
+        if task.state == 'done':
+            self.stems = task.result
             self.update_stems_list()
+        else:
+            self.log(f"Separation failed: {task.error}")
 
     def transcribe_all(self):
         if not self.stems:
             return
-        model = self.trans_combo.currentText()
+        model = TRANSCRIPTION_MODELS.get(self.trans_combo.currentText(), 'auto')
         device = self.device_combo.currentText()
         self.force_rerun = self.force_rerun_check.isChecked()
-        self.job_queue.add_job(self.orchestrator.transcribe_all_stems, self.stems, model, device, callback=self.on_transcription_done)
-        self.job_queue.start()
-
-    def on_transcription_done(self, results):
-        # results is list of summaries
-        for res in results:
-            if res:
-                self.log(f"Transcribed: {res['midi_path']}")
-
-    def cancel_job(self):
-        self.job_queue.cancel()
+        # Cached notes are keyed by stem content, model and parameters, so only real changes re-transcribe
+        cache = None if self.force_rerun else self.notes_cache()
+        for stem in self.stems:
+            if not stem.get('active', True):
+                self.log(f"Skipped silent stem: {stem['path']}")
+                continue
+            midi_path = Path(stem['path']).with_suffix('.mid')
+            # Every stem is its own task, so stems transcribe in parallel across CPU and GPU slots
+            self.scheduler.submit(stem_task(stem['path'], model, device, str(midi_path),
+                                            on_finish=self.in_gui(self.on_transcription_done),
+                                            shared=self.shared_audio, cache=cache))
+
+    def on_transcription_done(self, task):
+        summary = stem_result(task)
+        if summary and summary.get('cache') == 'hit':
+            self.log(f"Cached: {summary['midi_path']}")
+        elif summary:
+            self.log(f"Transcribed: {summary['midi_path']} ({summary['skipped_seconds']:.1f}s of silence skipped)")
+        else:
+            self.log(f"Transcription failed: {task.failures()[0].error}")
 
     def analyze_stems(self):
         if not self.stems:
             return
-        self.job_queue.add_job(self.orchestrator.detect_instruments, self.stems, callback=self.on_analysis_done)
-        self.job_queue.start()
-
-    def on_analysis_done(self, instruments):
-        for stem, inst in zip(self.stems, instruments):
-            stem['instrument'] = inst
+        active = [stem for stem in self.stems if stem.get('active', True)]
+        if not active:
+            self.log("Analysis complete: every stem is silent")
+            return
+        # One batched task: a few windows per stem are read from disk, no full decode
+        self.scheduler.submit(Task(detect_instruments, args=([stem['path'] for stem in active],),
+                                   on_finish=self.in_gui(partial(self.on_analysis_done, active)),
+                                   name="detect instruments"))
+
+    def on_analysis_done(self, stems, task):
+        if task.state != 'done':
+            self.log(f"Analysis failed: {task.error}")
+            return
+        for stem, instrument in zip(stems, task.result):
+            stem['instrument'] = instrument
         self.log("Analysis complete")
 
+    def on_task_event(self, task):
+        stats = self.scheduler.stats()
+        total = sum(stats[state] for state in ('pending', 'running', 'done', 'failed', 'cancelled'))
+        finished = stats['done'] + stats['failed'] + stats['cancelled']
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(finished)
+        if DEBUG:
+            logging.debug(f"{task.name}: {task.state}")
+
     def cancel_job(self):
-        if hasattr(self, 'worker'):
-            self.worker.terminate()
+        self.scheduler.cancel()
+
+    def closeEvent(self, event):
+        self.scheduler.shutdown(wait=False)
+        self.shared_audio.close()
+        try:
+            path = Path(metrics.metrics_path())
+            metrics.write_prometheus(metrics.read_records(path), path.with_suffix('.prom'))
+        except OSError as e:
+            logging.warning(f"Could not export metrics: {e}")
+        super().closeEvent(event)
 
     def export_midi(self):
         # Placeholder
@@ -353,6 +409,8 @@ class Audio2MIDIGUI(QMainWindow):
 
     def init_midi(self):
         try:
+            import pygame.midi
+
             pygame.midi.init()
             self.midi_out = pygame.midi.Output(pygame.midi.get_default_output_id())
         except:
@@ -384,10 +442,16 @@ class SettingsDialog(QDialog):
         self.gpu_check = QCheckBox()
         self.gpu_check.setChecked(settings.get("gpu", False))
         layout.addRow("Prefer GPU:", self.gpu_check)
+        # Applies on the next start; the worker pool is sized when the window opens
+        self.policy_combo = QComboBox()
+        self.policy_combo.addItems(POLICIES)
+        self.policy_combo.setCurrentText(settings.get("thread_policy", "latency"))
+        layout.addRow("CPU Policy:", self.policy_combo)
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
         layout.addWidget(buttons)
 
     def get_settings(self):
-        return {"model_cache": self.cache_edit.text(), "gpu": self.gpu_check.isChecked()}
+        return {"model_cache": self.cache_edit.text(), "gpu": self.gpu_check.isChecked(),
+                "thread_policy": self.policy_combo.currentText()}
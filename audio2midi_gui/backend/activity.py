@@ -0,0 +1,95 @@
+import numpy as np
+import soundfile as sf
+
+ACTIVITY_DB = -50.0  # frame RMS (dBFS) above which a frame counts as active
+FRAME_LENGTH = 2048
+MIN_GAP_SECONDS = 0.5  # shorter silences (releases, rests) stay inside a region
+PAD_SECONDS = 0.25  # context kept around each region for attacks and decays
+MIN_ACTIVE_SECONDS = 0.1  # less than this (a click, separation bleed) is a silent stem
+BLOCK_FRAMES = 1 << 18
+
+
+def frame_levels(audio, frame_length=FRAME_LENGTH):
+    """
+    RMS level in dBFS of consecutive non-overlapping frames.
+
+    Multichannel input is (samples, channels); channel powers are averaged,
+    so out-of-phase content does not cancel. A partial last frame is kept.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim == 2:
+        power = np.square(audio, dtype=np.float64).mean(axis=1)
+    else:
+        power = np.square(audio, dtype=np.float64)
+    n_frames = -(-len(power) // frame_length)
+    power = np.pad(power, (0, n_frames * frame_length - len(power)))
+    frame_power = power.reshape(n_frames, frame_length).mean(axis=1)
+    if len(audio) % frame_length:
+        # Average the partial frame over its own length, not the padding
+        frame_power[-1] *= frame_length / (len(audio) % frame_length)
+    return 10 * np.log10(frame_power + 1e-12)
+
+
+def regions_from_levels(levels, sr, frame_length=FRAME_LENGTH, threshold_db=ACTIVITY_DB,
+                        min_gap=MIN_GAP_SECONDS, pad=PAD_SECONDS, length=None):
+    """
+    Active regions from frame levels.
+
+    Returns:
+        list: (start, end) sample ranges, sorted and non-overlapping.
+    """
+    active = levels > threshold_db
+    if not active.any():
+        return []
+    length = length if length is not None else len(levels) * frame_length
+    edges = np.diff(np.concatenate([[0], active.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1) * frame_length
+    ends = np.minimum(np.flatnonzero(edges == -1) * frame_length, length)
+
+    # Pad, then bridge gaps shorter than min_gap (padding included)
+    pad = int(pad * sr)
+    starts = np.maximum(starts - pad, 0)
+    ends = np.minimum(ends + pad, length)
+    first = np.flatnonzero(np.concatenate([[True], starts[1:] - ends[:-1] >= min_gap * sr]))
+    last = np.append(first[1:] - 1, len(ends) - 1)
+    return list(zip(starts[first].tolist(), ends[last].tolist()))
+
+
+def active_regions(audio, sr, **kwargs):
+    """
+    Where a mono or (samples, channels) signal is not silent.
+
+    Args:
+        audio (np.ndarray): Signal.
+        sr (int): Sample rate.
+        **kwargs: threshold_db, min_gap, pad (see `regions_from_levels`).
+
+    Returns:
+        list: (start, end) sample ranges.
+    """
+    return regions_from_levels(frame_levels(audio), sr, length=len(audio), **kwargs)
+
+
+def file_activity(path, block_frames=BLOCK_FRAMES, **kwargs):
+    """
+    Activity of an audio file, read block by block without a full decode.
+
+    Returns:
+        dict: {'active': bool, 'active_seconds': float} for a stem summary.
+    """
+    block_frames -= block_frames % FRAME_LENGTH
+    levels = []
+    with sf.SoundFile(str(path)) as f:
+        sr = f.samplerate
+        for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            levels.append(frame_levels(block))
+        length = f.frames
+    levels = np.concatenate(levels) if levels else np.zeros(0)
+    regions = regions_from_levels(levels, sr, length=length, **kwargs)
+    return summarize(regions, sr)
+
+
+def summarize(regions, sr):
+    """Summary fields for sample `regions`: whether the stem is worth transcribing and for how long."""
+    active_seconds = sum(end - start for start, end in regions) / sr
+    return {'active': active_seconds >= MIN_ACTIVE_SECONDS, 'active_seconds': active_seconds}
@@ -0,0 +1,199 @@
+import json
+import os
+import time
+from functools import partial
+from pathlib import Path
+from backend.scheduler import Scheduler, submit_conversion, stem_result
+from backend.threads import plan, limit_threads
+from backend.separation import STEM_NAMES
+from backend.shm import SharedAudioPool
+from backend import metrics
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.aiff', '.aif', '.m4a')
+
+
+def find_inputs(paths, extensions=AUDIO_EXTENSIONS):
+    """
+    Expand files and directories into audio inputs.
+
+    Directories are walked recursively in sorted order, so a rerun sees the
+    same inputs in the same order.
+
+    Returns:
+        list: (path, name) pairs; `name` is the input's path relative to the
+            directory it was found in, without extension, and names its
+            output directory.
+    """
+    inputs = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file.lower().endswith(extensions):
+                        found = Path(root) / file
+                        inputs.append((str(found), found.relative_to(path).with_suffix('').as_posix()))
+        elif path.is_file():
+            inputs.append((str(path), path.stem))
+        else:
+            raise FileNotFoundError(f"Input {path} not found")
+    return inputs
+
+
+def fingerprint(path):
+    """Cheap identity of an input file (size and mtime), so edited files are redone."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class Manifest:
+    """
+    Append-only JSON-lines log of finished inputs.
+
+    One line is written (and fsynced) per input as soon as it finishes, so
+    after an interruption the manifest lists exactly the completed files. A
+    torn last line from a crash is ignored on load.
+
+    Args:
+        path (str): Manifest file, created if missing.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.records[_key(record['input'])] = record
+
+    def is_done(self, input_path):
+        record = self.records.get(_key(input_path))
+        return (record is not None and record.get('status') == 'done'
+                and record.get('fingerprint') == fingerprint(input_path))
+
+    def append(self, record):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.records[_key(record['input'])] = record
+
+
+def _key(input_path):
+    return Path(input_path).resolve()
+
+
+def conversion_record(task, input_path):
+    """
+    Manifest record for a finished `submit_conversion` root task.
+
+    Returns:
+        dict: Per-stem outputs and timings, or the first error if any stage failed.
+    """
+    elapsed = task.completed_at - task.started_at if task.started_at is not None else 0.0
+    failures = task.failures()
+    if failures:
+        return {'input': str(input_path), 'status': 'failed', 'seconds': elapsed,
+                'error': f"{failures[0].name}: {failures[0].error or failures[0].state}"}
+
+    outputs = []
+    for child in task.children:
+        summary = stem_result(child)
+        outputs.append({'stem': Path(summary['stem_path']).stem, 'instrument': summary['instrument'],
+                        'midi_path': summary['midi_path'], 'model_used': summary['model_used'],
+                        'notes': len(summary['notes']), 'cache': summary.get('cache'),
+                        'skipped_seconds': summary['skipped_seconds']})
+    audio_seconds = max((stem['duration'] for stem in task.result), default=0.0)
+    return {
+        'input': str(input_path),
+        'status': 'done',
+        'out_dir': str(task.args[1]),
+        'stems': outputs,
+        'silent_stems': [Path(stem['path']).stem for stem in task.result if not stem.get('active', True)],
+        'audio_seconds': audio_seconds,
+        'separation_seconds': task.finished_at - task.started_at,
+        'seconds': elapsed,
+        'realtime_factor': audio_seconds / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run_batch(paths, out_root, manifest_path=None, jobs=None, policy='throughput', gpu_slots=1, resume=True,
+              on_record=None, metrics_path=None, **options):
+    """
+    Convert every audio file under `paths` on a shared task scheduler.
+
+    Separation, detection and transcription of all inputs form one task
+    graph, so stems of one file are transcribed while the next file is
+    separated. CPU tasks run in worker processes, each keeping its own
+    resident models, with the core budget split between processes and
+    intra-op threads by `policy` (see `backend.threads.plan`).
+
+    Args:
+        paths (list): Input files and/or directories.
+        out_root (str): Outputs go to `<out_root>/<input name>/`.
+        manifest_path (str): JSON-lines manifest; `<out_root>/manifest.jsonl` by default.
+        jobs (int): Concurrent CPU tasks; chosen by `policy` if None. A single
+            slot runs in this process.
+        policy (str): 'throughput', 'latency' or 'balanced'.
+        gpu_slots (int): Concurrent GPU tasks when running on CUDA.
+        resume (bool): Skip inputs the manifest lists as done and unchanged.
+        on_record (callable): Called with each finished record, in completion order.
+        metrics_path (str): JSON-lines file every process appends its stage
+            records to (see `backend.metrics`); `<out_root>/metrics.jsonl` by
+            default. Its Prometheus summary is written next to it as `.prom`.
+        **options: Passed to `submit_conversion` (device, model, separation_backend,
+            cache_dir, notes_cache_dir, chunk_seconds, separate_fn).
+
+    Returns:
+        dict: Totals: files, skipped, done, failed, audio_seconds, seconds and
+            realtime_factor (audio seconds converted per wall second).
+    """
+    started = time.perf_counter()
+    out_root = Path(out_root)
+    manifest = Manifest(manifest_path or out_root / 'manifest.jsonl')
+    metrics_path = Path(metrics_path or out_root / 'metrics.jsonl')
+    previous_metrics = metrics.metrics_path()
+    inputs = find_inputs(paths)
+    todo = [(path, name) for path, name in inputs if not (resume and manifest.is_done(path))]
+
+    totals = {'files': len(inputs), 'skipped': len(inputs) - len(todo), 'done': 0, 'failed': 0,
+              'audio_seconds': 0.0}
+
+    def finish(path, task):
+        record = conversion_record(task, path)
+        record['fingerprint'] = fingerprint(path)
+        manifest.append(record)
+        totals[record['status']] += 1
+        totals['audio_seconds'] += record.get('audio_seconds', 0.0)
+        if on_record:
+            on_record(record)
+
+    # Each input fans out into one transcription task per stem
+    split = plan(policy, tasks=len(todo) * len(STEM_NAMES) or None, processes=jobs)
+    if split['processes'] == 1:
+        limit_threads(split['threads'])
+    # Before the scheduler starts its workers, so they inherit the path
+    metrics.configure(metrics_path)
+    scheduler = Scheduler(cpu_slots=split['processes'], gpu_slots=gpu_slots, processes=split['processes'] > 1,
+                          worker_threads=split['threads'])
+    shared = SharedAudioPool()
+    try:
+        for path, name in todo:
+            submit_conversion(scheduler, path, str(out_root / name), shared=shared,
+                              on_finish=partial(finish, path), **options)
+        scheduler.run()
+    finally:
+        scheduler.shutdown()
+        shared.close()
+        metrics.configure(previous_metrics)
+    metrics.write_prometheus(metrics.read_records(metrics_path), metrics_path.with_suffix('.prom'))
+
+    totals['seconds'] = time.perf_counter() - started
+    totals['realtime_factor'] = totals['audio_seconds'] / totals['seconds'] if totals['seconds'] > 0 else 0.0
+    return totals
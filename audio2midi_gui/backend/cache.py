@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3  # 5 GiB
+META_FILE = "meta.json"
+
+
+def make_key(*parts):
+    """Build a cache key from JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed, size-capped artifact store on disk.
+
+    Each entry is a directory `<root>/<key>/` holding the artifact files and a
+    `meta.json`. Entries are evicted least-recently-used first once the store
+    grows past `max_bytes`; a hit refreshes the entry's mtime. Files are
+    copied rather than hard-linked so in-place rewrites of outputs can't
+    corrupt the store.
+
+    Args:
+        root (str): Store directory, e.g. the `model_cache` setting.
+        max_bytes (int): Size cap for all entries together.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def entry_dir(self, key):
+        return self.root / key
+
+    def get(self, key):
+        """
+        Look up an entry.
+
+        Returns:
+            tuple: (entry_dir, meta) or None on a miss.
+        """
+        entry = self.entry_dir(key)
+        meta_path = entry / META_FILE
+        if not meta_path.exists():
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(meta_path)
+        return entry, meta
+
+    def put(self, key, files, meta):
+        """
+        Store files under `key`.
+
+        Args:
+            key (str): Cache key.
+            files (dict): Name inside the entry -> source path.
+            meta (dict): JSON-serializable metadata.
+
+        Returns:
+            Path: Entry directory.
+        """
+        entry = self.entry_dir(key)
+        tmp = self.root / f".{key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, src in files.items():
+            shutil.copy2(src, tmp / name)
+        with open(tmp / META_FILE, 'w') as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict(keep=key)
+        return entry
+
+    def entries(self):
+        """List (mtime, size, key) for every complete entry."""
+        result = []
+        for entry in self.root.iterdir():
+            meta_path = entry / META_FILE
+            if entry.name.startswith('.') or not meta_path.exists():
+                continue
+            size = sum(p.stat().st_size for p in entry.iterdir() if p.is_file())
+            result.append((meta_path.stat().st_mtime, size, entry.name))
+        return result
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Drop least-recently-used entries until the store fits `max_bytes`."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            total -= size
+            logging.debug(f"Evicted cache entry {key}")
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+
+class StemCache(ArtifactStore):
+    """
+    Separation output keyed by decoded audio hash, backend, stem count, device
+    and chunk length (chunked separation is close to, not equal to, a single pass).
+    """
+
+    def key(self, audio_hash, backend, stems, device, chunk_seconds=None):
+        return make_key('stems', audio_hash, backend, stems, device, chunk_seconds)
+
+    def fetch(self, key, out_dir):
+        """
+        Materialize a cached separation into `out_dir`.
+
+        Returns:
+            list: Stem summary with paths under `out_dir`, or None on a miss.
+        """
+        hit = self.get(key)
+        if hit is None:
+            return None
+        entry, meta = hit
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        summary = []
+        for item in meta['summary']:
+            name = Path(item['path']).name
+            dst = out_dir / name
+            shutil.copy2(entry / name, dst)
+            summary.append(dict(item, path=str(dst)))
+        return summary
+
+    def store(self, key, summary, backend):
+        files = {Path(item['path']).name: item['path'] for item in summary}
+        return self.put(key, files, {'summary': summary, 'backend': backend,
+                                     'created': time.time()})
+
+
+class TranscriptionCache(ArtifactStore):
+    """
+    Transcribed notes keyed by stem content and everything that shapes them.
+
+    An entry holds the notes as a NoteArray .npz plus the detected tempo, so
+    MIDI is re-rendered from it on demand: re-exporting with another tempo
+    or program never re-transcribes. `hits` and `misses` count lookups made
+    through this instance (each worker process has its own counters).
+    """
+
+    NOTES_FILE = "notes.npz"
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(root, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, audio_hash, model, instrument, device, params, version):
+        """
+        Args:
+            audio_hash (str): `hash_audio` of the stem.
+            model (str): Resolved transcription model.
+            instrument (str): Instrument hint (sets the GM program and model).
+            device (str): 'cpu' or 'cuda'.
+            params (dict): Every other parameter that changes the notes.
+            version (int): Transcriber version; bump to invalidate old entries.
+        """
+        return make_key('notes', version, audio_hash, model, instrument, device, params)
+
+    def fetch(self, key):
+        """
+        Returns:
+            tuple: (NoteArray, meta) or None on a miss.
+        """
+        from backend.notes import NoteArray
+
+        hit = self.get(key)
+        if hit is None:
+            self.misses += 1
+            return None
+        entry, meta = hit
+        try:
+            notes = NoteArray.load(entry / self.NOTES_FILE)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return notes, meta
+
+    def store(self, key, notes, meta):
+        with tempfile.TemporaryDirectory(dir=self.root, prefix='.notes-') as tmp:
+            path = Path(tmp) / self.NOTES_FILE
+            notes.save(path)
+            return self.put(key, {self.NOTES_FILE: path}, dict(meta, created=time.time()))
+
+    def export(self, key, out_path, tempo=None, program=0):
+        """
+        Render a cached entry to MIDI without transcribing.
+
+        Args:
+            tempo (float): BPM; the detected tempo if None.
+
+        Returns:
+            str: `out_path`, or None on a miss.
+        """
+        from backend.smf import write_smf
+
+        hit = self.fetch(key)
+        if hit is None:
+            return None
+        notes, meta = hit
+        write_smf(str(out_path), notes.onset, notes.offset, notes.pitch, notes.velocity,
+                  tempo=tempo or meta['tempo'], program=program)
+        return str(out_path)
+
+    def stats(self):
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
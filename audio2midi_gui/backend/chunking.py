@@ -0,0 +1,169 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from backend.threads import current_limit, available_cores
+
+CHUNK_SECONDS = 30.0  # target chunk length
+SEARCH_SECONDS = 5.0  # how far from the target a split may move to find a quiet spot
+ENERGY_SECONDS = 0.1  # window of the energy curve the quiet spot is picked on
+
+
+def default_workers():
+    """Threads for one stem: the governor's per-worker budget, else every core."""
+    return current_limit() or available_cores()
+
+
+def split_points(audio, sr, hop, chunk_seconds=CHUNK_SECONDS, search_seconds=SEARCH_SECONDS):
+    """
+    Chunk boundaries at low-energy points.
+
+    A boundary is placed near every `chunk_seconds`, at the quietest
+    `ENERGY_SECONDS` window within `search_seconds` of the target. Inner
+    boundaries are multiples of `hop`, so frames of every chunk fall on the
+    frame grid of the whole signal. Signals shorter than two chunks are not
+    split; the result depends only on the signal, never on the core count.
+
+    Args:
+        audio (np.ndarray): Mono signal.
+        sr (int): Sample rate.
+        hop (int): Frame hop in samples of the transform that will run on the chunks.
+
+    Returns:
+        list: Sample boundaries, starting with 0 and ending with len(audio).
+    """
+    n_hops = len(audio) // hop
+    step = int(chunk_seconds * sr / hop)
+    if step < 1 or n_hops < 2 * step:
+        return [0, len(audio)]
+
+    power = np.square(audio[:n_hops * hop], dtype=np.float64).reshape(n_hops, hop).sum(axis=1)
+    width = max(1, int(ENERGY_SECONDS * sr / hop))
+    cumulative = np.concatenate([[0.0], np.cumsum(power)])
+    # Energy of the window centred on each hop
+    lo = np.clip(np.arange(n_hops) - width // 2, 0, n_hops)
+    energy = cumulative[np.minimum(lo + width, n_hops)] - cumulative[lo]
+
+    search = int(search_seconds * sr / hop)
+    boundaries = [0]
+    for target in range(step, n_hops - step // 2, step):
+        first = max(boundaries[-1] // hop + 1, target - search)
+        last = min(n_hops - 1, target + search)
+        if first >= last:
+            continue
+        boundaries.append(int(first + np.argmin(energy[first:last])) * hop)
+    boundaries.append(len(audio))
+    return boundaries
+
+
+def chunk_slices(length, boundaries, hop, margin):
+    """
+    Where each chunk is cut and which of its frames it contributes.
+
+    Every chunk is cut with `margin` samples of context on both sides (so
+    transforms see the same neighbourhood as on the whole signal) and keeps
+    only the centred frames whose centres lie in its own span.
+
+    Returns:
+        list: (lo, hi, first, count) per chunk: the slice audio[lo:hi] and
+            the `count` frames from local frame `first` it contributes.
+    """
+    n_frames = 1 + length // hop
+    margin = int(np.ceil(margin / hop)) * hop
+    slices = []
+    for i, (start, end) in enumerate(zip(boundaries[:-1], boundaries[1:])):
+        lo, hi = max(0, start - margin), min(length, end + margin)
+        stop = n_frames if i == len(boundaries) - 2 else end // hop
+        slices.append((lo, hi, (start - lo) // hop, stop - start // hop))
+    return slices
+
+
+def gate(boundaries, regions, hop, length):
+    """
+    Refine chunk boundaries with activity regions and flag the silent chunks.
+
+    Region edges are widened to the hop grid and added as boundaries, so
+    every chunk is entirely inside or outside the active regions.
+
+    Args:
+        boundaries (list): From `split_points`.
+        regions (list): Active (start, end) sample ranges (see `backend.activity`).
+        hop (int): Frame hop in samples.
+        length (int): Signal length in samples.
+
+    Returns:
+        tuple: (boundaries, active) where `active[i]` tells whether chunk i has sound.
+    """
+    starts = np.array([start // hop * hop for start, _ in regions], dtype=np.int64)
+    ends = np.array([min(length, -(-end // hop) * hop) for _, end in regions], dtype=np.int64)
+    edges = sorted(set(boundaries) | set(starts.tolist()) | set(ends.tolist()))
+    mids = (np.array(edges[:-1]) + np.array(edges[1:])) / 2
+    # Regions are sorted and disjoint: only the last one starting before a midpoint can hold it
+    idx = np.searchsorted(starts, mids, side='right') - 1
+    active = (idx >= 0) & (mids < ends[np.maximum(idx, 0)]) if len(regions) else np.zeros(len(mids), bool)
+    return edges, active.tolist()
+
+
+def _merge_active(boundaries, active):
+    """Drop boundaries between consecutive chunks of the same activity."""
+    merged, flags = [boundaries[0]], []
+    for end, flag in zip(boundaries[1:], active):
+        if flags and flags[-1] == flag:
+            merged[-1] = end
+        else:
+            merged.append(end)
+            flags.append(flag)
+    return merged, flags
+
+
+def framewise(audio, compute, boundaries, hop, margin, workers=None, active=None):
+    """
+    Run a centred frame-wise transform chunk by chunk, in parallel, and stitch.
+
+    `compute(audio_slice)` must return an array whose last axis holds frames
+    centred at multiples of `hop` of the slice (librosa's `center=True`
+    convention). The result has the frames of `compute(audio)` on the same
+    grid, equal up to float rounding when `margin` covers the transform's
+    support. Chunks run on threads; the heavy numpy/scipy/soxr kernels
+    release the GIL. With a single worker consecutive chunks of the same
+    activity are merged, since each chunk pays the transform's setup cost
+    again.
+
+    Args:
+        audio (np.ndarray): Mono signal.
+        compute (callable): audio -> (..., frames) array.
+        boundaries (list): From `split_points`.
+        hop (int): Frame hop in samples.
+        margin (int): Context samples on each side of a chunk.
+        workers (int): Threads; `default_workers()` if None.
+        active (list): Per-chunk flags from `gate`; silent chunks are not
+            computed and get zero frames.
+
+    Returns:
+        np.ndarray: Stitched (..., frames) array.
+    """
+    if active is None or not any(active):
+        active = [True] * (len(boundaries) - 1)
+    workers = min(sum(active), workers or default_workers())
+    if workers == 1:
+        # Chunking only pays off for the silence it skips
+        boundaries, active = _merge_active(boundaries, active)
+    slices = chunk_slices(len(audio), boundaries, hop, margin)
+    if len(slices) == 1:
+        return compute(audio)
+
+    def run(piece):
+        lo, hi, first, count = piece
+        return compute(audio[lo:hi])[..., first:first + count]
+
+    todo = [piece for piece, flag in zip(slices, active) if flag]
+    if workers == 1:
+        results = [run(piece) for piece in todo]
+    else:
+        with ThreadPoolExecutor(workers, thread_name_prefix="chunk") as executor:
+            results = list(executor.map(run, todo))
+
+    # Silent chunks become zero frames shaped like the computed ones
+    template = results[0]
+    results = iter(results)
+    parts = [next(results) if flag else np.zeros(template.shape[:-1] + (count,), dtype=template.dtype)
+             for (_, _, _, count), flag in zip(slices, active)]
+    return np.concatenate(parts, axis=-1)
@@ -0,0 +1,138 @@
+import numpy as np
+import librosa
+from numpy.lib.stride_tricks import as_strided
+from backend.threads import apply_framework_limits
+
+MODEL_SR = 16000
+FRAME_LENGTH = 1024
+
+_runners = {}
+
+
+def get_runner(model_capacity='full', **kwargs):
+    """Return this process' CrepeRunner for `model_capacity`, creating it once."""
+    runner = _runners.get(model_capacity)
+    if runner is None:
+        runner = CrepeRunner(model_capacity=model_capacity, **kwargs)
+        _runners[model_capacity] = runner
+    return runner
+
+
+class CrepeRunner:
+    """
+    CREPE pitch tracker with one resident model and bounded-size batches.
+
+    Frames from any number of signals are cut lazily and fed to the network
+    in fixed-size batches, so memory depends on `batch_frames`, not on stem
+    length. Frames quieter than `silence_db` never reach the network and are
+    reported with zero frequency and confidence.
+
+    Args:
+        model_capacity (str): CREPE model size ('tiny' ... 'full').
+        step_size (int): Hop between frames in milliseconds.
+        batch_frames (int): Frames per network call.
+        silence_db (float): Frame RMS (dBFS) below which a frame is skipped.
+        viterbi (bool): Viterbi-smooth the pitch path over voiced frames.
+    """
+
+    def __init__(self, model_capacity='full', step_size=10, batch_frames=2048, silence_db=-60.0, viterbi=True):
+        self.model_capacity = model_capacity
+        self.step_size = step_size
+        self.batch_frames = batch_frames
+        self.silence_db = silence_db
+        self.viterbi = viterbi
+        self._model = None
+
+    def load(self):
+        if self._model is None:
+            from crepe.core import build_and_load_model
+
+            apply_framework_limits()
+            self._model = build_and_load_model(self.model_capacity)
+        return self._model
+
+    def _frames(self, audio, sr, step_size):
+        """Strided (n_frames, 1024) view over the centred 16 kHz signal, plus the voiced mask."""
+        if sr != MODEL_SR:
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=MODEL_SR)
+        audio = np.pad(np.asarray(audio, dtype=np.float32), FRAME_LENGTH // 2)
+        hop = int(MODEL_SR * step_size / 1000)
+        n_frames = max(0, 1 + (len(audio) - FRAME_LENGTH) // hop)
+        frames = as_strided(audio, shape=(n_frames, FRAME_LENGTH),
+                            strides=(hop * audio.itemsize, audio.itemsize), writeable=False)
+
+        # Frame energy from a running sum of squares; no frame copies needed
+        power = np.concatenate([[0.0], np.cumsum(audio.astype(np.float64) ** 2)])
+        starts = np.arange(n_frames) * hop
+        rms = np.sqrt((power[starts + FRAME_LENGTH] - power[starts]) / FRAME_LENGTH)
+        voiced = 20 * np.log10(rms + 1e-12) > self.silence_db
+        return frames, voiced
+
+    def predict(self, audio, sr, step_size=None):
+        """
+        Pitch-track one signal.
+
+        Returns:
+            tuple: (time, frequency, confidence) arrays, one entry per frame.
+        """
+        return self.predict_many([(audio, sr)], step_size)[0]
+
+    def predict_many(self, signals, step_size=None):
+        """
+        Pitch-track many signals, sharing network batches between them.
+
+        Args:
+            signals (list): (audio, sr) pairs.
+            step_size (int): Hop in milliseconds; defaults to the runner's.
+
+        Returns:
+            list: (time, frequency, confidence) per signal.
+        """
+        from crepe.core import to_local_average_cents, to_viterbi_cents
+
+        model = self.load()
+        step_size = step_size or self.step_size
+        framed = [self._frames(audio, sr, step_size) for audio, sr in signals]
+        voiced_idx = [np.flatnonzero(voiced) for _, voiced in framed]
+        # Viterbi needs the whole activation path; local averaging decodes per batch
+        if self.viterbi:
+            activations = [np.empty((len(idx), 360), dtype=np.float32) for idx in voiced_idx]
+        cents = [np.empty(len(idx)) for idx in voiced_idx]
+        confidence = [np.empty(len(idx)) for idx in voiced_idx]
+
+        # (signal, frame) pairs of every voiced frame, consumed in fixed-size batches
+        owners = np.concatenate([np.full(len(idx), i) for i, idx in enumerate(voiced_idx)] + [np.empty(0, int)])
+        positions = np.concatenate([np.arange(len(idx)) for idx in voiced_idx] + [np.empty(0, int)])
+        for start in range(0, len(owners), self.batch_frames):
+            batch_owners = owners[start:start + self.batch_frames]
+            batch_positions = positions[start:start + self.batch_frames]
+            batch = np.empty((len(batch_owners), FRAME_LENGTH), dtype=np.float32)
+            for i in np.unique(batch_owners):
+                sel = batch_owners == i
+                batch[sel] = framed[i][0][voiced_idx[i][batch_positions[sel]]]
+            batch -= batch.mean(axis=1, keepdims=True)
+            batch /= np.maximum(batch.std(axis=1, keepdims=True), 1e-8)
+
+            out = model.predict(batch, verbose=0)
+            for i in np.unique(batch_owners):
+                sel = batch_owners == i
+                confidence[i][batch_positions[sel]] = out[sel].max(axis=1)
+                if self.viterbi:
+                    activations[i][batch_positions[sel]] = out[sel]
+                else:
+                    cents[i][batch_positions[sel]] = to_local_average_cents(out[sel])
+
+        results = []
+        for i, (frames, _) in enumerate(framed):
+            n_frames = len(frames)
+            frame_frequency = np.zeros(n_frames)
+            frame_confidence = np.zeros(n_frames)
+            idx = voiced_idx[i]
+            if len(idx):
+                if self.viterbi:
+                    cents[i] = to_viterbi_cents(activations[i])
+                frame_frequency[idx] = np.nan_to_num(10 * 2 ** (cents[i] / 1200))
+                frame_confidence[idx] = confidence[i]
+            time = np.arange(n_frames) * step_size / 1000.0
+            results.append((time, frame_frequency, frame_confidence))
+        return results
@@ -0,0 +1,189 @@
+import numpy as np
+import librosa
+from backend.chunking import framewise, split_points, gate
+from backend.activity import active_regions
+from backend import metrics
+
+N_FFT = 2048
+HOP_LENGTH = 512
+# Chroma is referenced to A440: estimating the tuning would need the whole STFT at once
+CHROMA_TUNING = 0.0
+
+
+def decode(path):
+    """Decode a file to a mono signal at its native rate, recorded as the 'decode' stage."""
+    with metrics.stage('decode', path=str(path)) as record:
+        audio, sr = librosa.load(str(path), sr=None)
+        record['audio_seconds'] = len(audio) / sr
+    return audio, sr
+
+
+class StemFeatures:
+    """
+    Lazily computed, memoized signal and transforms for one stem.
+
+    Instrument detection and transcription both take one of these, so a stem
+    is decoded once and each transform (mel, onset envelope, tempo, chroma)
+    runs at most once no matter how many consumers ask for it.
+
+    The STFT and CQT of the whole stem are never held. Chunks split at quiet
+    points are transformed in parallel and each is reduced at once to what
+    consumers read (mel power, chroma and spectral centroid from the STFT;
+    harmonic salience from the CQT), stitched on the frame grid of the whole
+    stem (see `backend.chunking`). Consumers get the same frames as from a
+    single pass while memory holds only the chunks in flight. Frames outside
+    the stem's active regions (see `backend.activity`) are not computed at
+    all and read as zero.
+
+    Args:
+        path (str): Stem path, decoded on first use.
+        audio (np.ndarray): Already decoded mono signal (instead of `path`).
+        sr (int): Sample rate of `audio`.
+        workers (int): Threads for chunked transforms; see `chunking.default_workers`.
+    """
+
+    def __init__(self, path=None, audio=None, sr=None, workers=None):
+        if path is None and audio is None:
+            raise ValueError("StemFeatures needs a path or an audio array")
+        self.path = str(path) if path is not None else None
+        self.workers = workers
+        self._cache = {}
+        if audio is not None:
+            self._cache[('audio', None)] = (np.asarray(audio, dtype=np.float32), sr)
+
+    @classmethod
+    def from_shared(cls, handle):
+        """Build on a `SharedAudio` handle: the signal is mapped, not copied or decoded."""
+        return cls(path=handle.source, audio=handle.array(), sr=handle.sr)
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def audio(self, sr=None):
+        """
+        Mono signal at `sr` (native rate if None).
+
+        Returns:
+            tuple: (audio, sr)
+        """
+        native = self._memo(('audio', None), lambda: decode(self.path))
+        if sr is None or sr == native[1]:
+            return native
+        return self._memo(('audio', sr), lambda: (
+            librosa.resample(native[0], orig_sr=native[1], target_sr=sr), sr))
+
+    def active_regions(self):
+        """Non-silent (start, end) ranges in seconds."""
+        def compute():
+            audio, rate = self.audio()
+            return [(start / rate, end / rate) for start, end in active_regions(audio, rate)]
+        return self._memo(('active_regions',), compute)
+
+    @property
+    def active_seconds(self):
+        return sum(end - start for start, end in self.active_regions())
+
+    def split_points(self, hop, sr=None):
+        """Chunk boundaries (samples at `sr`) aligned to `hop`; see `chunking.split_points`."""
+        def compute():
+            audio, rate = self.audio(sr)
+            return split_points(audio, rate, hop)
+        return self._memo(('split_points', hop, sr), compute)
+
+    def chunks(self, hop, sr=None):
+        """
+        Chunk boundaries at `sr` refined by the active regions.
+
+        Returns:
+            tuple: (boundaries, active); see `chunking.gate`.
+        """
+        def compute():
+            audio, rate = self.audio(sr)
+            regions = [(int(start * rate), int(np.ceil(end * rate))) for start, end in self.active_regions()]
+            return gate(self.split_points(hop, sr), regions, hop, len(audio))
+        return self._memo(('chunks', hop, sr), compute)
+
+    @property
+    def sr(self):
+        return self.audio()[1]
+
+    @property
+    def duration(self):
+        audio, sr = self.audio()
+        return len(audio) / sr
+
+    def _spectral(self, sr=None):
+        # One chunked STFT pass (librosa's default n_fft/hop) reduced to the frame summaries below
+        def compute():
+            audio, rate = self.audio(sr)
+            boundaries, active = self.chunks(HOP_LENGTH, sr)
+            mel_basis = librosa.filters.mel(sr=rate, n_fft=N_FFT)
+            chroma_basis = librosa.filters.chroma(sr=rate, n_fft=N_FFT, tuning=CHROMA_TUNING)
+
+            def summarize(chunk):
+                mag = np.abs(librosa.stft(chunk, n_fft=N_FFT, hop_length=HOP_LENGTH))
+                power = mag ** 2
+                centroid = librosa.feature.spectral_centroid(S=mag, sr=rate, n_fft=N_FFT)
+                return np.concatenate([mel_basis @ power, chroma_basis @ power, centroid.astype(power.dtype)])
+
+            frames = framewise(audio, summarize, boundaries, HOP_LENGTH, N_FFT, self.workers, active)
+            n_mels, n_chroma = len(mel_basis), len(chroma_basis)
+            # Copies, so dropping the mel power frees the stitched array
+            return {'mel': frames[:n_mels], 'chroma': frames[n_mels:n_mels + n_chroma].copy(),
+                    'centroid': frames[n_mels + n_chroma].copy()}
+        return self._memo(('spectral', sr), compute)
+
+    def mel_db(self, sr=None):
+        """Log-power mel spectrogram, shared by MFCC and onset strength."""
+        # The mel power has no other consumer: only its dB version is kept
+        return self._memo(('mel_db', sr), lambda: librosa.power_to_db(self._spectral(sr).pop('mel')))
+
+    def spectral_centroid(self, sr=None):
+        """Spectral centroid (Hz) per frame."""
+        return self._spectral(sr)['centroid']
+
+    def onset_envelope(self, sr=None):
+        def compute():
+            rate = self.audio(sr)[1]
+            return librosa.onset.onset_strength(S=self.mel_db(sr), sr=rate, hop_length=HOP_LENGTH)
+        return self._memo(('onset_env', sr), compute)
+
+    def onset_times(self, sr=None):
+        def compute():
+            rate = self.audio(sr)[1]
+            return librosa.onset.onset_detect(onset_envelope=self.onset_envelope(sr), sr=rate,
+                                              hop_length=HOP_LENGTH, units='time')
+        return self._memo(('onset_times', sr), compute)
+
+    def tempo(self, sr=None):
+        def compute():
+            rate = self.audio(sr)[1]
+            tempo, _ = librosa.beat.beat_track(onset_envelope=self.onset_envelope(sr), sr=rate,
+                                               hop_length=HOP_LENGTH)
+            return float(np.atleast_1d(tempo)[0])
+        return self._memo(('tempo', sr), compute)
+
+    def cqt_salience(self, sr=None):
+        """
+        Harmonic salience and fundamental energy on the polyphonic engine's pitch grid.
+
+        Each chunk's CQT is reduced to salience as soon as it is computed, so
+        the CQT of the whole stem never exists. Not memoized: polyphonic
+        transcription is its only consumer.
+
+        Returns:
+            np.ndarray: (2, pitches, frames); see `polyphonic.cqt_salience`.
+        """
+        from backend.polyphonic import cqt_salience, HOP_LENGTH as CQT_HOP, CQT_CONTEXT_SECONDS
+
+        audio, rate = self.audio(sr)
+        boundaries, active = self.chunks(CQT_HOP, sr)
+        return framewise(audio, lambda chunk: cqt_salience(chunk, rate), boundaries, CQT_HOP,
+                         int(CQT_CONTEXT_SECONDS * rate), self.workers, active)
+
+    def chroma(self, sr=None):
+        """Chroma (`chroma_stft` at CHROMA_TUNING), each frame scaled to a maximum of 1."""
+        return self._memo(('chroma', sr), lambda: librosa.util.normalize(self._spectral(sr).pop('chroma'),
+                                                                         norm=np.inf, axis=0))
@@ -1,8 +1,11 @@
+import logging
 import librosa
 import numpy as np
-from sklearn.neighbors import KNeighborsClassifier
 import soundfile as sf
 from pathlib import Path
+from backend.features import StemFeatures
+from backend import registry, metrics
+from backend.utils import audio_duration
 
 # Pre-trained k-NN classifier with synthetic data
 # Features: [mfcc_mean, spectral_centroid, zero_crossing_rate, rms]
@@ -21,45 +24,221 @@ training_features = [
 
 training_labels = ['vocals', 'drums', 'bass', 'piano', 'guitar', 'synth', 'unknown']
 
-knn = KNeighborsClassifier(n_neighbors=3)
-knn.fit(training_features, training_labels)
+# Serialized classifier shipped with the app (bundled with the other model files)
+CLASSIFIER_PATH = Path(__file__).resolve().parent.parent / "models" / "instrument_knn.npz"
+
+# Features are estimated from at most N_WINDOWS windows of WINDOW_SECONDS each
+N_WINDOWS = 8
+WINDOW_SECONDS = 2.0
+N_MFCC = 13
+TOP_DB = 80.0
+
+
+class KNNClassifier:
+    """
+    k-nearest-neighbour classifier over a stored training set.
+
+    Behaves like scikit-learn's `KNeighborsClassifier` with uniform weights
+    and Euclidean distance (ties go to the alphabetically first label), but
+    is plain numpy: loading it is reading one small .npz, with no fit and no
+    scikit-learn import.
+
+    Args:
+        features (array): (n_samples, n_features) training features.
+        labels (list): Label per training sample.
+        n_neighbors (int): Neighbours that vote.
+    """
+
+    def __init__(self, features, labels, n_neighbors=3):
+        self.features = np.asarray(features, dtype=np.float64)
+        self.classes, self.targets = np.unique(np.asarray(labels), return_inverse=True)
+        self.n_neighbors = n_neighbors
+
+    def predict(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        distances = ((X[:, None, :] - self.features[None, :, :]) ** 2).sum(axis=2)
+        nearest = np.argsort(distances, axis=1, kind='stable')[:, :self.n_neighbors]
+        votes = np.zeros((len(X), len(self.classes)), dtype=int)
+        np.add.at(votes, (np.arange(len(X))[:, None], self.targets[nearest]), 1)
+        return self.classes[votes.argmax(axis=1)]
+
+    def save(self, path):
+        np.savez(path, features=self.features, labels=self.classes[self.targets],
+                 n_neighbors=self.n_neighbors)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['features'], f['labels'], int(f['n_neighbors']))
+
+
+def build_classifier():
+    """Classifier from the synthetic training data."""
+    return KNNClassifier(training_features, training_labels, n_neighbors=3)
+
+def load_classifier(path=CLASSIFIER_PATH):
+    """Load the serialized classifier; the registry calls this on first use."""
+    try:
+        return KNNClassifier.load(path)
+    except (OSError, KeyError, ValueError) as e:
+        logging.warning(f"Instrument classifier {path} not loaded ({e}); using the built-in training set")
+        return build_classifier()
+
+def window_starts(length, sr, n_windows=N_WINDOWS, window_seconds=WINDOW_SECONDS):
+    """
+    Evenly spread windows features are estimated from.
+
+    A signal that fits in the window budget is used whole.
+
+    Returns:
+        tuple: (starts, window_length) in samples.
+    """
+    window = int(window_seconds * sr)
+    if length <= n_windows * window:
+        return np.zeros(1, dtype=np.int64), length
+    return np.linspace(0, length - window, n_windows).round().astype(np.int64), window
+
+def read_windows(path, n_windows=N_WINDOWS, window_seconds=WINDOW_SECONDS):
+    """
+    Read only the detection windows of an audio file, downmixed to mono.
+
+    Returns:
+        tuple: ((n, window_length) float32 array, sr)
+    """
+    try:
+        f = sf.SoundFile(str(path))
+    except RuntimeError:
+        # Formats libsndfile can't seek in are decoded whole
+        return signal_windows(*librosa.load(str(path), sr=None), n_windows, window_seconds)
+    with f:
+        starts, window = window_starts(f.frames, f.samplerate, n_windows, window_seconds)
+        windows = np.empty((len(starts), window), dtype=np.float32)
+        for i, start in enumerate(starts):
+            f.seek(int(start))
+            windows[i] = f.read(window, dtype='float32', always_2d=True).mean(axis=1)
+        return windows, f.samplerate
+
+def signal_windows(audio, sr, n_windows=N_WINDOWS, window_seconds=WINDOW_SECONDS):
+    """Detection windows of an already decoded mono signal (views, no copies)."""
+    starts, window = window_starts(len(audio), sr, n_windows, window_seconds)
+    return np.stack([audio[start:start + window] for start in starts]), sr
+
+def window_features(windows, sr, owners, n_stems):
+    """
+    Classifier features of many stems from their windows, in one batch.
+
+    All windows share one STFT/mel/MFCC pass over the stacked array. Per-frame
+    values are averaged per stem, so a stem used whole gets exactly its
+    full-signal means.
+
+    Args:
+        windows (np.ndarray): (n_windows, window_length) at `sr`.
+        owners (np.ndarray): Stem index of each window.
+        n_stems (int): Number of stems.
+
+    Returns:
+        np.ndarray: (n_stems, 4): mean MFCC 0, spectral centroid, ZCR, RMS.
+    """
+    mag = np.abs(librosa.stft(windows))
+    mel = librosa.feature.melspectrogram(S=mag ** 2, sr=sr)
+    # power_to_db per stem: its top_db floor follows its own loudest bin
+    mel_db = 10 * np.log10(np.maximum(mel, 1e-10))
+    peak = np.full(n_stems, -np.inf)
+    np.maximum.at(peak, owners, mel_db.max(axis=(1, 2)))
+    mel_db = np.maximum(mel_db, (peak[owners] - TOP_DB)[:, None, None])
+
+    per_window = np.stack([
+        librosa.feature.mfcc(S=mel_db, sr=sr, n_mfcc=N_MFCC)[:, 0].mean(axis=-1),
+        librosa.feature.spectral_centroid(S=mag, sr=sr)[:, 0].mean(axis=-1),
+        librosa.feature.zero_crossing_rate(y=windows)[:, 0].mean(axis=-1),
+        librosa.feature.rms(y=windows)[:, 0].mean(axis=-1),
+    ], axis=1)
+    # Windows of a stem have equal length, so the mean of window means is the frame mean
+    sums = np.zeros((n_stems, per_window.shape[1]))
+    np.add.at(sums, owners, per_window)
+    return sums / np.bincount(owners, minlength=n_stems)[:, None]
 
 def extract_features(audio, sr):
-    # Compute features
-    mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
+    windows, sr = signal_windows(np.asarray(audio, dtype=np.float32), sr)
+    return window_features(windows, sr, np.zeros(len(windows), dtype=np.int64), 1)[0].tolist()
+
+def extract_stem_features(store):
+    # Compute features from the shared store so the STFT pass and mel are reused downstream
+    audio, sr = store.audio()
+
+    mfccs = librosa.feature.mfcc(S=store.mel_db(), sr=sr, n_mfcc=N_MFCC)
     mfcc_mean = np.mean(mfccs, axis=1)
 
-    spectral_centroid = librosa.feature.spectral_centroid(y=audio, sr=sr)[0].mean()
+    spectral_centroid = store.spectral_centroid().mean()
 
     zero_crossing_rate = librosa.feature.zero_crossing_rate(y=audio)[0].mean()
 
     rms = librosa.feature.rms(y=audio)[0].mean()
 
     # For simplicity, use mean mfcc, centroid, zcr, rms
-    features = [mfcc_mean[0], spectral_centroid, zero_crossing_rate, rms]  # Use first MFCC
+    return [mfcc_mean[0], spectral_centroid, zero_crossing_rate, rms]  # Use first MFCC
+
+def detect_instruments(stems, use_advanced=False):
+    """
+    Detect the instrument of many stems at once.
 
-    return features
+    Each stem contributes at most N_WINDOWS windows of WINDOW_SECONDS, read
+    straight from the file (or sliced from an already decoded StemFeatures),
+    so the cost per stem does not grow with its length. Stems are batched by
+    window shape, so usually all of them share one feature pass and one
+    classifier call. A StemFeatures short enough to be used whole is
+    analysed through its memoized transforms instead, which transcription
+    reuses.
 
-def analyze_stem(stem_path, use_advanced=False):
+    Args:
+        stems (list): Stem paths and/or StemFeatures.
+        use_advanced (bool): If True, use external model (placeholder).
+
+    Returns:
+        list: Instrument type per stem.
+    """
+    if use_advanced:
+        # Placeholder for MT3 or musicnn
+        return ['unknown'] * len(stems)  # TODO: integrate MT3/musicnn
+
+    with metrics.stage('detect', stems=len(stems)) as record:
+        features = np.empty((len(stems), len(training_features[0])))
+        groups = {}
+        audio_seconds = 0.0
+        for i, stem in enumerate(stems):
+            if isinstance(stem, StemFeatures):
+                audio, sr = stem.audio()
+                audio_seconds += len(audio) / sr
+                if len(window_starts(len(audio), sr)[0]) == 1:
+                    features[i] = extract_stem_features(stem)
+                    continue
+                windows, sr = signal_windows(audio, sr)
+            else:
+                audio_seconds += audio_duration(stem) or 0.0
+                windows, sr = read_windows(stem)
+            groups.setdefault((sr, windows.shape[1]), []).append((i, windows))
+        record['audio_seconds'] = audio_seconds
+
+        for (sr, _), members in groups.items():
+            owners = np.concatenate([np.full(len(windows), j) for j, (_, windows) in enumerate(members)])
+            batch = np.concatenate([windows for _, windows in members])
+            features[[i for i, _ in members]] = window_features(batch, sr, owners, len(members))
+        return registry.get('instrument_classifier').predict(features).tolist()
+
+def analyze_stem(stem_path, use_advanced=False, features=None):
     """
     Analyze stem to determine instrument type.
 
     Args:
         stem_path (str): Path to stem WAV.
         use_advanced (bool): If True, use external model (placeholder).
+        features (StemFeatures): Shared feature store for the stem; when given
+            its decoded signal is used instead of reading the file again.
 
     Returns:
         str: Instrument type.
     """
-    if use_advanced:
-        # Placeholder for MT3 or musicnn
-        # For now, return 'unknown' or call external
-        return 'unknown'  # TODO: integrate MT3/musicnn
-
-    audio, sr = librosa.load(stem_path, sr=None)
-    features = extract_features(audio, sr)
-    prediction = knn.predict([features])[0]
-    return prediction
+    return detect_instruments([features if features is not None else stem_path], use_advanced)[0]
 
 def choose_transcription_model(stem_info):
     """
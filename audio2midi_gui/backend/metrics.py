@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# JSON-lines file stage records are appended to; inherited by worker processes
+METRICS_ENV = "AUDIO2MIDI_METRICS"
+# Record fields that become Prometheus labels
+LABELS = ('stage', 'model', 'backend', 'device')
+PROMETHEUS_PREFIX = "audio2midi"
+
+_recent = deque(maxlen=1000)
+_lock = threading.Lock()
+
+
+def configure(path):
+    """
+    Append stage records to the JSON-lines file `path` (None stops it).
+
+    The path is passed through the environment, so scheduler worker
+    processes started afterwards write to the same file.
+    """
+    if path is None:
+        os.environ.pop(METRICS_ENV, None)
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    os.environ[METRICS_ENV] = str(path)
+
+
+def metrics_path():
+    return os.environ.get(METRICS_ENV)
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (0 where unknown)."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@contextmanager
+def stage(name, audio_seconds=None, **fields):
+    """
+    Measure one pipeline stage.
+
+    Records wall time, process CPU time, peak RSS (and how much the stage
+    raised it) and, when the input duration is known, the real-time factor
+    (audio seconds processed per wall second, as in batch records). The
+    body may add fields to the yielded record, e.g. `audio_seconds` once
+    the input is decoded or `notes` once they are known.
+
+    CPU time is the whole process', so stages overlapping on threads of one
+    process share it.
+
+    Args:
+        name (str): Stage name, e.g. 'separate' or 'transcribe'.
+        audio_seconds (float): Duration of the input audio, if known up front.
+        **fields: Extra JSON-serializable fields; `model`, `backend` and
+            `device` also label the Prometheus series.
+
+    Yields:
+        dict: The record, written when the stage ends (also when it raises).
+    """
+    record = {'stage': name, 'pid': os.getpid(), **fields}
+    if audio_seconds is not None:
+        record['audio_seconds'] = audio_seconds
+    rss_before = peak_rss()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    record['started'] = time.time()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['wall_seconds'] = time.perf_counter() - start
+        record['cpu_seconds'] = time.process_time() - cpu
+        record['peak_rss_bytes'] = peak_rss()
+        record['rss_growth_bytes'] = record['peak_rss_bytes'] - rss_before
+        if record.get('audio_seconds') and record['wall_seconds'] > 0:
+            record['realtime_factor'] = record['audio_seconds'] / record['wall_seconds']
+        if record.get('notes') is not None and record['wall_seconds'] > 0:
+            record['notes_per_second'] = record['notes'] / record['wall_seconds']
+        _emit(record)
+
+
+def _emit(record):
+    with _lock:
+        _recent.append(record)
+    path = metrics_path()
+    if not path:
+        return
+    try:
+        # One short O_APPEND write per record, so processes can share the file
+        with open(path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+    except OSError as e:
+        logging.warning(f"Could not write metrics to {path}: {e}")
+
+
+def recent():
+    """Records of this process, newest last (bounded)."""
+    with _lock:
+        return list(_recent)
+
+
+def read_records(path):
+    """Stage records from a JSON-lines file; torn lines are skipped."""
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def read_new_records(path, offset=0):
+    """
+    Records appended to a JSON-lines file since byte `offset`.
+
+    Only complete lines are consumed, so a record being written is picked up
+    by the next call.
+
+    Returns:
+        tuple: (records, offset to pass next time)
+    """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = data.rfind(b'\n') + 1
+    records = []
+    for line in data[:end].splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records, offset + end
+
+
+def summarize(records):
+    """
+    Aggregate records per stage (and model/backend/device).
+
+    Returns:
+        dict: Label tuple -> {calls, errors, wall_seconds, cpu_seconds,
+            audio_seconds, notes, peak_rss_bytes}.
+    """
+    totals = {}
+    for record in records:
+        key = tuple(record.get(label) for label in LABELS)
+        total = totals.setdefault(key, {'calls': 0, 'errors': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                        'audio_seconds': 0.0, 'notes': 0, 'peak_rss_bytes': 0})
+        total['calls'] += 1
+        total['errors'] += 'error' in record
+        total['wall_seconds'] += record.get('wall_seconds', 0.0)
+        total['cpu_seconds'] += record.get('cpu_seconds', 0.0)
+        total['audio_seconds'] += record.get('audio_seconds') or 0.0
+        total['notes'] += record.get('notes') or 0
+        total['peak_rss_bytes'] = max(total['peak_rss_bytes'], record.get('peak_rss_bytes', 0))
+    return totals
+
+
+def _label_value(value):
+    # Backslash first, so the escapes added for quotes and newlines are not escaped again
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key):
+    pairs = [f'{label}="{_label_value(value)}"' for label, value in zip(LABELS, key) if value is not None]
+    return '{' + ','.join(pairs) + '}'
+
+
+def prometheus_text(records):
+    """Prometheus text exposition of `summarize(records)`."""
+    series = [
+        ('stage_calls_total', 'counter', 'Stage executions', 'calls'),
+        ('stage_errors_total', 'counter', 'Stage executions that raised', 'errors'),
+        ('stage_wall_seconds_total', 'counter', 'Wall time spent in the stage', 'wall_seconds'),
+        ('stage_cpu_seconds_total', 'counter', 'Process CPU time spent in the stage', 'cpu_seconds'),
+        ('stage_audio_seconds_total', 'counter', 'Seconds of input audio the stage processed', 'audio_seconds'),
+        ('stage_notes_total', 'counter', 'Notes the stage produced or wrote', 'notes'),
+        ('stage_peak_rss_bytes', 'gauge', 'Highest peak RSS of a process when the stage ended', 'peak_rss_bytes'),
+    ]
+    totals = sorted(summarize(records).items(), key=lambda item: tuple(str(v) for v in item[0]))
+    lines = []
+    for metric, kind, help_text, field in series:
+        name = f"{PROMETHEUS_PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, total in totals:
+            lines.append(f"{name}{_labels(key)} {total[field]}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(records, path):
+    """Write `prometheus_text(records)` atomically (node_exporter textfile collector format)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(prometheus_text(records))
+    os.replace(tmp, path)
@@ -1,6 +1,8 @@
-import pretty_midi
 import json
 from pathlib import Path
+from backend.notes import NoteArray
+from backend.smf import write_smf
+from backend import metrics
 
 TOOL_VERSION = "audio2midi_gui v1.0"
 
@@ -9,7 +11,7 @@ def write_midi_from_notes(notes, out_path, tempo=None, program=0, separate=False
     Write MIDI from notes list.
 
     Args:
-        notes: list of dicts {onset_s, offset_s, pitch_midi, velocity, track_name}
+        notes: NoteArray, or list of dicts {onset_s, offset_s, pitch_midi, velocity, track_name}
         out_path: output path (for multi-track) or dir (for separate)
         tempo: BPM
         program: GM program
@@ -18,39 +20,22 @@ def write_midi_from_notes(notes, out_path, tempo=None, program=0, separate=False
     if tempo is None:
         tempo = 120
 
-    if separate:
-        # Group by track_name
-        tracks = {}
-        for note in notes:
-            track = note['track_name']
-            if track not in tracks:
-                tracks[track] = []
-            tracks[track].append(note)
+    notes = NoteArray.from_dicts(notes)
 
-        out_dir = Path(out_path)
-        out_dir.mkdir(exist_ok=True)
-        for track_name, track_notes in tracks.items():
-            midi_path = out_dir / f"{track_name}.mid"
-            _write_single_track(track_notes, midi_path, tempo, program, track_name)
-    else:
-        _write_single_track(notes, out_path, tempo, program, "Multi-track")
+    with metrics.stage('midi_write', notes=len(notes), separate=separate):
+        if separate:
+            # Zero-copy per-track views
+            out_dir = Path(out_path)
+            out_dir.mkdir(exist_ok=True)
+            for track_name, track_notes in notes.by_track().items():
+                midi_path = out_dir / f"{track_name}.mid"
+                _write_single_track(track_notes, midi_path, tempo, program, track_name)
+        else:
+            _write_single_track(notes, out_path, tempo, program, "Multi-track")
 
 def _write_single_track(notes, out_path, tempo, program, track_name):
-    midi = pretty_midi.PrettyMIDI(initial_tempo=tempo)
-    instrument = pretty_midi.Instrument(program=program, name=track_name)
-
-    for note in notes:
-        pm_note = pretty_midi.Note(
-            velocity=int(note['velocity'] * 127) if isinstance(note['velocity'], float) else note['velocity'],
-            pitch=note['pitch_midi'],
-            start=note['onset_s'],
-            end=note['offset_s']
-        )
-        instrument.notes.append(pm_note)
-
-    # Add metadata
-    midi.lyrics = [pretty_midi.Lyric(text=f"Generated by {TOOL_VERSION}", time=0)]
-    midi.text_events.append(pretty_midi.Text(text=f"Track: {track_name}", time=0))
-
-    midi.instruments.append(instrument)
-    midi.write(out_path)
+    # Encode SMF bytes straight from the note arrays, with the same metadata as before
+    write_smf(str(out_path), notes.onset, notes.offset, notes.pitch, notes.velocity,
+              tempo=tempo, program=program, track_name=track_name,
+              lyrics=[(f"Generated by {TOOL_VERSION}", 0)],
+              texts=[(f"Track: {track_name}", 0)])
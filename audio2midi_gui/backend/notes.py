@@ -0,0 +1,213 @@
+import json
+import numpy as np
+
+# One row per note. Velocity is stored as a MIDI velocity (0-127).
+NOTE_DTYPE = np.dtype([
+    ('onset', 'f8'),
+    ('offset', 'f8'),
+    ('pitch', 'i2'),
+    ('velocity', 'u1'),
+    ('track', 'u2'),
+])
+
+DEFAULT_TRACK = "Multi-track"
+
+
+def midi_velocity(velocity):
+    """Map 0-1 float velocities to MIDI, passing integer velocities through."""
+    velocity = np.asarray(velocity)
+    if np.issubdtype(velocity.dtype, np.floating):
+        velocity = (velocity * 127).astype(np.int64)
+    return np.clip(velocity, 0, 127).astype(np.uint8)
+
+
+class NoteArray:
+    """
+    Compact, array-backed note container.
+
+    Notes live in one NumPy structured array (`NOTE_DTYPE`) with track names
+    kept in `tracks` and referenced by index, so building, sorting, slicing
+    and shifting are vectorized and a dense transcription costs ~20 bytes per
+    note instead of a Python dict.
+
+    Indexing with an int yields a record that supports `note['onset']`,
+    `note['pitch']` and so on, like the dict notes used before; slices and
+    masks return NoteArray views.
+
+    Args:
+        data (np.ndarray): Structured array with `NOTE_DTYPE`.
+        tracks (list): Track names indexed by the `track` field.
+    """
+
+    def __init__(self, data=None, tracks=None):
+        self.data = np.zeros(0, dtype=NOTE_DTYPE) if data is None else data
+        self.tracks = list(tracks) if tracks else [DEFAULT_TRACK]
+
+    @classmethod
+    def from_arrays(cls, onset, offset, pitch, velocity, track=0, tracks=None):
+        """Build from parallel arrays; float velocities are 0-1, ints are MIDI."""
+        onset = np.asarray(onset, dtype=np.float64).reshape(-1)
+        data = np.empty(len(onset), dtype=NOTE_DTYPE)
+        data['onset'] = onset
+        data['offset'] = offset
+        data['pitch'] = pitch
+        data['velocity'] = midi_velocity(velocity) if len(onset) else 0
+        data['track'] = track
+        return cls(data, tracks)
+
+    @classmethod
+    def from_dicts(cls, notes, track_name=None):
+        """
+        Build from note dicts in either schema.
+
+        Accepts the transcriber's {onset, offset, pitch, velocity} and the
+        writer's {onset_s, offset_s, pitch_midi, velocity, track_name}.
+        """
+        if isinstance(notes, NoteArray):
+            return notes
+        notes = list(notes)
+        if not notes:
+            return cls(tracks=[track_name] if track_name else None)
+
+        first = notes[0]
+        onset_key = 'onset_s' if 'onset_s' in first else 'onset'
+        offset_key = 'offset_s' if 'offset_s' in first else 'offset'
+        pitch_key = 'pitch_midi' if 'pitch_midi' in first else 'pitch'
+
+        # Track indices in first-seen order of track names
+        tracks = {}
+        track_idx = [tracks.setdefault(n.get('track_name', track_name or DEFAULT_TRACK), len(tracks))
+                     for n in notes]
+        velocity = [int(v * 127) if isinstance(v, (float, np.floating)) else int(v)
+                    for v in (n['velocity'] for n in notes)]
+
+        return cls.from_arrays(
+            [n[onset_key] for n in notes],
+            [n[offset_key] for n in notes],
+            [n[pitch_key] for n in notes],
+            np.array(velocity, dtype=np.int64),
+            track_idx,
+            list(tracks),
+        )
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """Merge note arrays, unifying their track names."""
+        arrays = [cls.from_dicts(a) for a in arrays]
+        tracks = {}
+        parts = []
+        for array in arrays:
+            remap = np.array([tracks.setdefault(t, len(tracks)) for t in array.tracks], dtype=np.uint16)
+            part = array.data.copy()
+            part['track'] = remap[part['track']]
+            parts.append(part)
+        data = np.concatenate(parts) if parts else None
+        return cls(data, list(tracks) or None)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.data[index]
+        if isinstance(index, str):
+            return self.data[index]
+        return NoteArray(self.data[index], self.tracks)
+
+    def __repr__(self):
+        return f"NoteArray({len(self)} notes, tracks={self.tracks})"
+
+    @property
+    def onset(self):
+        return self.data['onset']
+
+    @property
+    def offset(self):
+        return self.data['offset']
+
+    @property
+    def pitch(self):
+        return self.data['pitch']
+
+    @property
+    def velocity(self):
+        return self.data['velocity']
+
+    @property
+    def track(self):
+        return self.data['track']
+
+    @property
+    def end_time(self):
+        return float(self.offset.max()) if len(self) else 0.0
+
+    def sorted(self, by_track=False):
+        """Copy sorted by (track,) onset, pitch."""
+        keys = (self.pitch, self.onset, self.track) if by_track else (self.pitch, self.onset)
+        return NoteArray(self.data[np.lexsort(keys)], self.tracks)
+
+    def shifted(self, seconds):
+        """Copy with every onset/offset moved by `seconds`."""
+        data = self.data.copy()
+        data['onset'] += seconds
+        data['offset'] += seconds
+        return NoteArray(data, self.tracks)
+
+    def between(self, start, end):
+        """Notes overlapping [start, end)."""
+        mask = (self.onset < end) & (self.offset > start)
+        return NoteArray(self.data[mask], self.tracks)
+
+    def by_track(self):
+        """
+        Per-track views.
+
+        Sorts once by track if needed; each returned NoteArray is then a
+        contiguous slice of the same buffer, not a copy.
+
+        Returns:
+            dict: Track name -> NoteArray.
+        """
+        array = self
+        if len(self) and np.any(np.diff(self.track.astype(np.int64)) < 0):
+            array = self.sorted(by_track=True)
+        bounds = np.searchsorted(array.track, np.arange(len(self.tracks) + 1))
+        result = {}
+        for i, name in enumerate(self.tracks):
+            if bounds[i + 1] > bounds[i]:
+                result[name] = NoteArray(array.data[bounds[i]:bounds[i + 1]], [name])
+        return result
+
+    def to_dicts(self, schema='transcribe'):
+        """
+        Convert to note dicts.
+
+        Args:
+            schema (str): 'transcribe' for {onset, offset, pitch, velocity (0-1)}
+                or 'export' for {onset_s, offset_s, pitch_midi, velocity (MIDI int),
+                track_name}, which round-trips exactly through `from_dicts`.
+        """
+        onset = self.onset.tolist()
+        offset = self.offset.tolist()
+        pitch = self.pitch.tolist()
+        if schema == 'export':
+            velocity = self.velocity.tolist()
+            names = [self.tracks[t] for t in self.track.tolist()]
+            return [{'onset_s': a, 'offset_s': b, 'pitch_midi': p, 'velocity': v, 'track_name': t}
+                    for a, b, p, v, t in zip(onset, offset, pitch, velocity, names)]
+        velocity = (self.velocity / 127).tolist()
+        return [{'onset': a, 'offset': b, 'pitch': p, 'velocity': v}
+                for a, b, p, v in zip(onset, offset, pitch, velocity)]
+
+    def save(self, path):
+        """Write an uncompressed .npz (raw array plus track names)."""
+        with open(path, 'wb') as f:
+            np.savez(f, notes=self.data, tracks=np.array(json.dumps(self.tracks)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['notes'].astype(NOTE_DTYPE, copy=False), json.loads(str(f['tracks'])))
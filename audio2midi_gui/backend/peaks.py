@@ -0,0 +1,210 @@
+import os
+import logging
+import numpy as np
+import soundfile as sf
+from pathlib import Path
+
+BASE_BIN = 256  # samples per bin at level 0
+FACTOR = 4  # bins merged per step up the pyramid
+MIN_BINS = 64  # coarsest level keeps at least this many bins
+BLOCK_FRAMES = 1 << 18
+PEAKS_SUFFIX = ".peaks.npz"
+
+
+def _mono_blocks(path, block_frames):
+    """Mono float32 blocks of an audio file, streamed when soundfile can read it."""
+    try:
+        f = sf.SoundFile(str(path))
+    except RuntimeError:
+        # Formats libsndfile can't stream (e.g. mp3 on older builds) are decoded whole
+        import librosa
+
+        audio, sr = librosa.load(str(path), sr=None, mono=True)
+        yield sr
+        for start in range(0, len(audio), block_frames):
+            yield audio[start:start + block_frames]
+        return
+    with f:
+        yield f.samplerate
+        for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            yield block.mean(axis=1)
+
+
+def _reduce(mins, maxs, factor):
+    """Merge every `factor` bins (the last group may be partial)."""
+    starts = np.arange(0, len(mins), factor)
+    return np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts)
+
+
+class PeakPyramid:
+    """
+    Min/max waveform envelope at several resolutions (mipmap levels).
+
+    Level 0 holds the min and max of every `base` samples; each level above
+    merges `factor` bins of the one below. A display asks `window` for the
+    visible time range and its pixel width and gets at most one min/max pair
+    per pixel from the coarsest level that is still fine enough, so drawing
+    cost depends on the screen, not on the file length.
+
+    Args:
+        levels (list): (mins, maxs) float32 arrays, finest first.
+        sr (int): Sample rate of the audio.
+        frames (int): Length of the audio in samples.
+        base (int): Samples per level-0 bin.
+        factor (int): Bins merged per level.
+    """
+
+    def __init__(self, levels, sr, frames, base=BASE_BIN, factor=FACTOR):
+        self.levels = levels
+        self.sr = sr
+        self.frames = frames
+        self.base = base
+        self.factor = factor
+
+    @property
+    def duration(self):
+        return self.frames / self.sr
+
+    @property
+    def nbytes(self):
+        return sum(mins.nbytes + maxs.nbytes for mins, maxs in self.levels)
+
+    def bin_size(self, level):
+        return self.base * self.factor ** level
+
+    @classmethod
+    def from_blocks(cls, blocks, sr, base=BASE_BIN, factor=FACTOR, progress=None):
+        """
+        Build from an iterable of mono sample blocks in one streaming pass.
+
+        Memory is bounded by one block plus the level-0 envelope.
+        """
+        mins, maxs = [], []
+        carry = np.zeros(0, dtype=np.float32)
+        frames = 0
+        for block in blocks:
+            frames += len(block)
+            samples = np.concatenate([carry, np.asarray(block, dtype=np.float32)])
+            full = len(samples) // base * base
+            if full:
+                bins = samples[:full].reshape(-1, base)
+                mins.append(bins.min(axis=1))
+                maxs.append(bins.max(axis=1))
+            carry = samples[full:]
+            if progress:
+                progress(frames)
+        if len(carry):
+            mins.append(carry.min(keepdims=True))
+            maxs.append(carry.max(keepdims=True))
+
+        level = (np.concatenate(mins) if mins else np.zeros(0, np.float32),
+                 np.concatenate(maxs) if maxs else np.zeros(0, np.float32))
+        levels = [level]
+        while len(level[0]) > MIN_BINS * factor:
+            level = _reduce(*level, factor)
+            levels.append(level)
+        return cls(levels, sr, frames, base, factor)
+
+    @classmethod
+    def from_file(cls, path, block_frames=BLOCK_FRAMES, base=BASE_BIN, factor=FACTOR, progress=None):
+        blocks = _mono_blocks(path, block_frames)
+        sr = next(blocks)
+        return cls.from_blocks(blocks, sr, base, factor, progress)
+
+    def level_for(self, samples_per_pixel):
+        """Coarsest level whose bins are no wider than one pixel."""
+        level = 0
+        while level + 1 < len(self.levels) and self.bin_size(level + 1) <= samples_per_pixel:
+            level += 1
+        return level
+
+    def window(self, start, end, width):
+        """
+        Envelope of [start, end) seconds for a display `width` pixels wide.
+
+        Returns:
+            tuple: (times, mins, maxs); `times` are bin start times in seconds
+                and there are at most about `width` bins.
+        """
+        width = max(1, int(width))
+        start = max(0.0, start)
+        end = min(self.duration, end)
+        if end <= start or self.frames == 0:
+            empty = np.zeros(0, dtype=np.float32)
+            return empty, empty, empty
+
+        level = self.level_for((end - start) * self.sr / width)
+        bin_size = self.bin_size(level)
+        mins, maxs = self.levels[level]
+        first = int(start * self.sr // bin_size)
+        last = min(len(mins), int(np.ceil(end * self.sr / bin_size)))
+        mins, maxs = mins[first:last], maxs[first:last]
+        offset = first * bin_size
+
+        # Merge what is left down to at most one bin pair per pixel
+        group = int(np.ceil(len(mins) / width))
+        if group > 1:
+            mins, maxs = _reduce(mins, maxs, group)
+            bin_size *= group
+        times = (offset + np.arange(len(mins)) * bin_size) / self.sr
+        return times, mins, maxs
+
+    def save(self, path, source=None):
+        """Write an uncompressed .npz, tagged with the source file's size and mtime if given."""
+        arrays = {f"min{i}": mins for i, (mins, _) in enumerate(self.levels)}
+        arrays.update({f"max{i}": maxs for i, (_, maxs) in enumerate(self.levels)})
+        header = [self.sr, self.frames, self.base, self.factor, len(self.levels)]
+        stamp = _stamp(source) if source is not None else [-1, -1]
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, header=np.array(header + stamp, dtype=np.int64), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, source=None):
+        """
+        Read a saved pyramid; None if missing, unreadable or older than `source`.
+        """
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                header = f['header'].tolist()
+                sr, frames, base, factor, n_levels = header[:5]
+                if source is not None and header[5:] != _stamp(source):
+                    return None
+                levels = [(f[f"min{i}"], f[f"max{i}"]) for i in range(n_levels)]
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(levels, sr, frames, base, factor)
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def peaks_path(audio_path):
+    """Where the pyramid of `audio_path` is stored: next to it."""
+    return Path(f"{audio_path}{PEAKS_SUFFIX}")
+
+
+def load_peaks(audio_path, progress=None):
+    """
+    Pyramid for an audio file, computed once and then reused from disk.
+
+    The stored pyramid is recomputed when the audio file's size or mtime
+    changed. If the audio's directory is read-only the pyramid is simply not
+    persisted.
+
+    Returns:
+        PeakPyramid
+    """
+    stored = peaks_path(audio_path)
+    pyramid = PeakPyramid.load(stored, source=audio_path)
+    if pyramid is not None:
+        return pyramid
+    pyramid = PeakPyramid.from_file(audio_path, progress=progress)
+    try:
+        pyramid.save(stored, source=audio_path)
+    except OSError as e:
+        logging.warning(f"Could not store waveform peaks for {audio_path}: {e}")
+    return pyramid
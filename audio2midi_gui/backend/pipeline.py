@@ -0,0 +1,215 @@
+import queue
+import time
+import asyncio
+import logging
+from pathlib import Path
+from backend.scheduler import (Scheduler, Task, DONE, shared_task, stem_result, detect_task, transcribe_task,
+                               transcription_resource)
+from backend.separation import separate_resident, default_device
+from backend.instrument_detect import choose_transcription_model
+from backend.cache import StemCache, TranscriptionCache
+from backend.threads import plan, limit_threads
+from backend.shm import SharedAudioPool
+
+# Event types, in the order they arrive for one stem
+STEM_SEPARATED = 'stem_separated'
+INSTRUMENT_DETECTED = 'instrument_detected'
+NOTES_READY = 'notes_ready'
+STEM_FAILED = 'stem_failed'
+# Last event of a conversion
+FINISHED = 'done'
+FAILED = 'failed'
+
+
+class Pipeline:
+    """
+    separate -> detect -> transcribe as a stream of events per stem.
+
+    Instead of chaining `separate`, `analyze_stem`, `choose_transcription_model`
+    and `transcribe_stem_to_midi` and waiting for each whole stage, callers get
+    an event for every stem as soon as it is available:
+
+        stem_separated       stem, path, duration, active
+        instrument_detected  stem, instrument, model (the one that will transcribe it)
+        notes_ready          stem, instrument, model, notes (NoteArray), tempo, midi_path
+        stem_failed          stem, error
+        done                 stems, failed_stems, seconds (always last, unless 'failed')
+        failed               error (separation failed; no stems)
+
+    Every event is a dict with `type` and `input`. Events of one stem arrive in
+    this order, but stems interleave: the first stem's notes can be ready while
+    the others are still being transcribed. Silent stems get `stem_separated`
+    with `active` False and nothing else.
+
+    The work runs on a `Scheduler`: separation and transcription in CPU (or
+    GPU) executor slots, so neither interface blocks on it, and each stem is
+    decoded once into shared memory for its detection and transcription.
+    Several conversions can be in flight at once; one Pipeline (and its warm
+    worker processes) can serve any number of them.
+
+        with Pipeline(model='auto') as pipeline:
+            for event in pipeline.stream('song.wav', 'out/song'):
+                ...
+
+        async with Pipeline() as pipeline:
+            async for event in pipeline.astream('song.wav', 'out/song'):
+                ...
+
+    Args:
+        jobs (int): CPU worker processes; chosen by `policy` if None. A single
+            slot runs in this process.
+        policy (str): 'throughput', 'latency' or 'balanced' (see `backend.threads.plan`).
+        gpu_slots (int): Concurrent GPU tasks on CUDA.
+        device (str): 'cuda' or 'cpu'; auto-detected if None.
+        model (str): Transcription model, 'auto' picks per instrument.
+        separation_backend (str): 'demucs' or 'spleeter'.
+        cache_dir (str): StemCache directory for separated stems.
+        notes_cache_dir (str): TranscriptionCache directory for notes.
+        chunk_seconds (float): Separate long inputs in windows of this length.
+        separate_fn (callable): Replacement for `separate_resident` with the same signature.
+        mp_context (str): Start method of the worker processes ('spawn' when
+            the caller runs other threads, e.g. a UI or an event loop).
+    """
+
+    def __init__(self, jobs=None, policy='throughput', gpu_slots=1, device=None, model='auto',
+                 separation_backend='demucs', cache_dir=None, notes_cache_dir=None, chunk_seconds=None,
+                 separate_fn=None, mp_context='spawn'):
+        self.device = device or default_device()
+        self.model = model
+        self.separation_backend = separation_backend
+        self.cache = StemCache(cache_dir) if cache_dir else None
+        self.notes_cache = TranscriptionCache(notes_cache_dir) if notes_cache_dir else None
+        self.chunk_seconds = chunk_seconds
+        self.separate_fn = separate_fn or separate_resident
+
+        split = plan(policy, processes=jobs)
+        if split['processes'] == 1:
+            limit_threads(split['threads'])
+        self.scheduler = Scheduler(cpu_slots=split['processes'], gpu_slots=gpu_slots,
+                                   processes=split['processes'] > 1, mp_context=mp_context,
+                                   worker_threads=split['threads'])
+        self.scheduler.start()
+        self.shared = SharedAudioPool()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        # Waits for running tasks; off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self, wait=True):
+        """Cancel work not yet started, then (with `wait`) let running tasks finish."""
+        self.scheduler.shutdown(wait=wait)
+        self.shared.close()
+
+    def submit(self, input_path, out_dir, on_event, model=None):
+        """
+        Start converting one input; events go to `on_event`.
+
+        `on_event` is called on the scheduler thread and should only hand the
+        event on (to a queue, a Qt signal, `loop.call_soon_threadsafe`...).
+
+        Args:
+            input_path (str): Audio file.
+            out_dir (str): Directory for the stems and their .mid files.
+            on_event (callable): Called with each event dict.
+            model (str): Transcription model of this input; the pipeline's if None.
+
+        Returns:
+            Task: Root (separation) task.
+        """
+        model = model or self.model
+        started = time.perf_counter()
+
+        def emit(event_type, **fields):
+            try:
+                on_event({'type': event_type, 'input': str(input_path), **fields})
+            except Exception as e:
+                logging.error(f"Pipeline event handler failed: {e}")
+
+        def expand(stems):
+            for stem in stems:
+                emit(STEM_SEPARATED, stem=Path(stem['path']).stem, path=stem['path'], duration=stem.get('duration'),
+                     active=stem.get('active', True))
+            return [shared_task(self.shared, stem['path'], detect_then_transcribe(stem['path']), on_finish=stem_done)
+                    for stem in stems if stem.get('active', True)]
+
+        def detect_then_transcribe(stem_path):
+            # Detection is its own task (not fused with transcription as in `stem_task`) so the
+            # instrument is reported before the stem is transcribed
+            def make(audio):
+                def route(instrument):
+                    chosen = choose_transcription_model({'instrument': instrument}) if model == 'auto' else model
+                    emit(INSTRUMENT_DETECTED, stem=Path(stem_path).stem, instrument=instrument, model=chosen)
+                    return [Task(transcribe_task, args=(stem_path, instrument, model, self.device),
+                                 kwargs={'audio': audio, 'cache': self.notes_cache},
+                                 resource=transcription_resource(instrument, model, self.device), stage=2,
+                                 name=f"transcribe {Path(stem_path).stem}")]
+
+                return Task(detect_task, args=(stem_path, audio), then=route, stage=1,
+                            name=f"detect {Path(stem_path).stem}")
+            return make
+
+        def stem_done(task):
+            stem = Path(task.args[0]).stem
+            summary = stem_result(task)
+            if summary is None:
+                errors = [t.error for t in task.failures() if t.error]
+                emit(STEM_FAILED, stem=stem, error=errors[0] if errors else 'cancelled')
+                return
+            emit(NOTES_READY, stem=stem, instrument=summary['instrument'], model=summary['model_used'],
+                 notes=summary['notes'], tempo=summary['tempo'], midi_path=summary['midi_path'],
+                 cache=summary.get('cache'))
+
+        def finished(task):
+            if task.state != DONE:
+                emit(FAILED, error=task.error or task.state)
+                return
+            failed = sum(1 for child in task.children if stem_result(child) is None)
+            emit(FINISHED, stems=len(task.children) - failed, failed_stems=failed,
+                 seconds=time.perf_counter() - started)
+
+        return self.scheduler.submit(Task(
+            self.separate_fn, args=(str(input_path), str(out_dir)),
+            kwargs={'device': self.device, 'backend': self.separation_backend, 'cache': self.cache,
+                    'chunk_seconds': self.chunk_seconds},
+            resource='gpu' if self.device == 'cuda' else 'cpu', then=expand, on_finish=finished, stage=0,
+            name=f"separate {Path(input_path).name}"))
+
+    def stream(self, input_path, out_dir, model=None):
+        """
+        Convert one input, yielding its events as they happen.
+
+        Yields:
+            dict: Events (see the class docstring), ending with 'done' or 'failed'.
+        """
+        events = queue.Queue()
+        self.submit(input_path, out_dir, events.put, model)
+        while True:
+            event = events.get()
+            yield event
+            if event['type'] in (FINISHED, FAILED):
+                return
+
+    async def astream(self, input_path, out_dir, model=None):
+        """
+        Convert one input, yielding its events as they happen without blocking the event loop.
+
+        Yields:
+            dict: Events (see the class docstring), ending with 'done' or 'failed'.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        self.submit(input_path, out_dir, lambda event: loop.call_soon_threadsafe(events.put_nowait, event), model)
+        while True:
+            event = await events.get()
+            yield event
+            if event['type'] in (FINISHED, FAILED):
+                return
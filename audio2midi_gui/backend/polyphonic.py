@@ -0,0 +1,170 @@
+import numpy as np
+import librosa
+from scipy import ndimage
+from backend.notes import NoteArray
+
+# CQT grid: 3 bins per semitone from C1, centre bin on the equal-tempered pitch
+MIN_PITCH = 24
+N_PITCHES = 96
+BINS_PER_SEMITONE = 3
+BINS_PER_OCTAVE = 12 * BINS_PER_SEMITONE
+HOP_LENGTH = 512
+# Context a CQT chunk needs on each side: the lowest filter spans ~1.6 s at this grid
+CQT_CONTEXT_SECONDS = 2.0
+
+# Harmonic summation weights for harmonics 1..5
+HARMONIC_WEIGHTS = 0.8 ** np.arange(5)
+HARMONIC_OFFSETS = np.round(BINS_PER_OCTAVE * np.log2(np.arange(1, 6))).astype(int)
+# Overtone intervals (semitones) of harmonics 2, 3 and 4
+OVERTONE_INTERVALS = (12, 19, 24)
+
+
+def cqt_magnitude(audio, sr, hop_length=HOP_LENGTH):
+    """|CQT| on the engine's pitch grid, shaped (N_PITCHES * 3, frames)."""
+    fmin = librosa.midi_to_hz(MIN_PITCH - 1.0 / BINS_PER_SEMITONE)
+    n_bins = N_PITCHES * BINS_PER_SEMITONE
+    # Keep the top bin below Nyquist for low sample rates
+    max_bins = int(np.floor(BINS_PER_OCTAVE * np.log2(0.95 * sr / 2 / fmin)))
+    cqt = np.abs(librosa.cqt(audio, sr=sr, hop_length=hop_length, fmin=fmin,
+                             n_bins=min(n_bins, max_bins), bins_per_octave=BINS_PER_OCTAVE))
+    if cqt.shape[0] < n_bins:
+        cqt = np.pad(cqt, ((0, n_bins - cqt.shape[0]), (0, 0)))
+    return cqt
+
+
+def harmonic_salience(cqt):
+    """
+    Harmonic-summation salience per semitone.
+
+    Returns:
+        tuple: (salience, fundamental) both shaped (N_PITCHES, frames), where
+        `fundamental` is the plain CQT energy folded to semitones.
+    """
+    n_bins, n_frames = cqt.shape
+    padded = np.pad(cqt, ((0, HARMONIC_OFFSETS[-1]), (0, 0)))
+    salience = np.zeros_like(cqt)
+    for weight, offset in zip(HARMONIC_WEIGHTS, HARMONIC_OFFSETS):
+        salience += weight * padded[offset:offset + n_bins]
+
+    fold = (N_PITCHES, BINS_PER_SEMITONE, n_frames)
+    return salience.reshape(fold).max(axis=1), cqt.reshape(fold).max(axis=1)
+
+
+def pick_pitches(salience, fundamental, threshold=0.3, fundamental_threshold=0.1,
+                 max_polyphony=6, overtone_ratio=0.6):
+    """
+    Boolean (pitch, frame) activity from salience, with no per-frame loop.
+
+    A pitch is active in a frame when it is a local salience peak across
+    pitch, above `threshold` of the frame (and global) maximum, carries its
+    own fundamental energy, is not a weak overtone of an active lower pitch
+    and ranks within the frame's `max_polyphony` strongest peaks.
+    """
+    eps = 1e-10
+    frame_max = salience.max(axis=0, keepdims=True)
+    floor = np.maximum(threshold * frame_max, threshold * 0.1 * salience.max())
+
+    padded = np.pad(salience, ((1, 1), (0, 0)))
+    peaks = (salience >= padded[:-2]) & (salience >= padded[2:]) & (salience > floor + eps)
+    peaks &= fundamental >= fundamental_threshold * (fundamental.max(axis=0, keepdims=True) + eps)
+
+    # Drop overtones of stronger active pitches
+    overtone = np.zeros_like(peaks)
+    for interval in OVERTONE_INTERVALS:
+        lower = np.zeros_like(salience)
+        lower[interval:] = np.where(peaks[:-interval], salience[:-interval], 0)
+        overtone |= salience < overtone_ratio * lower
+    peaks &= ~overtone
+
+    if max_polyphony and salience.shape[0] > max_polyphony:
+        ranked = np.where(peaks, salience, -np.inf)
+        kth = np.partition(ranked, -max_polyphony, axis=0)[-max_polyphony]
+        peaks &= ranked >= kth
+    return peaks
+
+
+def track_notes(active, salience, min_frames=3, max_gap=2, reonset_ratio=2.0):
+    """
+    Turn frame activity into notes with array operations.
+
+    Gaps of up to `max_gap` frames are bridged and notes shorter than
+    `min_frames` dropped before onsets/offsets are read off the transitions.
+    A sustained pitch is split into a new note where its salience jumps by
+    `reonset_ratio` over two frames (a re-attack).
+
+    Returns:
+        tuple: (pitch_index, onset_frame, offset_frame, mean_salience) arrays.
+    """
+    pad = max(max_gap, min_frames)
+    active = np.pad(active, ((0, 0), (pad, pad)))
+    if max_gap > 0:
+        active = ndimage.binary_closing(active, structure=np.ones((1, max_gap + 1), bool))
+    if min_frames > 1:
+        active = ndimage.binary_opening(active, structure=np.ones((1, min_frames), bool))
+    active = active[:, pad:-pad]
+
+    edges = np.diff(np.pad(active.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+    rising = edges[:, :-1] == 1
+    falling = edges == -1
+
+    if reonset_ratio:
+        eps = 1e-10
+        jump = np.zeros_like(active)
+        jump[:, 2:] = salience[:, 2:] > reonset_ratio * (salience[:, :-2] + eps)
+        # Frames since the current note started; attacks keep rising for a few frames
+        frames = np.arange(active.shape[1])
+        age = frames - np.maximum.accumulate(np.where(rising, frames, 0), axis=1)
+        # Only the first frame of a jump starts a note
+        split = jump & ~np.pad(jump, ((0, 0), (1, 0)))[:, :-1] & active & (age >= 2 * min_frames)
+        rising |= split
+        falling[:, :-1] |= split
+
+    # Row-major nonzero keeps onsets and offsets of each pitch paired in order
+    pitch_idx, onsets = np.nonzero(rising)
+    _, offsets = np.nonzero(falling)
+
+    cumulative = np.pad(np.cumsum(salience, axis=1), ((0, 0), (1, 0)))
+    mean_salience = (cumulative[pitch_idx, offsets] - cumulative[pitch_idx, onsets]) / np.maximum(offsets - onsets, 1)
+    return pitch_idx, onsets, offsets, mean_salience
+
+
+def cqt_salience(audio, sr, hop_length=HOP_LENGTH):
+    """
+    `harmonic_salience` of the signal's CQT, stacked as (2, N_PITCHES, frames).
+
+    Salience is frame-local, so chunks of a long signal can be reduced one
+    by one without ever holding the CQT of the whole signal.
+    """
+    return np.stack(harmonic_salience(cqt_magnitude(audio, sr, hop_length)))
+
+
+def transcribe_polyphonic(audio, sr, cqt=None, hop_length=HOP_LENGTH, salience=None, **pick_kwargs):
+    """
+    Vectorized multi-pitch transcription.
+
+    Args:
+        audio (np.ndarray): Mono signal.
+        sr (int): Sample rate.
+        cqt (np.ndarray): Precomputed `cqt_magnitude(audio, sr)`.
+        salience (np.ndarray): Precomputed `cqt_salience(audio, sr)`; `cqt` is not needed then.
+        **pick_kwargs: Passed to `pick_pitches`.
+
+    Returns:
+        NoteArray: Notes sorted by onset, then pitch.
+    """
+    if salience is not None:
+        salience, fundamental = salience
+    else:
+        if cqt is None:
+            cqt = cqt_magnitude(audio, sr, hop_length)
+        salience, fundamental = harmonic_salience(cqt)
+    active = pick_pitches(salience, fundamental, **pick_kwargs)
+    pitch_idx, on, off, strength = track_notes(active, salience)
+
+    order = np.lexsort((pitch_idx, on))
+    onsets = librosa.frames_to_time(on[order], sr=sr, hop_length=hop_length)
+    offsets = librosa.frames_to_time(off[order], sr=sr, hop_length=hop_length)
+    pitches = pitch_idx[order] + MIN_PITCH
+    velocity = np.clip(np.sqrt(strength[order] / (salience.max() + 1e-10)), 0.1, 1.0)
+
+    return NoteArray.from_arrays(onsets, offsets, pitches, velocity)
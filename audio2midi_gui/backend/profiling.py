@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import logging
+import itertools
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+# Calls to profile: '1' or 'all' for every kind, or a comma list ('separate,transcribe')
+PROFILE_ENV = "AUDIO2MIDI_PROFILE"
+KINDS = ('separate', 'transcribe')
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+MEMORY_INTERVAL = 0.25  # seconds between checks for a new traced-memory high
+PEAK_GROWTH = 1.1  # snapshot again when traced memory exceeds the last snapshot by this factor
+TRACEMALLOC_FRAMES = 1  # allocations are reported per line; deeper tracebacks multiply the overhead
+TOP_ALLOCATORS = 25
+
+# One profiled call per process at a time: cProfile and tracemalloc are process-wide
+_busy = threading.Lock()
+
+
+def configure(kinds):
+    """
+    Profile calls of `kinds` ('all', a kind, or a list of kinds; None turns it off).
+
+    Set through the environment, so worker processes started afterwards
+    profile their calls too.
+    """
+    if not kinds:
+        os.environ.pop(PROFILE_ENV, None)
+        return
+    if not isinstance(kinds, str):
+        kinds = ','.join(kinds)
+    os.environ[PROFILE_ENV] = kinds
+
+
+def enabled(kind):
+    value = os.environ.get(PROFILE_ENV, '')
+    if value in ('', '0'):
+        return False
+    return value in ('1', 'all') or kind in value.split(',')
+
+
+@contextmanager
+def profiled(kind, out_dir, label):
+    """
+    Profile the body when `PROFILE_ENV` selects `kind`; otherwise do nothing.
+
+    Writes, into `out_dir`:
+        <label>.<kind>.prof: cProfile dump of the calling thread (pstats, snakeviz).
+        <label>.<kind>.alloc.txt: tracemalloc peak and the top allocating
+            lines near the peak and at exit.
+        <label>.<kind>.folded: stacks of every thread sampled every
+            SAMPLE_INTERVAL, in collapsed format (flamegraph.pl, speedscope).
+
+    When profiling is off this costs one environment lookup. A call made
+    while another profiled call runs in the same process is not profiled.
+
+    Args:
+        kind (str): 'separate' or 'transcribe'.
+        out_dir (str): Where the profile files go (next to the call's outputs).
+        label (str): File name prefix, e.g. the stem name.
+
+    Yields:
+        dict: Paths of the files that will be written, or None when not profiling.
+    """
+    if not enabled(kind) or not _busy.acquire(blocking=False):
+        yield None
+        return
+
+    base = Path(out_dir) / f"{label}.{kind}"
+    paths = {'cprofile': f"{base}.prof", 'allocations': f"{base}.alloc.txt", 'stacks': f"{base}.folded"}
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+    sampler = StackSampler(track_memory=True)
+    profile = cProfile.Profile()
+    started = time.perf_counter()
+    sampler.start()
+    profile.enable()
+    try:
+        yield paths
+    finally:
+        profile.disable()
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        try:
+            Path(out_dir).mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(paths['cprofile'])
+            _write_allocations(paths['allocations'], sampler.peak_snapshot, tracemalloc.take_snapshot(),
+                               tracemalloc.get_traced_memory()[1], elapsed)
+            sampler.write(paths['stacks'])
+            logging.info(f"Profile of {label} ({kind}, {elapsed:.1f}s) written to {base}.*")
+        except OSError as e:
+            logging.warning(f"Could not write profile {base}: {e}")
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+            _busy.release()
+
+
+def _write_allocations(path, near_peak, at_exit, peak, elapsed):
+    with open(path, 'w') as f:
+        f.write(f"peak traced: {peak / 2 ** 20:.1f} MiB over {elapsed:.2f}s\n")
+        for title, snapshot in (("near the peak", near_peak), ("still allocated at exit", at_exit)):
+            if snapshot is None:
+                continue
+            stats = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                            tracemalloc.Filter(False, __file__)]).statistics('lineno')
+            f.write(f"\n{title}: {sum(s.size for s in stats) / 2 ** 20:.1f} MiB, top {TOP_ALLOCATORS} lines:\n")
+            for stat in stats[:TOP_ALLOCATORS]:
+                frame = stat.traceback[0]
+                f.write(f"{stat.size / 2 ** 20:10.2f} MiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}\n")
+
+
+class StackSampler:
+    """
+    Samples the stacks of every thread of the process on a timer thread.
+
+    Stacks are counted in collapsed form (`thread;outer;...;inner count` per
+    line), the input format of flamegraph.pl and speedscope. The sampler
+    needs the GIL: time in C code that releases it (numpy, soxr, torch) is
+    attributed to the Python line that made the call.
+
+    With `track_memory` (and tracemalloc tracing) it also keeps a snapshot
+    taken when traced memory was near its highest, since the allocations
+    still live at the end miss the temporaries that set the peak.
+
+    Args:
+        interval (float): Seconds between samples.
+        track_memory (bool): Keep `peak_snapshot`.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, track_memory=False):
+        self.interval = interval
+        self.track_memory = track_memory
+        self.stacks = Counter()
+        self.peak_snapshot = None
+        self._peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        every = max(1, round(MEMORY_INTERVAL / self.interval))
+        for tick in itertools.count(1):
+            if self._stop.wait(self.interval):
+                break
+            if self.track_memory and tick % every == 0:
+                self._check_memory()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                # Code objects only; names are formatted once, in `write`
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self.stacks[ident, tuple(codes)] += 1
+
+    def _check_memory(self):
+        if not tracemalloc.is_tracing():
+            return
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self._peak_bytes * PEAK_GROWTH:
+            self.peak_snapshot = tracemalloc.take_snapshot()
+            self._peak_bytes = current
+
+    def collapsed(self):
+        """Counts per collapsed stack line (thread name first, innermost frame last)."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        lines = Counter()
+        for (ident, codes), count in self.stacks.items():
+            frames = [names.get(ident, f"thread-{ident}")]
+            frames += [f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                       for code in reversed(codes)]
+            lines[';'.join(frames)] += count
+        return lines
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.collapsed().most_common():
+                f.write(f"{stack} {count}\n")
@@ -0,0 +1,154 @@
+import logging
+import threading
+
+# Heavy frameworks (torch, TensorFlow) are only imported inside the
+# factories below, so importing any backend module stays cheap and the first
+# `get` pays the load cost once per process.
+
+_factories = {}
+_instances = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, factory):
+    """
+    Register a zero-argument factory that builds a backend on first use.
+
+    Args:
+        name (str): Backend name, e.g. 'demucs'.
+        factory (callable): Builds and returns the loaded backend.
+    """
+    with _registry_lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+        _locks.setdefault(name, threading.Lock())
+
+
+def get(name):
+    """
+    Return the loaded backend `name`, building it on the first call.
+
+    Concurrent callers block until the one doing the load finishes, so a
+    background warm-up and a user action never load the same model twice.
+    """
+    if name in _instances:
+        return _instances[name]
+    if name not in _factories:
+        raise KeyError(f"Unknown backend: {name}")
+    with _locks[name]:
+        if name not in _instances:
+            logging.info(f"Loading backend {name}")
+            _instances[name] = _factories[name]()
+    return _instances[name]
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def available():
+    """Names of all registered backends."""
+    return list(_factories)
+
+
+def unload(name=None):
+    """Drop one (or every) loaded backend so the next `get` rebuilds it."""
+    with _registry_lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def warm_up(names=None, on_loaded=None):
+    """
+    Load backends in a daemon thread.
+
+    Failures are logged and skipped (an optional backend may simply not be
+    installed); `on_loaded(name, ok)` is called after each attempt.
+
+    Args:
+        names (list): Backends to load; all registered ones if None.
+        on_loaded (callable): Progress callback.
+
+    Returns:
+        threading.Thread: The started loader thread.
+    """
+    names = list(names) if names is not None else available()
+
+    def run():
+        for name in names:
+            try:
+                get(name)
+                ok = True
+            except Exception as e:
+                logging.warning(f"Backend {name} unavailable: {e}")
+                ok = False
+            if on_loaded:
+                on_loaded(name, ok)
+
+    thread = threading.Thread(target=run, name="backend-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_worker(names=None):
+    """
+    Load backends in the process this runs in, waiting until done.
+
+    Submitted as a task so each scheduler worker process loads its own
+    copies up front (a warm-up in the parent process does not reach them).
+
+    Returns:
+        dict: name -> whether it loaded.
+    """
+    loaded = {}
+    warm_up(names, on_loaded=loaded.__setitem__).join()
+    return loaded
+
+
+def worker_backends(separation_backend='demucs', model='auto', device='cpu'):
+    """
+    Backends a conversion with these settings loads in the CPU workers.
+
+    Instrument detection always runs there; CREPE only for the models that
+    route to it; Demucs only when separation is not on the GPU slot, which
+    runs in the parent process instead.
+
+    Returns:
+        list: Backend names, for `warm_up` / `warm_worker`.
+    """
+    names = ['instrument_classifier']
+    if model in ('auto', 'crepe_monophonic'):
+        names.append('crepe')
+    if separation_backend == 'demucs' and device != 'cuda':
+        names.append('demucs')
+    return names
+
+
+def _demucs():
+    from backend.separation import SeparationEngine
+
+    engine = SeparationEngine()
+    engine.load()
+    return engine
+
+
+def _crepe():
+    from backend.crepe_runner import get_runner
+
+    runner = get_runner()
+    runner.load()
+    return runner
+
+
+def _instrument_classifier():
+    from backend.instrument_detect import load_classifier
+
+    return load_classifier()
+
+
+register('instrument_classifier', _instrument_classifier)
+register('crepe', _crepe)
+register('demucs', _demucs)
@@ -0,0 +1,602 @@
+import os
+import time
+import logging
+import itertools
+from functools import partial
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, BrokenExecutor
+from pathlib import Path
+from backend.separation import separate_resident, default_device
+from backend.instrument_detect import analyze_stem, choose_transcription_model
+from backend.transcribe import transcribe_stem_to_midi, transcribe_crepe_stems_to_midi
+from backend.features import StemFeatures
+from backend.cache import StemCache, TranscriptionCache
+from backend.threads import limit_threads
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pending', 'running', 'done', 'failed', 'cancelled'
+
+# Models that benefit from the GPU slot when running on CUDA
+GPU_MODELS = ('mt3', 'onsets_frames')
+# Models whose stems are transcribed together, one task per conversion (see CrepeBatch)
+BATCHED_MODELS = ('crepe_monophonic',)
+
+
+class Task:
+    """
+    One unit of work in the scheduler's graph.
+
+    `func(*args, **kwargs)` runs on the task's resource: 'cpu' tasks go to a
+    process pool (so `func` and its arguments must be picklable), 'gpu' tasks
+    to threads in the scheduler's process where models stay resident, and
+    'io' tasks (decoding, file work) to a few threads in the scheduler's
+    process, and 'inline' tasks run directly on the scheduler thread (cheap
+    glue only).
+
+    `then(result)` runs on the scheduler thread when `func` returns and may
+    return new tasks, e.g. one per separated stem; they become the task's
+    children. A task is complete once it and all of its descendants are, and
+    only then do its dependents start and `on_finish(task)` fire.
+
+    Args:
+        func (callable): Work to run.
+        args (tuple): Positional arguments for `func`.
+        kwargs (dict): Keyword arguments for `func`.
+        resource (str): 'cpu', 'gpu', 'io' or 'inline'.
+        deps (list): Tasks that must complete first.
+        then (callable): Expands the result into child tasks.
+        on_finish (callable): Called with the task once complete, failed or cancelled.
+        stage (int): Pipeline depth; among ready tasks later stages run first,
+            so songs already in flight finish before new ones start.
+        name (str): Label for logs and progress.
+        held (bool): Not started, even when ready, until `Scheduler.release`;
+            e.g. while the inputs of a batch are still being gathered.
+    """
+
+    def __init__(self, func, args=(), kwargs=None, resource='cpu', deps=(), then=None, on_finish=None,
+                 stage=0, name=None, held=False):
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.resource = resource
+        self.deps = list(deps)
+        self.then = then
+        self.on_finish = on_finish
+        self.stage = stage
+        self.held = held
+        self.name = name or getattr(func, '__name__', 'task')
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.parent = None
+        self.children = []
+        self.submitted_at = None
+        self.started_at = None
+        self.finished_at = None
+        self.completed_at = None
+        self._open = 0
+
+    def __repr__(self):
+        return f"Task({self.name}, {self.state})"
+
+    @property
+    def complete(self):
+        return self.completed_at is not None
+
+    def descendants(self):
+        for child in self.children:
+            yield child
+            yield from child.descendants()
+
+    def failures(self):
+        """This task and any descendants that failed or were cancelled."""
+        return [t for t in itertools.chain([self], self.descendants()) if t.state in (FAILED, CANCELLED)]
+
+
+class Scheduler:
+    """
+    Dependency-aware task scheduler with separate CPU and GPU slots.
+
+    Up to `cpu_slots` CPU tasks and `gpu_slots` GPU tasks run at once, and a
+    task starts as soon as its dependencies are complete and a slot of its
+    kind is free, so stems of one song are transcribed while the next song
+    is still being separated. Use `run()` to drain the graph from the calling
+    thread (headless), or `start()` to keep a background loop accepting
+    tasks (GUI).
+
+    Args:
+        cpu_slots (int): Concurrent CPU tasks; defaults to the CPU count.
+        gpu_slots (int): Concurrent GPU tasks.
+        io_slots (int): Concurrent I/O tasks (threads in this process).
+        processes (bool): Run CPU tasks in worker processes (threads if False).
+        mp_context (str): Multiprocessing start method for the CPU pool.
+        worker_threads (int): Intra-op thread cap (BLAS, TF, torch) applied in
+            every CPU worker process; see `backend.threads.plan`.
+        on_event (callable): Called on the scheduler thread with a task
+            whenever it starts or reaches a final state.
+    """
+
+    def __init__(self, cpu_slots=None, gpu_slots=1, processes=True, mp_context=None, worker_threads=None,
+                 on_event=None, io_slots=2):
+        self.slots = {'cpu': cpu_slots or os.cpu_count() or 1, 'gpu': gpu_slots, 'io': io_slots}
+        self.processes = processes
+        self.mp_context = mp_context
+        self.worker_threads = worker_threads
+        self.on_event = on_event
+        self.tasks = []
+        self._busy = {resource: 0 for resource in self.slots}
+        self._waiting = []
+        self._finished = []
+        self._order = itertools.count()
+        self._executors = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, task):
+        """Add a task (and its not yet submitted dependencies) to the graph."""
+        with self._cond:
+            self._submit(task)
+            self._cond.notify_all()
+        return task
+
+    def _submit(self, task):
+        if task.submitted_at is not None:
+            return
+        for dep in task.deps:
+            self._submit(dep)
+        task.submitted_at = time.perf_counter()
+        task._seq = next(self._order)
+        self.tasks.append(task)
+        self._waiting.append(task)
+
+    def stats(self):
+        """Task counts by state plus busy slots."""
+        with self._cond:
+            counts = {state: 0 for state in (PENDING, RUNNING, DONE, FAILED, CANCELLED)}
+            for task in self.tasks:
+                counts[task.state] += 1
+            counts['busy'] = dict(self._busy)
+            return counts
+
+    def idle(self):
+        return not self._waiting and not any(self._busy.values()) and not self._finished \
+            and all(task.complete for task in self.tasks)
+
+    def run(self, timeout=None):
+        """
+        Run until every submitted task (and everything it spawns) completes.
+
+        Returns:
+            list: All tasks, in submission order.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self.idle():
+                self._step()
+                if self.idle():
+                    break
+                if self._finished:
+                    # A future completed while we were dispatching
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Scheduler did not finish in time")
+                self._cond.wait(0.5 if remaining is None else min(remaining, 0.5))
+        return list(self.tasks)
+
+    def start(self):
+        """Process tasks on a background thread until `shutdown`."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._serve, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def _serve(self):
+        with self._cond:
+            while not self._stopping:
+                self._step()
+                if not self._finished:
+                    self._cond.wait(0.5)
+
+    def cancel(self):
+        """Drop every task that has not started; running ones finish but spawn nothing."""
+        with self._cond:
+            for task in list(self._waiting):
+                self._waiting.remove(task)
+                task.state = CANCELLED
+                self._complete(task)
+            for task in self.tasks:
+                if task.state == RUNNING:
+                    task.then = None
+            self._cond.notify_all()
+
+    def release(self, task):
+        """Let a held task start once its dependencies are complete."""
+        with self._cond:
+            task.held = False
+            self._cond.notify_all()
+
+    def shutdown(self, wait=True):
+        self.cancel()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None and wait:
+            self._thread.join()
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._executors.clear()
+
+    def _executor(self, resource):
+        if resource not in self._executors:
+            if resource == 'cpu' and self.processes:
+                context = mp.get_context(self.mp_context) if self.mp_context else None
+                initializer, initargs = (limit_threads, (self.worker_threads,)) if self.worker_threads else (None, ())
+                self._executors[resource] = ProcessPoolExecutor(self.slots['cpu'], mp_context=context,
+                                                                initializer=initializer, initargs=initargs)
+            else:
+                self._executors[resource] = ThreadPoolExecutor(self.slots[resource],
+                                                               thread_name_prefix=f"scheduler-{resource}")
+        return self._executors[resource]
+
+    def _step(self):
+        # Called with the lock held: settle finished work, then fill free slots. Work settled in
+        # the pass itself (inline tasks, failed submits) can make more tasks ready, so repeat
+        settled = True
+        while settled:
+            settled = self._fill()
+
+    def _fill(self):
+        settled = False
+        while self._finished:
+            task, result, error = self._finished.pop(0)
+            self._settle(task, result, error)
+
+        for task in sorted(self._waiting, key=lambda t: (-t.stage, t._seq)):
+            if task.held:
+                continue
+            if any(dep.state in (FAILED, CANCELLED) for dep in task.deps):
+                self._waiting.remove(task)
+                task.state = FAILED
+                task.error = "dependency failed"
+                self._complete(task)
+                settled = True
+                continue
+            if not all(dep.complete for dep in task.deps):
+                continue
+            if task.resource == 'inline':
+                self._waiting.remove(task)
+                self._start(task)
+                try:
+                    result, error = task.func(*task.args, **task.kwargs), None
+                except Exception as e:
+                    result, error = None, e
+                self._settle(task, result, error)
+                settled = True
+            elif self._busy[task.resource] < self.slots[task.resource]:
+                self._waiting.remove(task)
+                self._busy[task.resource] += 1
+                self._start(task)
+                try:
+                    future = self._executor(task.resource).submit(task.func, *task.args, **task.kwargs)
+                except Exception as e:
+                    # A worker died (BrokenProcessPool) or the pool is shut down; later tasks get a new pool
+                    self._busy[task.resource] -= 1
+                    if isinstance(e, BrokenExecutor):
+                        self._executors.pop(task.resource).shutdown(wait=False)
+                    self._settle(task, None, e)
+                    settled = True
+                    continue
+                future.add_done_callback(lambda f, task=task: self._on_future(task, f))
+        return settled
+
+    def _start(self, task):
+        task.state = RUNNING
+        task.started_at = time.perf_counter()
+        self._notify(task)
+
+    def _on_future(self, task, future):
+        try:
+            result, error = future.result(), None
+        except Exception as e:
+            result, error = None, e
+        with self._cond:
+            self._busy[task.resource] -= 1
+            self._finished.append((task, result, error))
+            self._cond.notify_all()
+
+    def _settle(self, task, result, error):
+        task.finished_at = time.perf_counter()
+        if error is not None:
+            logging.error(f"Task {task.name} failed: {error}")
+            task.state = FAILED
+            task.error = str(error)
+            self._complete(task)
+            return
+
+        task.state = DONE
+        task.result = result
+        if task.then is not None:
+            try:
+                children = task.then(result) or []
+            except Exception as e:
+                logging.error(f"Expanding task {task.name} failed: {e}")
+                task.state = FAILED
+                task.error = str(e)
+                children = []
+            for child in children:
+                child.parent = task
+                task.children.append(child)
+                task._open += 1
+                self._submit(child)
+        if task._open == 0:
+            self._complete(task)
+
+    def _complete(self, task):
+        task.completed_at = time.perf_counter()
+        if task.finished_at is None:
+            task.finished_at = task.completed_at
+        self._notify(task)
+        if task.on_finish is not None:
+            try:
+                task.on_finish(task)
+            except Exception as e:
+                logging.error(f"on_finish of {task.name} failed: {e}")
+        parent = task.parent
+        if parent is not None:
+            parent._open -= 1
+            if parent._open == 0 and parent.state in (DONE, FAILED):
+                self._complete(parent)
+
+    def _notify(self, task):
+        if self.on_event is not None:
+            try:
+                self.on_event(task)
+            except Exception as e:
+                logging.error(f"Scheduler event handler failed: {e}")
+
+
+# Pipeline stages. Module-level functions so CPU tasks can run in worker processes.
+
+def _features(stem_path, audio=None):
+    # A shared-memory handle maps the parent's decode instead of reading the file again
+    return StemFeatures.from_shared(audio) if audio is not None else StemFeatures(stem_path)
+
+
+def detect_task(stem_path, audio=None):
+    return analyze_stem(stem_path, features=_features(stem_path, audio))
+
+
+def transcribe_task(stem_path, instrument, model='auto', device='cpu', out_midi_path=None, features=None,
+                    audio=None, cache=None):
+    if out_midi_path is None:
+        out_midi_path = str(Path(stem_path).with_suffix('.mid'))
+    if features is None:
+        features = _features(stem_path, audio)
+    _, summary = transcribe_stem_to_midi(stem_path, instrument_hint=instrument, model=model,
+                                         out_midi_path=out_midi_path, device=device, features=features,
+                                         cache=cache)
+    summary['instrument'] = instrument
+    summary['stem_path'] = str(stem_path)
+    return summary
+
+
+def detect_and_transcribe_task(stem_path, model='auto', device='cpu', out_midi_path=None, audio=None, cache=None,
+                               defer=()):
+    # Both stages on one worker share a single decode and set of transforms
+    features = _features(stem_path, audio)
+    # A silent stem has no instrument to detect; transcription skips it too
+    instrument = analyze_stem(stem_path, features=features) if features.active_regions() else 'unknown'
+    if routed_model(instrument, model) in defer:
+        # Left to the stem's batch (see CrepeBatch)
+        return {'deferred': True, 'instrument': instrument}
+    return transcribe_task(stem_path, instrument, model, device, out_midi_path, features, cache=cache)
+
+
+def crepe_batch_task(items, device='cpu', cache=None):
+    # items: (stem_path, instrument, out_midi_path, audio) per stem, gathered by CrepeBatch
+    stems = [(stem_path, instrument, out_midi_path, _features(stem_path, audio))
+             for stem_path, instrument, out_midi_path, audio in items]
+    summaries = []
+    for (stem_path, instrument, _, _), (_, summary) in zip(
+            items, transcribe_crepe_stems_to_midi(stems, device=device, cache=cache)):
+        summary['instrument'] = instrument
+        summary['stem_path'] = str(stem_path)
+        summaries.append(summary)
+    return summaries
+
+
+def batch_item(batch, index):
+    return batch.result[index]
+
+
+def routed_model(instrument, model='auto'):
+    """Model that will transcribe a stem of `instrument` when `model` is requested."""
+    return choose_transcription_model({'instrument': instrument}) if model == 'auto' else model
+
+
+def transcription_resource(instrument, model='auto', device='cpu'):
+    """'gpu' when the model that will run for `instrument` uses the GPU slot."""
+    return 'gpu' if device == 'cuda' and routed_model(instrument, model) in GPU_MODELS else 'cpu'
+
+
+class CrepeBatch:
+    """
+    Gathers the CREPE-routed stems of one conversion into one transcription task.
+
+    A stem is usually too short to fill the network's batches on its own, so
+    the frames of every CREPE stem are pitch-tracked in one `predict_many`
+    call (see `transcribe_crepe_stems_to_midi`). Each stem reports once its
+    instrument is known: `add` if it goes to CREPE, `done` otherwise (or if
+    it failed first); after the last report the batch task is released.
+    A CREPE stem's chain ends in an inline task that picks the stem's own
+    summary from the batch, so `stem_result` works as for any other stem.
+    Methods run on the scheduler thread.
+
+    Args:
+        scheduler (Scheduler): Scheduler the stems run on.
+        stem_paths (list): Every stem that will report.
+        device (str): Transcription device.
+        cache (TranscriptionCache): Notes cache, as for single stems.
+    """
+
+    def __init__(self, scheduler, stem_paths, device='cpu', cache=None, stage=2):
+        self.scheduler = scheduler
+        self.waiting = {str(path) for path in stem_paths}
+        self.items = []
+        self.task = Task(crepe_batch_task, args=(self.items,), kwargs={'device': device, 'cache': cache},
+                         stage=stage, name="transcribe CREPE stems", held=True)
+
+    def add(self, stem_path, instrument, out_midi_path=None, audio=None):
+        """Transcribe `stem_path` in the batch; returns the task that completes with its summary."""
+        self.items.append((stem_path, instrument, out_midi_path, audio))
+        item = Task(batch_item, args=(self.task, len(self.items) - 1), resource='inline', deps=(self.task,),
+                    stage=self.task.stage, name=f"transcribe {Path(stem_path).stem}")
+        self.done(stem_path)
+        return item
+
+    def done(self, stem_path):
+        """`stem_path` adds nothing (more) to the batch; repeated calls are ignored."""
+        self.waiting.discard(str(stem_path))
+        if not self.waiting:
+            self.scheduler.release(self.task)
+
+
+def shared_task(shared, stem_path, make_task, stage=1, on_finish=None):
+    """
+    Decode a stem once into shared memory, then hand its handle to `make_task`.
+
+    The decode runs on an 'io' slot in this process; `make_task(handle)`
+    builds the task(s) that use it. The signal is released when they all
+    complete, fail or are cancelled.
+
+    Args:
+        shared (SharedAudioPool): Owner of the decoded signal.
+        stem_path (str): Stem to decode.
+        make_task (callable): handle -> Task.
+        on_finish (callable): Called with the returned task once complete.
+
+    Returns:
+        Task: Unsubmitted decode task; see `stem_result` for the final result.
+    """
+    def finish(task):
+        shared.release(stem_path)
+        if on_finish is not None:
+            on_finish(task)
+
+    return Task(shared.put, args=(stem_path,), resource='io', then=lambda audio: [make_task(audio)],
+                stage=stage, on_finish=finish, name=f"decode {Path(stem_path).stem}")
+
+
+def stem_task(stem_path, model='auto', device='cpu', out_midi_path=None, stage=1, on_finish=None, shared=None,
+              audio=None, cache=None, batch=None):
+    """
+    Task that detects the instrument of one stem and transcribes it.
+
+    On the CPU both stages run as one task; on CUDA detection runs first so
+    transcription can be routed to the GPU slot when its model needs it.
+    With a `shared` pool the stem is decoded once and every stage maps the
+    same samples (`audio` is that handle on the inner tasks). A
+    TranscriptionCache `cache` is consulted by the transcription stage.
+    With a CrepeBatch `batch`, a stem routed to a BATCHED_MODELS model is
+    transcribed by the batch instead of on its own.
+
+    Returns:
+        Task: Unsubmitted; completes when the stem's MIDI is written (see `stem_result`).
+    """
+    if shared is not None:
+        return shared_task(shared, stem_path,
+                           lambda audio: stem_task(stem_path, model, device, out_midi_path, stage, audio=audio,
+                                                   cache=cache, batch=batch),
+                           stage=stage, on_finish=on_finish)
+
+    name = Path(stem_path).stem
+    if device != 'cuda':
+        if batch is None:
+            return Task(detect_and_transcribe_task, args=(stem_path, model, device, out_midi_path, audio),
+                        kwargs={'cache': cache},
+                        stage=stage + 1, on_finish=on_finish, name=f"transcribe {name}")
+
+        def defer(result):
+            if isinstance(result, dict) and result.get('deferred'):
+                return [batch.add(stem_path, result['instrument'], out_midi_path, audio)]
+            batch.done(stem_path)
+            return []
+
+        return Task(detect_and_transcribe_task, args=(stem_path, model, device, out_midi_path, audio),
+                    kwargs={'cache': cache, 'defer': BATCHED_MODELS}, then=defer,
+                    stage=stage + 1, on_finish=on_finish, name=f"transcribe {name}")
+
+    def route(instrument):
+        if batch is not None:
+            if routed_model(instrument, model) in BATCHED_MODELS:
+                return [batch.add(stem_path, instrument, out_midi_path, audio)]
+            batch.done(stem_path)
+        return [Task(transcribe_task, args=(stem_path, instrument, model, device, out_midi_path),
+                     kwargs={'audio': audio, 'cache': cache}, resource=transcription_resource(instrument, model, device),
+                     stage=stage + 1, name=f"transcribe {name}")]
+
+    return Task(detect_task, args=(stem_path, audio), then=route, stage=stage, on_finish=on_finish,
+                name=f"detect {name}")
+
+
+def stem_result(task):
+    """Result of the last stage of a finished `stem_task`/`shared_task` chain, or None if it failed."""
+    leaf = task
+    while leaf.children:
+        leaf = leaf.children[-1]
+    return leaf.result if leaf.state == DONE and not task.failures() else None
+
+
+def submit_conversion(scheduler, input_path, out_dir, device=None, model='auto', separation_backend='demucs',
+                      cache_dir=None, chunk_seconds=None, separate_fn=None, shared=None, on_finish=None,
+                      notes_cache_dir=None, on_stem=None):
+    """
+    Schedule separate -> detect -> transcribe for one input.
+
+    Each stem's work is submitted the moment separation returns, so with
+    several inputs in flight separation of one overlaps transcription of
+    another. Stems routed to CREPE are transcribed together in one task
+    once every stem of the input is detected (see CrepeBatch).
+
+    Args:
+        scheduler (Scheduler): Target scheduler.
+        input_path (str): Audio file.
+        out_dir (str): Directory for the stems and their .mid files.
+        device (str): 'cuda' or 'cpu'; auto-detected if None.
+        separate_fn (callable): Replacement for `separate_resident` with the same signature.
+        shared (SharedAudioPool): Decode each stem once into shared memory for its workers.
+        on_finish (callable): Called with the root task once every stem is done.
+        notes_cache_dir (str): TranscriptionCache directory; stems whose notes
+            are cached are written from the cache instead of transcribed.
+        on_stem (callable): Called with each stem's task as soon as that stem
+            is done (see `stem_result`), before the others finish.
+
+    Returns:
+        Task: Root (separation) task; its children are the tasks of the active stems.
+    """
+    if device is None:
+        device = default_device()
+    cache = StemCache(cache_dir) if cache_dir else None
+    notes_cache = TranscriptionCache(notes_cache_dir) if notes_cache_dir else None
+
+    def expand(stems):
+        # Stems separation found silent (e.g. drums of an a cappella track) are not transcribed at all
+        paths = [stem['path'] for stem in stems if stem.get('active', True)]
+        batch = CrepeBatch(scheduler, paths, device, notes_cache) if model in ('auto',) + BATCHED_MODELS else None
+        return [stem_task(path, model, device, shared=shared, cache=notes_cache, batch=batch,
+                          on_finish=partial(stem_done, batch, path))
+                for path in paths]
+
+    def stem_done(batch, stem_path, task):
+        # A stem that failed before its instrument was known must not keep the batch waiting
+        if batch is not None:
+            batch.done(stem_path)
+        if on_stem is not None:
+            on_stem(task)
+
+    return scheduler.submit(Task(
+        separate_fn or separate_resident, args=(input_path, out_dir),
+        kwargs={'device': device, 'backend': separation_backend, 'cache': cache, 'chunk_seconds': chunk_seconds},
+        resource='gpu' if device == 'cuda' else 'cpu', then=expand, on_finish=on_finish, stage=0,
+        name=f"separate {Path(input_path).name}"))
@@ -1,12 +1,276 @@
 import os
 import json
-import torch
+import hashlib
+import logging
+import numpy as np
 import soundfile as sf
 import subprocess
 import sys
+import threading
+from collections import Counter
 from pathlib import Path
+from backend.utils import hash_audio, normalize_wav, audio_duration
+from backend.activity import file_activity
+from backend import registry, metrics, profiling
+from backend.threads import apply_framework_limits
 
-def separate(input_path, out_dir, stems=4, device=None):
+STEM_NAMES = ['vocals', 'drums', 'bass', 'other']
+SPLEETER_SR = 44100
+
+# Engines for devices other than the registry's (see resident_engine)
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def default_device():
+    """'cuda' when torch sees a GPU, else 'cpu' (torch is imported here, not at module load)."""
+    try:
+        import torch
+    except ImportError:
+        return 'cpu'
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+class SeparationEngine:
+    """
+    Long-lived Demucs separator that keeps the model resident between calls.
+
+    Loading torch and the Demucs weights dominates the cost of short tracks,
+    so batch callers create one engine and feed it many inputs instead of
+    spawning `python -m demucs` per file.
+
+    Args:
+        model_name (str): Demucs pretrained model name.
+        device (str): 'cuda' or 'cpu'. If None, auto-detect.
+        shifts (int): Number of random shifts for the equivariant stabilization.
+        overlap (float): Overlap between Demucs' internal segments.
+    """
+
+    def __init__(self, model_name='htdemucs', device=None, shifts=1, overlap=0.25):
+        if device is None:
+            device = default_device()
+        self.model_name = model_name
+        self.device = device
+        self.shifts = shifts
+        self.overlap = overlap
+        self._model = None
+
+    @property
+    def samplerate(self):
+        return self.load().samplerate
+
+    def load(self):
+        """Load the Demucs model once and keep it on the target device."""
+        if self._model is None:
+            from demucs.pretrained import get_model
+
+            apply_framework_limits()
+            model = get_model(self.model_name)
+            model.to(self.device)
+            model.eval()
+            self._model = model
+        return self._model
+
+    def separate_array(self, audio, sr):
+        """
+        Separate an in-memory signal.
+
+        Args:
+            audio (np.ndarray): Samples shaped (frames,) or (frames, channels).
+            sr (int): Sample rate of `audio`.
+
+        Returns:
+            dict: Stem name -> float32 array shaped (frames, channels) at the model rate.
+        """
+        import torch
+        from demucs.apply import apply_model
+        from demucs.audio import convert_audio
+
+        model = self.load()
+        if audio.ndim == 1:
+            audio = audio[:, None]
+        wav = torch.from_numpy(np.ascontiguousarray(audio.T, dtype=np.float32))
+        wav = convert_audio(wav, sr, model.samplerate, model.audio_channels)
+
+        ref = wav.mean(0)
+        mean, std = ref.mean(), ref.std()
+        if std == 0:
+            std = torch.tensor(1.0)
+        with torch.no_grad():
+            sources = apply_model(model, ((wav - mean) / std)[None], device=self.device,
+                                  shifts=self.shifts, split=True, overlap=self.overlap,
+                                  progress=False)[0]
+        sources = sources * std + mean
+
+        return {name: source.cpu().numpy().T for name, source in zip(model.sources, sources)}
+
+    def separate(self, input_path, out_dir, chunk_seconds=None, overlap_seconds=None):
+        """
+        Separate one file and write its stems, like `separate` does.
+
+        Args:
+            input_path (str): Path to input audio file.
+            out_dir (str): Output directory for stems.
+            chunk_seconds (float): If set, separate in overlapping windows of
+                this length with bounded memory (see `separate_chunked`).
+            overlap_seconds (float): Crossfade length between windows
+                (default: see `separate_chunked`).
+
+        Returns:
+            list: JSON summary of stems with path, duration, sample_rate, channels,
+                active and active_seconds.
+        """
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        if chunk_seconds:
+            return separate_chunked(input_path, out_dir, self.separate_array,
+                                    chunk_seconds=chunk_seconds,
+                                    overlap_seconds=overlap_seconds,
+                                    out_sr=self.samplerate)
+
+        audio, sr = sf.read(str(input_path), dtype='float32', always_2d=True)
+        stems = self.separate_array(audio, sr)
+        for name in STEM_NAMES:
+            sf.write(str(out_dir / f"{name}.wav"), stems[name], self.samplerate, subtype='PCM_16')
+
+        return _summarize_stems(out_dir, STEM_NAMES)
+
+    def separate_many(self, input_paths, out_root):
+        """
+        Separate many files with the same resident model.
+
+        Stems for each input go to `<out_root>/<input stem>/`; inputs from
+        different directories that share a name get `<input stem>-<path hash>/`.
+
+        Returns:
+            dict: Input path -> stem summary list.
+        """
+        names = Counter(Path(input_path).stem for input_path in set(map(str, input_paths)))
+        results = {}
+        for input_path in input_paths:
+            name = Path(input_path).stem
+            if names[name] > 1:
+                name += '-' + hashlib.sha1(str(Path(input_path).resolve()).encode()).hexdigest()[:8]
+            results[str(input_path)] = self.separate(input_path, Path(out_root) / name)
+        return results
+
+
+def separate_chunked(input_path, out_dir, separate_block, stem_names=STEM_NAMES,
+                     chunk_seconds=30.0, overlap_seconds=None, out_sr=None):
+    """
+    Separate a long recording in overlapping windows with flat peak memory.
+
+    Each window is read from disk, separated, crossfaded with the tail of the
+    previous window (overlap-add with complementary sin^2/cos^2 ramps) and
+    streamed to the stem files block by block. Only one window and one
+    overlap tail per stem are ever held in memory.
+
+    Args:
+        input_path (str): Path to input audio file.
+        out_dir (str): Output directory for stems.
+        separate_block (callable): `(audio, sr) -> {stem: array}` where `audio`
+            is (frames, channels) float32 and each stem array is
+            (frames, channels) at `out_sr`.
+        stem_names (list): Stems to write.
+        chunk_seconds (float): Window length.
+        overlap_seconds (float): Crossfade length between windows, shorter
+            than `chunk_seconds`. Defaults to 2 s, or a quarter of windows
+            shorter than 8 s.
+        out_sr (int): Sample rate produced by `separate_block`. Defaults to
+            the input rate.
+
+    Returns:
+        list: JSON summary of stems with path, duration, sample_rate, channels,
+            active and active_seconds.
+
+    Raises:
+        ValueError: If the window is empty or the overlap is negative or not
+            shorter than the window.
+    """
+    if overlap_seconds is None:
+        overlap_seconds = min(2.0, chunk_seconds / 4)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    writers = {}
+    tails = {}
+    try:
+        with sf.SoundFile(str(input_path)) as src:
+            sr = src.samplerate
+            out_sr = out_sr or sr
+            ratio = out_sr / sr
+            total = src.frames
+            chunk = int(round(chunk_seconds * sr))
+            overlap = int(round(overlap_seconds * sr))
+            if chunk <= 0 or not 0 <= overlap < chunk:
+                raise ValueError(f"Need 0 <= overlap < chunk, got chunk_seconds={chunk_seconds}, "
+                                 f"overlap_seconds={overlap_seconds}")
+            hop = chunk - overlap
+
+            start = 0
+            while start < total:
+                src.seek(start)
+                block = src.read(min(chunk, total - start), dtype='float32', always_2d=True)
+                stems = separate_block(block, sr)
+
+                end = start + len(block)
+                is_last = end >= total
+                out_start = int(round(start * ratio))
+                next_out_start = int(round((start + hop) * ratio))
+
+                for name in stem_names:
+                    data = np.asarray(stems[name], dtype=np.float32)
+                    if data.ndim == 1:
+                        data = data[:, None]
+                    if name not in writers:
+                        writers[name] = sf.SoundFile(str(out_dir / f"{name}.wav"), 'w',
+                                                     samplerate=out_sr, channels=data.shape[1],
+                                                     subtype='PCM_16')
+
+                    tail = tails.pop(name, None)
+                    if tail is not None:
+                        n = min(len(tail), len(data))
+                        fade_in = np.sin(0.5 * np.pi * (np.arange(n) + 0.5) / n)[:, None] ** 2
+                        data = data.copy()
+                        data[:n] = tail[:n] * (1.0 - fade_in) + data[:n] * fade_in
+
+                    if is_last:
+                        writers[name].write(data)
+                    else:
+                        keep = min(max(out_start + len(data) - next_out_start, 0), len(data))
+                        writers[name].write(data[:len(data) - keep])
+                        tails[name] = data[len(data) - keep:]
+
+                if is_last:
+                    break
+                start += hop
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return _summarize_stems(out_dir, stem_names)
+
+
+def _spleeter_block_separator():
+    # Spleeter assumes 44.1 kHz input; blocks arrive at the file's rate, stems leave at SPLEETER_SR
+    import soxr
+    from spleeter.separator import Separator
+
+    separator = Separator('spleeter:4stems')
+
+    def separate_block(audio, sr):
+        if sr != SPLEETER_SR:
+            audio = soxr.resample(audio, sr, SPLEETER_SR).astype(np.float32)
+        if audio.shape[1] == 1:
+            audio = np.repeat(audio, 2, axis=1)
+        return separator.separate(audio)
+
+    return separate_block
+
+
+def separate(input_path, out_dir, stems=4, device=None, engine=None, chunk_seconds=None,
+             backend='demucs', cache=None):
     """
     Separates audio into stems using Demucs (preferred) or Spleeter (fallback).
 
@@ -15,18 +279,99 @@ def separate(input_path, out_dir, stems=4, device=None):
         out_dir (str): Output directory for stems.
         stems (int): Number of stems (4 for Demucs/Spleeter).
         device (str): 'cuda' or 'cpu'. If None, auto-detect.
+        engine (SeparationEngine): Resident engine to run Demucs in-process
+            instead of spawning a subprocess.
+        chunk_seconds (float): If set, separate in-process in overlapping
+            windows of this length so memory stays flat for long recordings.
+        backend (str): 'demucs' (falls back to Spleeter) or 'spleeter'.
+        cache (StemCache): Content-addressed store; a hit for the same decoded
+            audio and parameters is copied into `out_dir` without separating.
+
+    With profiling on (see `backend.profiling`) the call's profiles are
+    written to `out_dir` next to the stems.
 
     Returns:
-        list: JSON summary of stems with path, duration, sample_rate, channels.
+        list: JSON summary of stems with path, duration, sample_rate, channels,
+            active and active_seconds.
     """
     if device is None:
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        device = engine.device if engine is not None else default_device()
 
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
+    with profiling.profiled('separate', out_dir, Path(input_path).stem):
+        return _separate(input_path, out_dir, stems, device, engine, chunk_seconds, backend, cache)
+
+
+def _separate(input_path, out_dir, stems, device, engine, chunk_seconds, backend, cache):
+    with metrics.stage('separate', audio_duration(input_path), backend=backend, device=device) as record:
+        if cache is None:
+            summary, record['backend'] = _separate_uncached(input_path, out_dir, stems, device, engine,
+                                                            chunk_seconds, backend)
+            return summary
+
+        # Only the requested backend's output is a hit; a Spleeter fallback is stored under 'spleeter'
+        audio_hash = hash_audio(input_path)
+        summary = cache.fetch(cache.key(audio_hash, backend, stems, device, chunk_seconds), out_dir)
+        if summary is not None:
+            record.update(backend=backend, cache='hit')
+            return summary
+
+        summary, used = _separate_uncached(input_path, out_dir, stems, device, engine, chunk_seconds, backend)
+        record.update(backend=used, cache='miss')
+        cache.store(cache.key(audio_hash, used, stems, device, chunk_seconds), summary, used)
+        return summary
+
+
+def separate_resident(input_path, out_dir, device=None, backend='demucs', cache=None, chunk_seconds=None):
+    """
+    `separate` with this process' resident Demucs engine from the registry.
+
+    The engine is loaded once per process (or reused after a warm-up); if it
+    cannot be loaded, or runs on a different device than requested, this
+    falls back to plain `separate`.
+    """
+    engine = None
+    if backend == 'demucs':
+        try:
+            engine = registry.get('demucs')
+        except Exception as e:
+            logging.warning(f"Demucs engine unavailable, using the CLI: {e}")
+        if engine is not None and device is not None and engine.device != device:
+            engine = None
+    return separate(input_path, out_dir, device=device, engine=engine, chunk_seconds=chunk_seconds,
+                    backend=backend, cache=cache)
+
+
+def resident_engine(device=None):
+    """
+    This process' Demucs engine for `device`, loaded once and kept.
+
+    The default device uses the registry's engine (the one warm-ups load);
+    any other device gets one engine of its own, reused by later calls.
+    """
+    if device is None or device == default_device():
+        return registry.get('demucs')
+    with _engines_lock:
+        if device not in _engines:
+            engine = SeparationEngine(device=device)
+            engine.load()
+            _engines[device] = engine
+    return _engines[device]
+
+
+def _separate_uncached(input_path, out_dir, stems, device, engine, chunk_seconds, backend):
     # Try Demucs first
     try:
+        if backend == 'spleeter':
+            raise RuntimeError("Spleeter requested")
+        if chunk_seconds and engine is None:
+            # Chunking runs in-process: use (and keep) this process' resident engine
+            engine = resident_engine(device)
+        if engine is not None:
+            return engine.separate(input_path, out_dir, chunk_seconds=chunk_seconds), 'demucs'
+
         # Use subprocess to call demucs CLI
         cmd = [
             sys.executable, '-m', 'demucs',
@@ -39,45 +384,40 @@ def separate(input_path, out_dir, stems=4, device=None):
         if result.returncode != 0:
             raise Exception(f"Demucs failed: {result.stderr}")
 
-        stem_names = ['vocals', 'drums', 'bass', 'other']
+        stem_names = STEM_NAMES
 
     except (subprocess.TimeoutExpired, subprocess.CalledProcessError, Exception) as e:
-        print(f"Demucs failed: {e}. Falling back to Spleeter.")
+        if backend != 'spleeter':
+            print(f"Demucs failed: {e}. Falling back to Spleeter.")
         # Fallback to Spleeter
         try:
+            if chunk_seconds:
+                return separate_chunked(input_path, out_dir, _spleeter_block_separator(),
+                                        chunk_seconds=chunk_seconds, out_sr=SPLEETER_SR), 'spleeter'
+
             from spleeter.separator import Separator
 
             separator = Separator('spleeter:4stems')
             separator.separate_to_file(input_path, str(out_dir))
 
-            stem_names = ['vocals', 'drums', 'bass', 'other']
+            stem_names = STEM_NAMES
+            used = 'spleeter'
 
         except Exception as e:
             raise RuntimeError(f"Both Demucs and Spleeter failed: {e}")
+    else:
+        used = 'demucs'
+
+    return _summarize_stems(out_dir, stem_names), used
 
-    # Now, normalize and get info
+
+def _summarize_stems(out_dir, stem_names):
+    # Normalize to 44100 Hz / 16-bit and get info; `active` is False for stems with nothing to transcribe
     summary = []
     for stem in stem_names:
         stem_path = out_dir / f"{stem}.wav"
         if not stem_path.exists():
             raise FileNotFoundError(f"Stem {stem_path} not found")
-
-        # Load and normalize to 44100, 16-bit
-        data, sr = sf.read(str(stem_path))
-        if sr != 44100:
-            # Resample if needed, but assume 44100
-            pass
-
-        # Save as 16-bit WAV
-        sf.write(str(stem_path), data, 44100, subtype='PCM_16')
-
-        # Get info
-        info = sf.info(str(stem_path))
-        summary.append({
-            "path": str(stem_path),
-            "duration": info.duration,
-            "sample_rate": info.samplerate,
-            "channels": info.channels
-        })
+        summary.append(dict(normalize_wav(stem_path), **file_activity(stem_path)))
 
     return summary
@@ -0,0 +1,506 @@
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from collections import OrderedDict, deque
+from functools import partial
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from backend import metrics, registry
+from backend.batch import AUDIO_EXTENSIONS
+from backend.scheduler import Scheduler, Task, submit_conversion, stem_result, DONE
+from backend.threads import plan, limit_threads
+from backend.shm import SharedAudioPool
+from backend.notes import NoteArray
+from backend.midi_writer import write_midi_from_notes
+
+DEFAULT_PORT = 8765
+MAX_UPLOAD_BYTES = 2 << 30
+UPLOAD_BLOCK = 1 << 20
+RETRY_AFTER_SECONDS = 5
+LATENCY_WINDOW = 1000  # latencies kept per stage for the percentiles
+PERCENTILES = (50, 90, 99)
+COMBINED_MIDI = "all.mid"
+QUEUED, RUNNING, FINISHED, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class Busy(Exception):
+    """The job queue is full; the client should retry later."""
+
+
+class Job:
+    """
+    One conversion request and the events it has produced so far.
+
+    Events are dicts with a `type` ('queued', 'started', 'stem', 'stem_failed',
+    'done' or 'failed'); any number of clients can `follow` them, replaying
+    the ones already emitted.
+    """
+
+    def __init__(self, job_id, input_path, out_dir, model):
+        self.id = job_id
+        self.input_path = str(input_path)
+        self.out_dir = Path(out_dir)
+        self.model = model
+        self.state = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stems = []
+        self.notes = []
+        self.tempo = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    @property
+    def final(self):
+        return self.state in (FINISHED, FAILED)
+
+    def emit(self, event_type, **fields):
+        with self._cond:
+            self.events.append({'type': event_type, 'job': self.id, 'time': time.time(), **fields})
+            self._cond.notify_all()
+
+    def follow(self, timeout=None):
+        """Yield every event, waiting for new ones until the job is done or `timeout` passes idle."""
+        seen = 0
+        while True:
+            with self._cond:
+                if seen == len(self.events) and not self.final:
+                    self._cond.wait(timeout)
+                batch = self.events[seen:]
+                seen = len(self.events)
+                final = self.final
+            if not batch and not final:
+                return
+            yield from batch
+            if final and seen == len(self.events):
+                return
+
+    def to_dict(self):
+        return {'id': self.id, 'state': self.state, 'input': self.input_path, 'model': self.model,
+                'created': self.created, 'started': self.started, 'finished': self.finished,
+                'error': self.error, 'stems': self.stems}
+
+
+class ConversionService:
+    """
+    Long-lived conversion pipeline behind the HTTP server.
+
+    One scheduler and its worker processes live as long as the service, so
+    each worker loads Demucs, CREPE and the instrument classifier once and
+    keeps them resident for every later job (see `backend.registry`). At most
+    `max_active` conversions are in the scheduler at once (two keep
+    separation of one overlapping transcription of another); up to
+    `max_queued` more wait in order, and beyond that `submit` raises `Busy`
+    so callers get backpressure instead of an unbounded backlog.
+
+    Args:
+        work_root (str): Uploads, stems and MIDI go to `<work_root>/jobs/<id>/`;
+            stage metrics to `<work_root>/metrics.jsonl`.
+        jobs (int): CPU worker processes; chosen by `policy` if None. A single
+            slot runs in this process.
+        policy (str): 'throughput', 'latency' or 'balanced' (see `backend.threads.plan`).
+        max_active (int): Conversions running at once.
+        max_queued (int): Conversions waiting for a slot.
+        keep_jobs (int): Finished jobs whose outputs are kept; older ones are deleted.
+        path_roots (list): Local input paths must be under one of these; any path if None.
+        warm (bool): Load the backends the configured model, device and separation
+            backend use, in one worker, at start.
+        model (str): Transcription model of requests that do not name one.
+        **options: Passed to `submit_conversion` (device, separation_backend,
+            cache_dir, notes_cache_dir, chunk_seconds, separate_fn).
+    """
+
+    def __init__(self, work_root, jobs=None, policy='throughput', max_active=2, max_queued=32, keep_jobs=100,
+                 path_roots=None, warm=True, model='auto', **options):
+        self.work_root = Path(work_root)
+        self.model = model
+        (self.work_root / 'jobs').mkdir(parents=True, exist_ok=True)
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.keep_jobs = keep_jobs
+        self.path_roots = [Path(root).resolve() for root in path_roots] if path_roots else None
+        self.options = options
+
+        self.metrics_path = self.work_root / 'metrics.jsonl'
+        # Percentiles cover this run only
+        self._metrics_offset = self.metrics_path.stat().st_size if self.metrics_path.exists() else 0
+        # Before the workers start, so they inherit the path
+        metrics.configure(self.metrics_path)
+        split = plan(policy, processes=jobs)
+        self.processes = split['processes'] > 1
+        if not self.processes:
+            limit_threads(split['threads'])
+        # Spawned workers: forking a process that runs server and scheduler threads is unsafe
+        self.scheduler = Scheduler(cpu_slots=split['processes'], processes=self.processes, mp_context='spawn',
+                                   worker_threads=split['threads'])
+        self.scheduler.start()
+        self.shared = SharedAudioPool()
+
+        self.jobs = OrderedDict()
+        self.pending = deque()
+        self.active = 0
+        self.warm = {}
+        self.started = time.time()
+        self.latencies = {}
+        self._closing = False
+        self._admitting = 0  # admitted uploads still being received
+        self._lock = threading.RLock()
+        if warm:
+            self.warm_up()
+
+    def warm_up(self, names=None, slots=1):
+        """
+        Load backends ahead of the first request (best effort: a failing backend is logged and skipped).
+
+        Every worker process holds its own copy of each model, so by default
+        only one is warmed and the rest load on first use.
+
+        Args:
+            names (list): Backends to load; the ones the configured settings use if None.
+            slots (int): Worker slots to warm; every slot if None.
+        """
+        if names is None:
+            names = registry.worker_backends(self.options.get('separation_backend', 'demucs'), self.model,
+                                             self.options.get('device'))
+        if not self.processes:
+            registry.warm_up(names, on_loaded=lambda name, ok: self.warm.__setitem__(name, ok))
+            return
+        # One task per slot; they run at once, so each normally loads into its own process
+        cpu_slots = self.scheduler.slots['cpu']
+        for _ in range(cpu_slots if slots is None else min(slots, cpu_slots)):
+            self.scheduler.submit(Task(registry.warm_worker, args=(names,), name="warm up", on_finish=self._warmed))
+
+    def _warmed(self, task):
+        for name, ok in (task.result or {}).items():
+            self.warm[name] = self.warm.get(name, False) or ok
+
+    def submit(self, path=None, upload=None, model=None):
+        """
+        Queue a conversion of a local file or an upload.
+
+        Args:
+            path (str): Local audio file (checked against `path_roots`).
+            upload (tuple): (readable, length, filename) of an uploaded file;
+                the body is only read once the job is admitted.
+            model (str): Transcription model ('auto' picks per instrument); the service default if None.
+
+        Returns:
+            Job: The queued (or already started) job.
+
+        Raises:
+            Busy: `max_queued` jobs are already waiting.
+            ValueError: Bad path, name or size.
+        """
+        if path is not None:
+            path = self._check_path(path)
+        elif upload is None:
+            raise ValueError("Give a local path or upload a file")
+        else:
+            name = Path(upload[2] or 'input.wav').name
+            if Path(name).suffix.lower() not in AUDIO_EXTENSIONS:
+                raise ValueError(f"Unsupported file type: {name}")
+            if not 0 < upload[1] <= MAX_UPLOAD_BYTES:
+                raise ValueError(f"Upload must be between 1 byte and {MAX_UPLOAD_BYTES} bytes")
+
+        with self._lock:
+            if self._closing:
+                raise Busy("Service is stopping")
+            waiting = len(self.pending) + self._admitting
+            if self.active + waiting >= self.max_active + self.max_queued:
+                raise Busy(f"{waiting} jobs queued")
+            self._admitting += 1
+        job_id = uuid.uuid4().hex[:12]
+        out_dir = self.work_root / 'jobs' / job_id
+        try:
+            out_dir.mkdir()
+            if upload is not None:
+                path = out_dir / 'input' / name
+                path.parent.mkdir()
+                _copy_body(upload[0], upload[1], path)
+        except Exception:
+            shutil.rmtree(out_dir, ignore_errors=True)
+            with self._lock:
+                self._admitting -= 1
+            raise
+
+        job = Job(job_id, path, out_dir, model or self.model)
+        with self._lock:
+            self._admitting -= 1
+            self.jobs[job_id] = job
+            self.pending.append(job)
+            job.emit('queued', position=len(self.pending))
+            self._dispatch()
+        return job
+
+    def _check_path(self, path):
+        resolved = Path(path).resolve()
+        if self.path_roots is not None and not any(resolved.is_relative_to(root) for root in self.path_roots):
+            raise ValueError(f"{path} is outside the allowed roots")
+        if not resolved.is_file():
+            raise ValueError(f"{path} is not a file")
+        return resolved
+
+    def _dispatch(self):
+        with self._lock:
+            while self.pending and self.active < self.max_active and not self._closing:
+                job = self.pending.popleft()
+                self.active += 1
+                job.state = RUNNING
+                job.started = time.time()
+                self._record('queue', job.started - job.created)
+                job.emit('started')
+                try:
+                    submit_conversion(self.scheduler, job.input_path, str(job.out_dir), model=job.model,
+                                      shared=self.shared, on_stem=partial(self._stem_done, job),
+                                      on_finish=partial(self._finished, job), **self.options)
+                except Exception as e:
+                    # Nothing was scheduled, so `_finished` will not run for this job
+                    logging.error(f"Could not start job {job.id}: {e}")
+                    job.finished = time.time()
+                    job.error = str(e)
+                    job.state = FAILED
+                    job.emit('failed', error=job.error)
+                    self.active -= 1
+                    self._prune()
+
+    def _stem_done(self, job, task):
+        # On the scheduler thread, as soon as this stem's MIDI is written
+        stem = Path(task.args[0]).stem
+        summary = stem_result(task)
+        self._record('stem', task.completed_at - task.submitted_at)
+        if summary is None:
+            errors = [t.error for t in task.failures() if t.error]
+            job.emit('stem_failed', stem=stem, error=errors[0] if errors else 'cancelled')
+            return
+        midi_path = Path(summary['midi_path'])
+        job.notes.append(summary['notes'])
+        job.tempo = job.tempo or summary['tempo']
+        info = {'stem': stem, 'instrument': summary.get('instrument'), 'model': summary['model_used'],
+                'notes': len(summary['notes']), 'tempo': summary['tempo'], 'cache': summary.get('cache'),
+                'midi_url': f"/jobs/{job.id}/midi/{midi_path.name}"}
+        job.stems.append(info)
+        # Events are kept for replay: clients fetch the MIDI from `midi_url`
+        job.emit('stem', **info)
+
+    def _finished(self, job, task):
+        # On the scheduler thread, once separation and every stem are done
+        try:
+            if task.started_at is not None and task.finished_at is not None:
+                self._record('separate', task.finished_at - task.started_at)
+            job.finished = time.time()
+            self._record('job', job.finished - job.created)
+            if task.state != DONE:
+                # Separation failed (or the service is shutting down); there are no stems
+                job.error = task.error or task.state
+                job.state = FAILED
+                job.emit('failed', error=job.error)
+            else:
+                # Stems that failed were reported on their own; the rest still make up the result
+                combined = None
+                if job.notes:
+                    combined = job.out_dir / COMBINED_MIDI
+                    write_midi_from_notes(NoteArray.concatenate(job.notes), str(combined), tempo=job.tempo)
+                job.state = FINISHED
+                job.emit('done', stems=len(job.stems), failed_stems=len(task.children) - len(job.stems),
+                         seconds=job.finished - job.created,
+                         midi_url=f"/jobs/{job.id}/midi/{COMBINED_MIDI}" if combined else None)
+        finally:
+            job.notes = []
+            with self._lock:
+                self.active -= 1
+                self._prune()
+                self._dispatch()
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.final]
+        for job in finished[:max(0, len(finished) - self.keep_jobs)]:
+            del self.jobs[job.id]
+            shutil.rmtree(job.out_dir, ignore_errors=True)
+
+    def _record(self, stage, seconds):
+        with self._lock:
+            self.latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def _collect_stage_metrics(self):
+        # Stage records every worker appended since the last call
+        records, self._metrics_offset = metrics.read_new_records(self.metrics_path, self._metrics_offset)
+        for record in records:
+            stage = record['stage'] if not record.get('model') else f"{record['stage']}:{record['model']}"
+            self._record(stage, record['wall_seconds'])
+
+    def status(self):
+        """Queue depth, job counts, warm backends and latency percentiles (seconds) per stage."""
+        with self._lock:
+            self._collect_stage_metrics()
+            states = {state: 0 for state in (QUEUED, RUNNING, FINISHED, FAILED)}
+            for job in self.jobs.values():
+                states[job.state] += 1
+            latency = {}
+            for stage, values in sorted(self.latencies.items()):
+                points = np.percentile(np.fromiter(values, dtype=float), PERCENTILES)
+                latency[stage] = {'count': len(values),
+                                  **{f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, points)}}
+            return {
+                'queue_depth': len(self.pending),
+                'active': self.active,
+                'max_active': self.max_active,
+                'max_queued': self.max_queued,
+                'jobs': states,
+                'workers': self.scheduler.slots['cpu'],
+                'warm': sorted(name for name, ok in self.warm.items() if ok),
+                'uptime': time.time() - self.started,
+                'latency': latency,
+            }
+
+    def prometheus(self):
+        return metrics.prometheus_text(metrics.read_records(self.metrics_path))
+
+    def midi_path(self, job_id, name):
+        """Path of a MIDI file of a job, or None if there is no such file."""
+        job = self.jobs.get(job_id)
+        if job is None or Path(name).name != name or not name.endswith('.mid'):
+            return None
+        path = job.out_dir / name
+        return path if path.is_file() else None
+
+    def close(self, wait=True):
+        """Cancel queued work, then (with `wait`) let running tasks finish before releasing the workers."""
+        with self._lock:
+            self._closing = True
+            while self.pending:
+                job = self.pending.popleft()
+                job.state = FAILED
+                job.error = 'service stopped'
+                job.emit('failed', error=job.error)
+        self.scheduler.shutdown(wait=wait)
+        self.shared.close()
+        metrics.write_prometheus(metrics.read_records(self.metrics_path), self.metrics_path.with_suffix('.prom'))
+
+
+def _copy_body(stream, length, path):
+    remaining = length
+    with open(path, 'wb') as f:
+        while remaining:
+            block = stream.read(min(UPLOAD_BLOCK, remaining))
+            if not block:
+                raise ValueError(f"Upload ended after {length - remaining} of {length} bytes")
+            f.write(block)
+            remaining -= len(block)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end of a `ConversionService` (set as `server.service`).
+
+    POST /jobs                     queue a conversion: an audio body (name in
+                                   ?name=, model in ?model=) or JSON {"path", "model"};
+                                   with ?stream=1 the response streams the events
+    GET  /jobs/<id>                job state and finished stems
+    GET  /jobs/<id>/events         events as JSON lines, replayed then followed
+    GET  /jobs/<id>/midi/<file>    a stem's MIDI, or all.mid with every stem
+    GET  /status                   queue depth and per-stage latency percentiles
+    GET  /metrics                  stage totals in Prometheus text format
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/jobs':
+            return self._error(HTTPStatus.NOT_FOUND, "Not found")
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            if self.headers.get_content_type() == 'application/json':
+                body = json.loads(self.rfile.read(length) or b'{}')
+                job = self.service.submit(path=body.get('path'), model=body.get('model', query.get('model')))
+            else:
+                job = self.service.submit(upload=(self.rfile, length, query.get('name')),
+                                          model=query.get('model'))
+        except Busy as e:
+            # The body was not read; drop the connection rather than draining it
+            self.close_connection = True
+            return self._error(HTTPStatus.SERVICE_UNAVAILABLE, str(e), {'Retry-After': str(RETRY_AFTER_SECONDS)})
+        except ValueError as e:
+            self.close_connection = True
+            return self._error(HTTPStatus.BAD_REQUEST, str(e))
+
+        if query.get('stream') in ('1', 'true'):
+            return self._stream(job, HTTPStatus.ACCEPTED)
+        self._json(HTTPStatus.ACCEPTED, dict(job.to_dict(), status_url=f"/jobs/{job.id}",
+                                             events_url=f"/jobs/{job.id}/events"))
+
+    def do_GET(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if parts == ['status']:
+            return self._json(HTTPStatus.OK, self.service.status())
+        if parts == ['metrics']:
+            return self._send(HTTPStatus.OK, self.service.prometheus().encode(), 'text/plain; version=0.0.4')
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.service.jobs.get(parts[1])
+            if job is None:
+                return self._error(HTTPStatus.NOT_FOUND, "No such job")
+            if len(parts) == 2:
+                return self._json(HTTPStatus.OK, job.to_dict())
+            if parts[2:] == ['events']:
+                return self._stream(job, HTTPStatus.OK)
+            if len(parts) == 4 and parts[2] == 'midi':
+                path = self.service.midi_path(job.id, parts[3])
+                if path is None:
+                    return self._error(HTTPStatus.NOT_FOUND, "No such MIDI file")
+                return self._send(HTTPStatus.OK, path.read_bytes(), 'audio/midi')
+        self._error(HTTPStatus.NOT_FOUND, "Not found")
+
+    def _stream(self, job, status):
+        # Chunked JSON lines, one per event, flushed as each stem finishes
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for event in job.follow():
+                data = (json.dumps(event) + '\n').encode()
+                self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client left; the job carries on
+            self.close_connection = True
+
+    def _json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode(), 'application/json', headers)
+
+    def _error(self, status, message, headers=None):
+        self._json(status, {'error': message}, headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(service, host='127.0.0.1', port=DEFAULT_PORT):
+    """HTTP server for `service`; call `serve_forever()` on it."""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
@@ -0,0 +1,180 @@
+import os
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+import numpy as np
+from pathlib import Path
+from backend.features import decode
+
+DIR_PREFIX = "audio2midi-audio-"
+
+
+def _default_root():
+    # /dev/shm is RAM-backed on Linux, so the "file" never touches a disk
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedAudio:
+    """
+    Picklable handle to a decoded mono float32 signal in a shared mapping.
+
+    Only the file name, shape and rate travel between processes; `array()`
+    maps the samples read-only, so every process sees the same physical
+    pages and nothing is copied or decoded again.
+
+    Args:
+        file (str): Raw float32 sample file.
+        length (int): Number of samples.
+        sr (int): Sample rate.
+        source (str): Path the audio was decoded from.
+    """
+
+    def __init__(self, file, length, sr, source=None):
+        self.file = str(file)
+        self.length = int(length)
+        self.sr = int(sr)
+        self.source = str(source) if source is not None else None
+
+    def __repr__(self):
+        return f"SharedAudio({self.source or self.file}, {self.length} samples @ {self.sr} Hz)"
+
+    @property
+    def duration(self):
+        return self.length / self.sr
+
+    @property
+    def nbytes(self):
+        return self.length * 4
+
+    def array(self):
+        """Zero-copy read-only view of the samples; the mapping closes with the last view."""
+        if self.length == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.memmap(self.file, dtype=np.float32, mode='r', shape=(self.length,))
+
+
+class SharedAudioPool:
+    """
+    Owner of the shared signals handed to pipeline workers.
+
+    Each stem is decoded once by `put` (concurrent callers for the same path
+    wait for the first decode) and released with `release` once its tasks
+    are done. Unlinking a file while workers still map it is safe: the pages
+    stay valid until their last view is garbage collected.
+
+    Everything lives in one private directory, removed by `close` (also on
+    interpreter exit); directories left by processes that were killed are
+    swept when the next pool starts.
+
+    Args:
+        root (str): Parent directory; /dev/shm when available.
+    """
+
+    def __init__(self, root=None):
+        root = Path(root or _default_root())
+        self._sweep(root)
+        self.dir = Path(tempfile.mkdtemp(prefix=f"{DIR_PREFIX}{os.getpid()}-", dir=root))
+        self._handles = {}
+        self._decoding = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _sweep(root):
+        for entry in root.glob(f"{DIR_PREFIX}*"):
+            try:
+                pid = int(entry.name[len(DIR_PREFIX):].split('-')[0])
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._handles)
+
+    @property
+    def nbytes(self):
+        return sum(handle.nbytes for handle in self._handles.values())
+
+    def put(self, path):
+        """
+        Decode `path` (like StemFeatures does) into shared memory, once.
+
+        Returns:
+            SharedAudio: Handle for workers.
+        """
+        key = str(path)
+        with self._lock:
+            if key in self._handles:
+                return self._handles[key]
+            event = self._decoding.get(key)
+            if event is None:
+                self._decoding[key] = threading.Event()
+        if event is not None:
+            event.wait()
+            return self.put(path)
+
+        try:
+            audio, sr = decode(key)
+            return self.put_array(audio, sr, key)
+        finally:
+            with self._lock:
+                self._decoding.pop(key).set()
+
+    def put_array(self, audio, sr, key):
+        """Place an already decoded mono signal under `key`."""
+        audio = np.ascontiguousarray(audio, dtype=np.float32).reshape(-1)
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix='.f32')
+        with os.fdopen(fd, 'wb') as f:
+            audio.tofile(f)
+        handle = SharedAudio(tmp, len(audio), sr, source=key)
+        with self._lock:
+            old = self._handles.pop(key, None)
+            self._handles[key] = handle
+        if old is not None:
+            self._unlink(old)
+        return handle
+
+    def get(self, key):
+        return self._handles.get(str(key))
+
+    def release(self, key):
+        """Drop the signal for `key`; safe to call for unknown keys and more than once."""
+        with self._lock:
+            handle = self._handles.pop(str(key), None)
+        if handle is not None:
+            self._unlink(handle)
+
+    def _unlink(self, handle):
+        try:
+            os.unlink(handle.file)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Release every signal and remove the pool's directory."""
+        with self._lock:
+            self._handles.clear()
+        shutil.rmtree(self.dir, ignore_errors=True)
+        atexit.unregister(self.close)
+        logging.debug(f"Closed shared audio pool {self.dir}")
@@ -0,0 +1,146 @@
+import struct
+import numpy as np
+
+DEFAULT_RESOLUTION = 220  # pretty_midi's default ticks per beat
+CHUNK_EVENTS = 1 << 16
+
+
+def _varint(value):
+    """MIDI variable-length quantity for one non-negative int."""
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def _meta(delta, meta_type, data):
+    return _varint(delta) + bytes([0xFF, meta_type]) + _varint(len(data)) + data
+
+
+def _varint_bytes(deltas):
+    """Byte count of each variable-length delta."""
+    return (1 + (deltas >= 1 << 7) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+            + (deltas >= 1 << 28)).astype(np.int64)
+
+
+def times_to_ticks(times, tempo, resolution=DEFAULT_RESOLUTION):
+    """
+    Seconds to absolute ticks at a constant tempo.
+
+    Matches pretty_midi's `time_to_tick` for a single tempo: round half to
+    even of `time / tick_scale`, with times at or before zero mapped to 0.
+    """
+    tick_scale = 60.0 / (tempo * resolution)
+    times = np.asarray(times, dtype=np.float64)
+    return np.where(times > 0, np.rint(times / tick_scale), 0).astype(np.int64)
+
+
+def note_events(onset, offset, pitch, velocity, tempo, resolution=DEFAULT_RESOLUTION):
+    """
+    Sorted delta-time note_on event stream for one track.
+
+    Every note becomes a note_on and a velocity-0 note_on. Events are ordered
+    like pretty_midi orders them: by tick, then pitch, then velocity (so a
+    note-off precedes a note-on of the same pitch at the same tick), then
+    insertion order.
+
+    Returns:
+        tuple: (ticks, deltas, pitches, velocities) arrays in write order.
+    """
+    n = len(onset)
+    ticks = np.empty(2 * n, dtype=np.int64)
+    ticks[0::2] = times_to_ticks(onset, tempo, resolution)
+    ticks[1::2] = times_to_ticks(offset, tempo, resolution)
+    pitches = np.repeat(np.asarray(pitch, dtype=np.int64), 2)
+    velocities = np.zeros(2 * n, dtype=np.int64)
+    velocities[0::2] = velocity
+
+    if n and (pitches.min() < 0 or pitches.max() > 127):
+        raise ValueError("note pitch must be in range 0..127")
+    if n and (velocities.min() < 0 or velocities.max() > 127):
+        raise ValueError("note velocity must be in range 0..127")
+
+    order = np.lexsort((np.arange(2 * n), pitches * 256 + velocities, ticks))
+    ticks = ticks[order]
+    deltas = np.diff(ticks, prepend=0)
+    return ticks, deltas, pitches[order], velocities[order]
+
+
+def _encode_events(deltas, pitches, velocities):
+    """Running-status note_on bytes (delta, note, velocity) for a block of events."""
+    sizes = _varint_bytes(deltas)
+    starts = np.concatenate([[0], np.cumsum(sizes + 2)[:-1]])
+    buf = np.empty(int((sizes + 2).sum()), dtype=np.uint8)
+    for j in range(int(sizes.max()) if len(sizes) else 0):
+        mask = sizes > j
+        shift = 7 * (sizes[mask] - 1 - j)
+        more = np.where(j < sizes[mask] - 1, 0x80, 0)
+        buf[starts[mask] + j] = ((deltas[mask] >> shift) & 0x7F) | more
+    buf[starts + sizes] = pitches
+    buf[starts + sizes + 1] = velocities
+    return buf
+
+
+def write_smf(path, onset, offset, pitch, velocity, tempo=120.0, program=0, track_name=None,
+              lyrics=(), texts=(), resolution=DEFAULT_RESOLUTION, chunk_events=CHUNK_EVENTS):
+    """
+    Write a type-1 Standard MIDI File straight from note arrays.
+
+    Produces the same bytes as building a pretty_midi.PrettyMIDI with one
+    non-drum instrument and calling `write`, but without any per-note
+    objects: ticks are converted and sorted with NumPy and the event bytes
+    are assembled and written in blocks of `chunk_events`.
+
+    Args:
+        path (str): Output .mid path.
+        onset, offset (array): Note times in seconds.
+        pitch (array): MIDI pitches.
+        velocity (array): MIDI velocities (1-127).
+        tempo (float): BPM.
+        program (int): GM program of the instrument track.
+        track_name (str): Instrument track name (omitted if empty).
+        lyrics (list): (text, time) lyric events for the tempo track.
+        texts (list): (text, time) text events for the tempo track.
+        resolution (int): Ticks per beat.
+    """
+    tick_scale = 60.0 / (tempo * resolution)
+    mpqn = int(6e7 / (60. / (tick_scale * resolution)))
+
+    # Tempo track, sorted by (tick, set_tempo < time_signature < lyrics < text)
+    timing = [(0, 1, 0, 0x51, mpqn.to_bytes(3, 'big')),
+              (0, 2, 1, 0x58, bytes([4, 2, 24, 8]))]
+    for i, (text, time) in enumerate(lyrics):
+        timing.append((int(times_to_ticks([time], tempo, resolution)[0]), 4, 2 + i, 0x05, text.encode('latin1')))
+    for i, (text, time) in enumerate(texts):
+        timing.append((int(times_to_ticks([time], tempo, resolution)[0]), 5, 2 + len(lyrics) + i, 0x01,
+                       text.encode('latin1')))
+    timing.sort()
+    tempo_track = bytearray()
+    tick = 0
+    for event_tick, _, _, meta_type, data in timing:
+        tempo_track += _meta(event_tick - tick, meta_type, data)
+        tick = event_tick
+    tempo_track += _meta(1, 0x2F, b'')
+
+    ticks, deltas, pitches, velocities = note_events(onset, offset, pitch, velocity, tempo, resolution)
+
+    head = bytearray()
+    if track_name:
+        head += _meta(0, 0x03, track_name.encode('latin1'))
+    head += bytes([0, 0xC0, program])
+    if len(deltas):
+        # The first note event carries the note_on status; the rest use running status
+        head += _varint(int(deltas[0])) + bytes([0x90, int(pitches[0]), int(velocities[0])])
+    tail = _meta(1, 0x2F, b'')
+    body_size = int((_varint_bytes(deltas[1:]) + 2).sum())
+
+    with open(path, 'wb') as f:
+        f.write(b'MThd' + struct.pack('>Lhhh', 6, 1, 2, resolution))
+        f.write(b'MTrk' + struct.pack('>L', len(tempo_track)) + tempo_track)
+        f.write(b'MTrk' + struct.pack('>L', len(head) + body_size + len(tail)) + head)
+        for start in range(1, len(deltas), chunk_events):
+            end = start + chunk_events
+            f.write(_encode_events(deltas[start:end], pitches[start:end], velocities[start:end]).tobytes())
+        f.write(tail)
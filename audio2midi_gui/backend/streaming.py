@@ -0,0 +1,241 @@
+import time
+import numpy as np
+import soundfile as sf
+
+
+def blocks_from_file(path, block_size=512):
+    """Yield mono float32 blocks from an audio file, e.g. to replay it as live input."""
+    with sf.SoundFile(str(path)) as f:
+        for block in f.blocks(blocksize=block_size, dtype='float32', always_2d=True):
+            yield block.mean(axis=1)
+
+
+def yin_pitch(frame, sr, fmin=50.0, fmax=2000.0, threshold=0.15):
+    """
+    YIN fundamental estimate for one frame.
+
+    Returns:
+        tuple: (f0_hz, aperiodicity); f0 is 0 when no period is found.
+    """
+    x = np.asarray(frame, dtype=np.float64)
+    n = len(x)
+    w = n // 2
+    tau_min = max(2, int(sr / fmax))
+    tau_max = min(int(sr / fmin), w)
+    if tau_max <= tau_min + 1:
+        return 0.0, 1.0
+
+    # Difference function via FFT cross-correlation of x[:w] with x[tau:tau+w]
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    r = np.fft.irfft(np.fft.rfft(x, size) * np.conj(np.fft.rfft(x[:w], size)), size)[:tau_max + 1]
+    power = np.concatenate([[0.0], np.cumsum(x ** 2)])
+    taus = np.arange(tau_max + 1)
+    diff = power[w] + (power[taus + w] - power[taus]) - 2 * r
+    diff[0] = 0.0
+
+    # Cumulative mean normalized difference
+    cmnd = np.ones_like(diff)
+    cumulative = np.cumsum(diff[1:])
+    cmnd[1:] = diff[1:] * taus[1:] / np.maximum(cumulative, 1e-12)
+
+    below = np.flatnonzero(cmnd[tau_min:tau_max] < threshold)
+    if len(below) == 0:
+        return 0.0, float(cmnd[tau_min:tau_max].min())
+    tau = tau_min + below[0]
+    while tau + 1 < tau_max and cmnd[tau + 1] < cmnd[tau]:
+        tau += 1
+
+    # Parabolic interpolation around the minimum
+    a, b, c = cmnd[tau - 1], cmnd[tau], cmnd[min(tau + 1, tau_max)]
+    denom = a - 2 * b + c
+    shift = 0.5 * (a - c) / denom if denom > 0 else 0.0
+    return sr / (tau + shift), float(b)
+
+
+class StreamingTranscriber:
+    """
+    Incremental monophonic transcriber for live input.
+
+    Feed fixed-size blocks (from an audio callback or a generator) to
+    `process_block`; each call analyses the newest `frame_length` samples and
+    returns note events. Onsets come from positive spectral flux against an
+    adaptive threshold with rising energy, pitch from YIN. A note starts once its pitch has been
+    stable for `stable_blocks` blocks, so algorithmic latency is bounded by
+    `stable_blocks * block_size / sr` plus the compute time of one block.
+
+    Events are dicts {type, pitch, velocity, time, emitted_at, latency} with
+    `type` 'note_on' or 'note_off', `time` the estimated stream time of the
+    event, `emitted_at` the stream time when it was produced, and `latency`
+    the difference plus the wall time spent processing the block.
+
+    Args:
+        sr (int): Input sample rate.
+        block_size (int): Samples per block.
+        frame_length (int): Analysis window (>= 2 periods of the lowest pitch).
+        fmin (float): Lowest pitch in Hz.
+        fmax (float): Highest pitch in Hz.
+        silence_db (float): Frame RMS below which the input counts as silent.
+        onset_sensitivity (float): Flux must exceed the recent mean by this factor.
+        stable_blocks (int): Blocks a new pitch must persist before note-on.
+    """
+
+    def __init__(self, sr, block_size=512, frame_length=2048, fmin=50.0, fmax=2000.0,
+                 silence_db=-45.0, onset_sensitivity=2.5, stable_blocks=2):
+        self.sr = sr
+        self.block_size = block_size
+        self.frame_length = max(frame_length, block_size)
+        self.fmin = fmin
+        self.fmax = fmax
+        self.silence_db = silence_db
+        self.onset_sensitivity = onset_sensitivity
+        self.stable_blocks = stable_blocks
+        self.reset()
+
+    def reset(self):
+        self._buffer = np.zeros(self.frame_length, dtype=np.float32)
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        self._prev_mag = None
+        self._prev_rms = 0.0
+        self._flux_history = []
+        self._samples = 0
+        self._active = None  # (pitch, onset_time)
+        self._candidate = None  # (pitch, first_seen_time, blocks_seen)
+        self.compute_times = []
+
+    @property
+    def stream_time(self):
+        return self._samples / self.sr
+
+    def process_block(self, block):
+        """
+        Analyse one block of mono samples.
+
+        Returns:
+            list: Note events produced by this block.
+        """
+        started = time.perf_counter()
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        block_start = self.stream_time
+        n = len(block)
+        if n >= self.frame_length:
+            self._buffer[:] = block[-self.frame_length:]
+        else:
+            self._buffer[:-n] = self._buffer[n:]
+            self._buffer[-n:] = block
+        self._samples += n
+
+        frame = self._buffer
+        rms = np.sqrt(np.mean(frame[-max(n, 1):] ** 2))
+        loud = 20 * np.log10(rms + 1e-12) > self.silence_db
+
+        mag = np.abs(np.fft.rfft(frame * self._window))
+        onset = False
+        if self._prev_mag is not None:
+            flux = float(np.maximum(mag - self._prev_mag, 0).sum())
+            history = self._flux_history[-20:]
+            baseline = np.mean(history) if history else 0.0
+            # A re-attack needs both a flux peak and rising block energy
+            onset = (loud and flux > self.onset_sensitivity * baseline + 1e-3 * mag.sum()
+                     and rms > 1.5 * self._prev_rms)
+            self._flux_history.append(flux)
+        self._prev_mag = mag
+        self._prev_rms = rms
+
+        pitch = None
+        if loud:
+            # Reversed so YIN's integration window covers the newest samples
+            f0, aperiodicity = yin_pitch(frame[::-1], self.sr, self.fmin, self.fmax)
+            if f0 > 0:
+                pitch = int(round(12 * np.log2(f0 / 440.0) + 69))
+
+        events = self._update(pitch, onset, min(1.0, float(rms) * 4), block_start)
+        elapsed = time.perf_counter() - started
+        self.compute_times.append(elapsed)
+        for event in events:
+            event['emitted_at'] = self.stream_time
+            event['latency'] = self.stream_time - event['time'] + elapsed
+        return events
+
+    def _update(self, pitch, onset, velocity, block_start):
+        events = []
+        if pitch is None:
+            self._candidate = None
+            if self._active is not None:
+                events.append(self._note_off(block_start))
+            return events
+
+        active_pitch = self._active[0] if self._active else None
+        if self._candidate and self._candidate[0] == pitch:
+            self._candidate = (pitch, self._candidate[1], self._candidate[2] + 1)
+        elif pitch == active_pitch and not onset:
+            self._candidate = None
+            return events
+        else:
+            # New pitch, or a re-attack of the sounding one
+            self._candidate = (pitch, block_start, 1)
+
+        candidate_pitch, first_seen, count = self._candidate
+        if count >= self.stable_blocks:
+            if self._active is not None:
+                events.append(self._note_off(first_seen))
+            events.append({'type': 'note_on', 'pitch': candidate_pitch, 'velocity': velocity, 'time': first_seen})
+            self._active = (candidate_pitch, first_seen)
+            self._candidate = None
+        return events
+
+    def _note_off(self, at):
+        pitch, _ = self._active
+        self._active = None
+        return {'type': 'note_off', 'pitch': pitch, 'velocity': 0.0, 'time': at}
+
+    def flush(self):
+        """Close any sounding note at the current stream time."""
+        if self._active is None:
+            return []
+        event = self._note_off(self.stream_time)
+        event['emitted_at'] = self.stream_time
+        event['latency'] = 0.0
+        return [event]
+
+    def stream(self, blocks):
+        """Yield note events for an iterable of blocks, closing the last note at the end."""
+        for block in blocks:
+            for event in self.process_block(block):
+                yield event
+        for event in self.flush():
+            yield event
+
+    def latency_stats(self, events):
+        """Summarize measured note-on latency and per-block compute time (seconds)."""
+        latencies = np.array([e['latency'] for e in events if e['type'] == 'note_on'])
+        compute = np.array(self.compute_times)
+        return {
+            'note_on_latency_mean': float(latencies.mean()) if len(latencies) else 0.0,
+            'note_on_latency_max': float(latencies.max()) if len(latencies) else 0.0,
+            'block_compute_mean': float(compute.mean()) if len(compute) else 0.0,
+            'block_compute_p99': float(np.percentile(compute, 99)) if len(compute) else 0.0,
+            'block_duration': self.block_size / self.sr,
+        }
+
+
+def notes_from_events(events):
+    """Pair note_on/note_off events into note dicts {onset, offset, pitch, velocity}."""
+    notes = []
+    open_notes = {}
+    for event in events:
+        if event['type'] == 'note_on':
+            open_notes[event['pitch']] = event
+        elif event['pitch'] in open_notes:
+            on = open_notes.pop(event['pitch'])
+            notes.append({'onset': on['time'], 'offset': event['time'],
+                          'pitch': on['pitch'], 'velocity': on['velocity']})
+    return notes
+
+
+def send_events(midi_out, events, channel=0):
+    """Send events to a pygame.midi.Output (or anything with note_on/note_off)."""
+    for event in events:
+        if event['type'] == 'note_on':
+            midi_out.note_on(event['pitch'], int(event['velocity'] * 127), channel)
+        else:
+            midi_out.note_off(event['pitch'], 0, channel)
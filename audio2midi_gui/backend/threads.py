@@ -0,0 +1,123 @@
+import os
+import sys
+import math
+import logging
+
+# Deliberately free of numpy/framework imports: spawned workers import this
+# module to set limits before any BLAS or OpenMP runtime is loaded.
+
+POLICIES = ('throughput', 'latency', 'balanced')
+
+# Read by OpenMP, the BLAS builds numpy/scipy ship with, numexpr and TensorFlow at load time
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'TF_NUM_INTRAOP_THREADS',
+)
+
+_limit = None
+
+
+def available_cores():
+    """Cores this process may run on (respects CPU affinity and container limits)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan(policy='throughput', tasks=None, cores=None, processes=None):
+    """
+    Split a core budget into worker processes x intra-op threads.
+
+    - 'throughput': one single-threaded worker per core, so independent
+      stems/files never contend for cores. Best for batches.
+    - 'latency': one worker using every core, so a single stem finishes as
+      soon as possible. Best for interactive single-file work.
+    - 'balanced': about sqrt(cores) workers with the remaining cores as
+      threads each.
+
+    With fewer `tasks` than workers, the spare cores go to threads instead
+    of idle processes.
+
+    Args:
+        policy (str): One of POLICIES.
+        tasks (int): Number of independent tasks, if known.
+        cores (int): Core budget; all available cores by default.
+        processes (int): Fixed worker count (e.g. from --jobs); the policy
+            then only sets the threads per worker.
+
+    Returns:
+        dict: {'processes': int, 'threads': int}
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown thread policy {policy!r}; expected one of {POLICIES}")
+    cores = max(1, cores or available_cores())
+    if processes:
+        return {'processes': processes, 'threads': max(1, cores // processes)}
+    if policy == 'throughput':
+        processes = cores
+    elif policy == 'latency':
+        processes = 1
+    else:
+        processes = max(1, int(round(math.sqrt(cores))))
+    if tasks:
+        processes = min(processes, tasks)
+    return {'processes': processes, 'threads': max(1, cores // processes)}
+
+
+def limit_threads(threads):
+    """
+    Cap intra-op threads of numpy/BLAS, OpenMP, TensorFlow and torch in this process.
+
+    Environment variables cover libraries loaded later (and child
+    processes); threadpoolctl, TensorFlow and torch are adjusted directly if
+    already imported. CREPE and Demucs call `apply_framework_limits` when
+    they load, so lazily imported frameworks pick the cap up too.
+
+    Args:
+        threads (int): Threads per library pool.
+    """
+    global _limit
+    _limit = max(1, int(threads))
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(_limit)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        pass
+    else:
+        threadpool_limits(_limit)
+    apply_framework_limits()
+
+
+def apply_framework_limits():
+    """Apply the current cap to TensorFlow and torch if they are loaded."""
+    if _limit is None:
+        return
+    if 'tensorflow' in sys.modules:
+        tf = sys.modules['tensorflow']
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(_limit)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except (RuntimeError, AttributeError) as e:
+            # TF refuses once its runtime is initialized; the env vars still applied at import
+            logging.debug(f"TensorFlow thread limits not changed: {e}")
+    if 'torch' in sys.modules:
+        torch = sys.modules['torch']
+        torch.set_num_threads(_limit)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError as e:
+            logging.debug(f"torch inter-op threads not changed: {e}")
+
+
+def current_limit():
+    """Cap set by `limit_threads` in this process, or None."""
+    return _limit
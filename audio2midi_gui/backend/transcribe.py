@@ -2,13 +2,32 @@ import os
 import json
 import numpy as np
 import librosa
-import pretty_midi
-import crepe
 from pathlib import Path
 import logging
+from backend.features import StemFeatures
+from backend.polyphonic import transcribe_polyphonic
+from backend.crepe_runner import get_runner, MODEL_SR as CREPE_SR, FRAME_LENGTH as CREPE_FRAME
+from backend.chunking import chunk_slices
+from backend.activity import MIN_ACTIVE_SECONDS
+from backend.notes import NoteArray
+from backend.smf import write_smf
+from backend.utils import hash_audio
+from backend import metrics, profiling
 
 logging.basicConfig(level=logging.INFO)
 
+# Bump when transcription output changes, so cached notes are not reused
+NOTES_VERSION = 4
+
+# Tempo written for stems with nothing to beat-track
+DEFAULT_TEMPO = 120.0
+
+# CREPE onsets whose frame is less confident than this are unvoiced and produce no note
+VOICING_THRESHOLD = 0.5
+
+# The polyphonic engine runs at this rate; nothing above ~C9 is needed
+POLYPHONIC_SR = 22050
+
 # GM program mapping
 INSTRUMENT_TO_PROGRAM = {
     'piano': 0,
@@ -20,136 +39,261 @@ INSTRUMENT_TO_PROGRAM = {
     'unknown': 0
 }
 
-def transcribe_stem_to_midi(stem_path, instrument_hint=None, model='auto', out_midi_path=None, device='cpu', time_precision=10):
+def _choose_model(model, instrument_hint=None, device='cpu'):
+    """Resolve model='auto' to the model used for `instrument_hint` on `device`."""
+    if model != 'auto':
+        return model
+    if instrument_hint == 'piano':
+        return 'onsets_frames'
+    if instrument_hint in ['vocals', 'guitar']:
+        return 'crepe_monophonic'
+    if instrument_hint == 'drums':
+        return 'percussion_template'
+    if device == 'cuda':
+        try:
+            import mt3
+            return 'mt3'
+        except ImportError:
+            pass
+    return 'heuristic_polyphonic'
+
+def transcribe_stem_to_midi(stem_path, instrument_hint=None, model='auto', out_midi_path=None, device='cpu', time_precision=10,
+                            features=None, crepe_step_size=10, cache=None):
     """
     Transcribe stem to MIDI.
 
+    `features` is an optional StemFeatures shared with instrument detection,
+    so the decode and spectral transforms are not recomputed.
+    `crepe_step_size` is the CREPE hop in milliseconds.
+    `cache` is an optional TranscriptionCache: notes are looked up by stem
+    content, model and parameters, and on a hit the MIDI is written from the
+    stored notes without transcribing. `summary['cache']` is 'hit' or 'miss'.
+
+    Only the stem's active regions are transcribed; `summary['skipped_seconds']`
+    is the silence that was not. A stem with no activity at all is not
+    beat-tracked or transcribed (`summary['skipped'] = 'silent'`) and gets an
+    empty MIDI file.
+
+    The MIDI goes next to the stem unless `out_midi_path` is given. With
+    profiling on (see `backend.profiling`) the call's profiles go next to it.
+
     Returns: midi_path, summary_dict
     """
     if out_midi_path is None:
-        stem_name = Path(stem_path).stem
-        out_midi_path = f"{stem_name}.mid"
+        out_midi_path = str(Path(stem_path).with_suffix('.mid'))
 
-    audio, sr = librosa.load(stem_path, sr=None)
+    with profiling.profiled('transcribe', Path(out_midi_path).parent, Path(out_midi_path).stem):
+        return _transcribe_stem_to_midi(stem_path, instrument_hint, model, out_midi_path, device, time_precision,
+                                        features, crepe_step_size, cache)
 
-    # Detect tempo
-    tempo, _ = librosa.beat.beat_track(y=audio, sr=sr)
-
-    # Choose model
-    if model == 'auto':
-        if instrument_hint == 'piano':
-            model = 'onsets_frames'
-        elif instrument_hint in ['vocals', 'guitar']:
-            model = 'crepe_monophonic'
-        elif instrument_hint == 'drums':
-            model = 'percussion_template'
-        else:
-            if device == 'cuda':
-                try:
-                    import mt3
-                    model = 'mt3'
-                except ImportError:
-                    model = 'heuristic_polyphonic'
-            else:
-                model = 'heuristic_polyphonic'
+def _transcribe_stem_to_midi(stem_path, instrument_hint, model, out_midi_path, device, time_precision,
+                             features, crepe_step_size, cache):
+    job = _prepare(stem_path, instrument_hint, model, out_midi_path, device, time_precision, features,
+                   crepe_step_size, cache)
+    if job['result'] is not None:
+        return job['result']
 
     # Run transcription
-    if model == 'onsets_frames':
-        notes = _transcribe_onsets_frames(audio, sr)
-    elif model == 'crepe_monophonic':
-        notes = _transcribe_crepe_mono(audio, sr, time_precision)
-    elif model == 'mt3':
-        notes = _transcribe_mt3(audio, sr)
+    features = job['features']
+    if job['silent']:
+        notes = NoteArray()
+    else:
+        with metrics.stage('transcribe', features.duration, model=job['model'], device=device,
+                           active_seconds=job['active_seconds']) as record:
+            if job['model'] == 'onsets_frames':
+                notes = _transcribe_onsets_frames(features)
+            elif job['model'] == 'crepe_monophonic':
+                notes = _transcribe_crepe_mono(features, time_precision, crepe_step_size)
+            elif job['model'] == 'mt3':
+                notes = _transcribe_mt3(features)
+            else:
+                notes = _transcribe_heuristic(features)
+            record['notes'] = len(notes)
+
+    return _finish(job, notes, cache)
+
+def transcribe_crepe_stems_to_midi(stems, device='cpu', time_precision=10, crepe_step_size=10, cache=None):
+    """
+    Transcribe many monophonic stems with CREPE in one pass over the network.
+
+    The active chunks of every stem are pitch-tracked by a single
+    `CrepeRunner.predict_many` call, so short stems (and the tails of long
+    ones) fill shared batches instead of each paying for its own partly
+    empty ones. Cache hits and silent stems are handled per stem as in
+    `transcribe_stem_to_midi`.
+
+    Args:
+        stems (list): (stem_path, instrument_hint, out_midi_path, features)
+            tuples; out_midi_path and features may be None.
+
+    Returns:
+        list: (midi_path, summary) per stem, in order.
+    """
+    if not stems:
+        return []
+    first_midi = stems[0][2] or str(Path(stems[0][0]).with_suffix('.mid'))
+    with profiling.profiled('transcribe', Path(first_midi).parent, 'crepe_batch'):
+        jobs = [_prepare(stem_path, instrument_hint, 'crepe_monophonic',
+                         out_midi_path or str(Path(stem_path).with_suffix('.mid')), device, time_precision,
+                         features, crepe_step_size, cache)
+                for stem_path, instrument_hint, out_midi_path, features in stems]
+        pending = [job for job in jobs if job['result'] is None and not job['silent']]
+        inputs = [_crepe_inputs(job['features'], crepe_step_size) for job in pending]
+
+        notes = {}
+        if pending:
+            with metrics.stage('transcribe', sum(job['features'].duration for job in pending),
+                               model='crepe_monophonic', device=device, stems=len(pending),
+                               active_seconds=sum(job['active_seconds'] for job in pending)) as record:
+                results = iter(get_runner().predict_many(
+                    [signal for signals, _, _ in inputs for signal in signals], crepe_step_size))
+                for job, (signals, slices, active) in zip(pending, inputs):
+                    tracked = [next(results) for _ in signals]
+                    notes[id(job)] = _crepe_notes(job['features'], time_precision, crepe_step_size, tracked,
+                                                  slices, active)
+                record['notes'] = sum(len(n) for n in notes.values())
+
+        return [job['result'] or _finish(job, notes.get(id(job), NoteArray()), cache) for job in jobs]
+
+def _prepare(stem_path, instrument_hint, model, out_midi_path, device, time_precision, features,
+             crepe_step_size, cache):
+    # Everything before the model runs: cache lookup, decode and tempo. `result` is set on a cache hit.
+    model = _choose_model(model, instrument_hint, device)
+    job = {'stem_path': stem_path, 'instrument_hint': instrument_hint, 'model': model,
+           'out_midi_path': out_midi_path, 'program': INSTRUMENT_TO_PROGRAM.get(instrument_hint, 0),
+           'key': None, 'result': None}
+
+    if cache is not None:
+        params = {'time_precision': time_precision}
+        if model == 'crepe_monophonic':
+            params['crepe_step_size'] = crepe_step_size
+        job['key'] = cache.key(hash_audio(stem_path), model, instrument_hint, device, params, NOTES_VERSION)
+        hit = cache.fetch(job['key'])
+        if hit is not None:
+            notes, meta = hit
+            notes.tracks = [Path(stem_path).stem]
+            _write_midi(out_midi_path, notes, meta['tempo'], job['program'])
+            summary = {'midi_path': out_midi_path, 'notes': notes, 'tempo': meta['tempo'], 'model_used': model,
+                       'active_seconds': meta['active_seconds'], 'skipped_seconds': meta['skipped_seconds'],
+                       'cache': 'hit'}
+            if meta.get('skipped'):
+                summary['skipped'] = meta['skipped']
+            job['result'] = (out_midi_path, summary)
+            return job
+
+    if features is None:
+        features = StemFeatures(stem_path)
+    job['features'] = features
+    job['active_seconds'] = features.active_seconds
+    job['silent'] = job['active_seconds'] < MIN_ACTIVE_SECONDS
+
+    # Detect tempo
+    if job['silent']:
+        job['tempo'] = DEFAULT_TEMPO
     else:
-        notes = _transcribe_heuristic(audio, sr)
+        with metrics.stage('tempo', features.duration):
+            job['tempo'] = features.tempo()
+    return job
+
+def _finish(job, notes, cache):
+    # Everything after the model ran: MIDI, summary and cache entry
+    notes.tracks = [Path(job['stem_path']).stem]
+    out_midi_path = job['out_midi_path']
 
     # Create MIDI
-    midi = pretty_midi.PrettyMIDI(initial_tempo=tempo)
-    instrument = pretty_midi.Instrument(program=INSTRUMENT_TO_PROGRAM.get(instrument_hint, 0))
-    for note in notes:
-        midi_note = pretty_midi.Note(
-            velocity=int(note['velocity'] * 127),
-            pitch=note['pitch'],
-            start=note['onset'],
-            end=note['offset']
-        )
-        instrument.notes.append(midi_note)
-    midi.instruments.append(instrument)
-    midi.write(out_midi_path)
+    _write_midi(out_midi_path, notes, job['tempo'], job['program'])
 
     summary = {
         'midi_path': out_midi_path,
         'notes': notes,
-        'tempo': tempo,
-        'model_used': model
+        'tempo': job['tempo'],
+        'model_used': job['model'],
+        'active_seconds': job['active_seconds'],
+        'skipped_seconds': max(0.0, job['features'].duration - job['active_seconds'])
     }
+    if job['silent']:
+        summary['skipped'] = 'silent'
+
+    if cache is not None:
+        cache.store(job['key'], notes, {'tempo': float(job['tempo']), 'model_used': job['model'],
+                                        'instrument': job['instrument_hint'],
+                                        'active_seconds': job['active_seconds'],
+                                        'skipped_seconds': summary['skipped_seconds'],
+                                        'skipped': summary.get('skipped')})
+        summary['cache'] = 'miss'
 
     return out_midi_path, summary
 
-def _transcribe_onsets_frames(audio, sr):
+def _write_midi(out_midi_path, notes, tempo, program):
+    with metrics.stage('midi_write', notes=len(notes)):
+        write_smf(out_midi_path, notes.onset, notes.offset, notes.pitch, notes.velocity,
+                  tempo=tempo, program=program)
+
+def _transcribe_onsets_frames(features):
     # Placeholder: basic onset detection
-    onsets = librosa.onset.onset_detect(y=audio, sr=sr, units='time')
+    onsets = features.onset_times()
     # Assume pitches from chroma or something
-    chroma = librosa.feature.chroma_stft(y=audio, sr=sr)
-    pitches = []
-    for i in range(len(onsets)):
-        pitch = np.argmax(chroma[:, min(i, chroma.shape[1]-1)]) + 60  # Rough
-        pitches.append(pitch)
-    notes = []
-    for i, onset in enumerate(onsets):
-        notes.append({
-            'onset': onset,
-            'offset': onset + 0.5,
-            'pitch': pitches[i] if i < len(pitches) else 60,
-            'velocity': 0.8
-        })
-    return notes
-
-def _transcribe_crepe_mono(audio, sr, time_precision):
-    time, frequency, confidence, activation = crepe.predict(audio, sr, viterbi=True)
+    chroma = features.chroma()
+    columns = np.minimum(np.arange(len(onsets)), chroma.shape[1] - 1)
+    pitches = np.argmax(chroma[:, columns], axis=0) + 60  # Rough
+    return NoteArray.from_arrays(onsets, onsets + 0.5, pitches, np.full(len(onsets), 0.8))
+
+def _transcribe_crepe_mono(features, time_precision, step_size=10):
+    # One resident model per process; silent frames never reach the network
+    signals, slices, active = _crepe_inputs(features, step_size)
+    tracked = get_runner().predict_many(signals, step_size)
+    return _crepe_notes(features, time_precision, step_size, tracked, slices, active)
+
+def _crepe_inputs(features, step_size):
+    # Signals to pitch-track: the active chunks, split at quiet points (the whole stem if there is one chunk)
+    audio, sr = features.audio(CREPE_SR)
+    hop = int(CREPE_SR * step_size / 1000)
+    boundaries, active = features.chunks(hop, CREPE_SR)
+    slices = chunk_slices(len(audio), boundaries, hop, CREPE_FRAME)
+    if len(slices) == 1:
+        active = [True]
+    return [(audio[lo:hi], sr) for (lo, hi, _, _), flag in zip(slices, active) if flag], slices, active
+
+def _crepe_notes(features, time_precision, step_size, tracked, slices, active):
+    # Chunks share network batches; the Viterbi path restarts per chunk
+    results = iter(tracked)
+    n_frames = sum(count for _, _, _, count in slices)
+    frequency, confidence = np.zeros(n_frames), np.zeros(n_frames)
+    position = 0
+    for (_, _, first, count), flag in zip(slices, active):
+        if flag:
+            _, chunk_frequency, chunk_confidence = next(results)
+            frequency[position:position + count] = chunk_frequency[first:first + count]
+            confidence[position:position + count] = chunk_confidence[first:first + count]
+        position += count
+    time = np.arange(n_frames) * step_size / 1000.0
     # Onset detection
-    onsets = librosa.onset.onset_detect(y=audio, sr=sr, units='time')
-    notes = []
-    for onset in onsets:
-        idx = np.argmin(np.abs(time - onset))
-        pitch = frequency[idx]
-        vel = confidence[idx]
-        offset = onset + 0.5  # Rough
-        # Quantize onset/offset to time_precision ms
-        precision_sec = time_precision / 1000
-        onset = round(onset / precision_sec) * precision_sec
-        offset = round(offset / precision_sec) * precision_sec
-        notes.append({
-            'onset': onset,
-            'offset': offset,
-            'pitch': int(round(pitch)),
-            'velocity': vel
-        })
-    return notes
-
-def _transcribe_mt3(audio, sr):
+    onsets = features.onset_times()
+    if len(onsets) == 0 or len(time) == 0:
+        return NoteArray()
+
+    # Nearest CREPE frame to each onset
+    idx = np.clip(np.searchsorted(time, onsets), 0, len(time) - 1)
+    prev = np.maximum(idx - 1, 0)
+    idx = np.where(np.abs(onsets - time[prev]) <= np.abs(time[idx] - onsets), prev, idx)
+
+    # Onsets on silent or unvoiced frames have no pitch to give a note
+    keep = (frequency[idx] > 0) & (confidence[idx] >= VOICING_THRESHOLD)
+    onsets, idx = onsets[keep], idx[keep]
+    pitch = librosa.hz_to_midi(frequency[idx])
+    offsets = onsets + 0.5  # Rough
+    # Quantize onset/offset to time_precision ms
+    precision_sec = time_precision / 1000
+    onsets = np.round(onsets / precision_sec) * precision_sec
+    offsets = np.round(offsets / precision_sec) * precision_sec
+    return NoteArray.from_arrays(onsets, offsets, np.round(pitch), confidence[idx])
+
+def _transcribe_mt3(features):
     # Placeholder
     logging.info("MT3 not implemented, using heuristic")
-    return _transcribe_heuristic(audio, sr)
-
-def _transcribe_heuristic(audio, sr):
-    # Spectral peaks
-    stft = librosa.stft(audio)
-    mag = np.abs(stft)
-    peaks = librosa.util.peak_pick(mag.mean(axis=0), 5, 5, 5, 5, 0.5, 10)
-    times = librosa.times_like(stft, sr=sr)
-    pitches = []
-    for peak in peaks:
-        freqs = librosa.fft_frequencies(sr=sr)
-        pitch = librosa.hz_to_midi(freqs[np.argmax(mag[:, peak])])
-        pitches.append(pitch)
-    notes = []
-    for i, peak in enumerate(peaks):
-        onset = times[peak]
-        notes.append({
-            'onset': onset,
-            'offset': onset + 0.5,
-            'pitch': int(round(pitches[i])) if i < len(pitches) else 60,
-            'velocity': 0.7
-        })
-    return notes
+    return _transcribe_heuristic(features)
+
+def _transcribe_heuristic(features):
+    # Harmonic-summation salience on a CQT, multi-pitch per frame, fully vectorized
+    audio, sr = features.audio(POLYPHONIC_SR)
+    return transcribe_polyphonic(audio, sr, salience=features.cqt_salience(POLYPHONIC_SR))
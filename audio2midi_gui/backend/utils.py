@@ -1,2 +1,115 @@
 # utils.py
-# Placeholder for utility functions
+# Shared helpers for the backend modules
+import os
+import hashlib
+import numpy as np
+import soundfile as sf
+
+HASH_BLOCK_FRAMES = 1 << 16
+
+
+def hash_audio(path, block_frames=HASH_BLOCK_FRAMES):
+    """
+    Hash the decoded samples of an audio file.
+
+    The digest covers sample rate, channel count and the float32 samples, so
+    the same recording saved under another name (or with different tags)
+    hashes identically.
+
+    Args:
+        path (str): Path to audio file.
+        block_frames (int): Frames decoded per block.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    try:
+        with sf.SoundFile(str(path)) as f:
+            digest.update(f"{f.samplerate}:{f.channels}".encode())
+            for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                digest.update(np.ascontiguousarray(block).tobytes())
+    except RuntimeError:
+        # Formats libsndfile can't decode (e.g. mp3 on older builds)
+        import librosa
+
+        audio, sr = librosa.load(str(path), sr=None, mono=False)
+        audio = np.atleast_2d(audio).T
+        digest.update(f"{sr}:{audio.shape[1]}".encode())
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def audio_duration(path):
+    """Duration in seconds from the file header, or None if libsndfile can't read it."""
+    try:
+        return sf.info(str(path)).duration
+    except RuntimeError:
+        return None
+
+
+TARGET_SAMPLE_RATE = 44100
+TARGET_SUBTYPE = 'PCM_16'
+NORMALIZE_BLOCK_FRAMES = 1 << 16
+
+
+def normalize_wav(path, sample_rate=TARGET_SAMPLE_RATE, subtype=TARGET_SUBTYPE,
+                  block_frames=NORMALIZE_BLOCK_FRAMES):
+    """
+    Convert a WAV in place to `sample_rate`/`subtype`, streaming in blocks.
+
+    Files already in the target format are left untouched. Otherwise the
+    file is resampled with a streaming soxr resampler and written as
+    `subtype` to a temporary file that replaces the original.
+
+    Args:
+        path (str): WAV to normalize.
+        sample_rate (int): Target sample rate.
+        subtype (str): Target soundfile subtype.
+        block_frames (int): Frames processed per block.
+
+    Returns:
+        dict: {path, duration, sample_rate, channels} of the normalized file.
+    """
+    path = str(path)
+    info = sf.info(path)
+    if info.samplerate == sample_rate and info.subtype == subtype:
+        return {
+            "path": path,
+            "duration": info.duration,
+            "sample_rate": info.samplerate,
+            "channels": info.channels
+        }
+
+    resampler = None
+    if info.samplerate != sample_rate:
+        import soxr
+
+        resampler = soxr.ResampleStream(info.samplerate, sample_rate, info.channels, dtype='float32')
+
+    tmp_path = path + '.tmp'
+    frames = 0
+    try:
+        with sf.SoundFile(path) as src, \
+                sf.SoundFile(tmp_path, 'w', samplerate=sample_rate, channels=info.channels,
+                             subtype=subtype, format='WAV') as dst:
+            for block in src.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                if resampler is not None:
+                    block = resampler.resample_chunk(block, last=False)
+                dst.write(block)
+                frames += len(block)
+            if resampler is not None:
+                tail = resampler.resample_chunk(np.zeros((0, info.channels), dtype=np.float32), last=True)
+                dst.write(tail)
+                frames += len(tail)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        "path": path,
+        "duration": frames / sample_rate,
+        "sample_rate": sample_rate,
+        "channels": info.channels
+    }
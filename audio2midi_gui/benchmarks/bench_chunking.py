@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Single-pass vs silence-split parallel transcription of one long stem.
+
+Run from the project root:
+    python -m benchmarks.bench_chunking --seconds 300 --workers 1 2 4
+"""
+import argparse
+import time
+import numpy as np
+from backend.features import StemFeatures
+from backend.polyphonic import transcribe_polyphonic, cqt_magnitude
+from backend.transcribe import _transcribe_heuristic
+from benchmarks.bench_polyphonic import synth_chords, SR
+
+
+def synth_phrases(seconds, phrase_seconds=12.0, rest_seconds=1.0):
+    """Chord phrases separated by short rests, like a part that breathes."""
+    audio = synth_chords(seconds)
+    period = int((phrase_seconds + rest_seconds) * SR)
+    for start in range(int(phrase_seconds * SR), len(audio), period):
+        audio[start:start + int(rest_seconds * SR)] = 0.0
+    return audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunked transcription of one stem")
+    parser.add_argument("--seconds", type=float, default=300)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    audio = synth_phrases(args.seconds)
+    transcribe_polyphonic(audio[:2 * SR], SR)  # warm up librosa's filter caches
+
+    start = time.perf_counter()
+    single = transcribe_polyphonic(audio, SR, cqt=cqt_magnitude(audio, SR))
+    baseline = time.perf_counter() - start
+    print(f"single pass: {baseline:7.3f}s, RTF {baseline / args.seconds:.4f}, {len(single)} notes")
+
+    for workers in args.workers:
+        features = StemFeatures(audio=audio, sr=SR, workers=workers)
+        start = time.perf_counter()
+        notes = _transcribe_heuristic(features)
+        elapsed = time.perf_counter() - start
+        same = (len(notes) == len(single) and np.array_equal(notes.onset, single.onset)
+                and np.array_equal(notes.pitch, single.pitch) and np.array_equal(notes.offset, single.offset))
+        chunks = len(features.split_points(512, SR)) - 1
+        print(f"{workers:2d} workers: {elapsed:7.3f}s, {baseline / elapsed:5.2f}x, {chunks} chunks, "
+              f"{'identical' if same else 'DIFFERENT'} notes")
+
+
+if __name__ == "__main__":
+    main()
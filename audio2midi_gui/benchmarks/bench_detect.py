@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""
+Instrument detection time per stem against stem length.
+
+Run from the project root:
+    python -m benchmarks.bench_detect --seconds 10 60 600 --stems 4
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import soundfile as sf
+from backend.instrument_detect import detect_instruments
+from benchmarks.bench_polyphonic import synth_chords, SR
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched instrument detection")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60, 600])
+    parser.add_argument("--stems", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for seconds in args.seconds:
+            audio = synth_chords(seconds)
+            paths = []
+            for i in range(args.stems):
+                path = Path(temp_dir) / f"stem{i}_{seconds:.0f}.wav"
+                sf.write(path, audio, SR, subtype='PCM_16')
+                paths.append(str(path))
+            detect_instruments(paths[:1])  # loads the classifier, warms librosa
+
+            start = time.perf_counter()
+            detect_instruments(paths)
+            elapsed = time.perf_counter() - start
+            print(f"{seconds:7.0f}s stems: {1000 * elapsed / args.stems:7.1f} ms per stem "
+                  f"({args.stems} stems in one batch)")
+
+
+if __name__ == "__main__":
+    main()
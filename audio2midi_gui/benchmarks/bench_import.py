@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Cold import time of the entry-point modules, each in a fresh interpreter.
+
+Fails (exit status 1) when a module exceeds its budget, so it can guard
+against a heavy framework sneaking back into a module-level import.
+
+Run from the project root:
+    python -m benchmarks.bench_import --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Seconds; generous enough for a slow CI machine, far below a torch/TF import
+BUDGETS = {
+    'backend.midi_writer': 0.5,
+    'tools.export_midi': 0.5,
+    'backend.registry': 0.5,
+    'backend.separation': 1.0,
+    'backend.instrument_detect': 1.5,
+    'backend.transcribe': 1.5,
+}
+
+
+def import_time(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return float(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark module import time")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modules", nargs="+", default=list(BUDGETS))
+    args = parser.parse_args()
+
+    failed = []
+    for module in args.modules:
+        seconds = statistics.median(import_time(module) for _ in range(args.repeat))
+        budget = BUDGETS.get(module)
+        status = "ok" if budget is None or seconds <= budget else "OVER BUDGET"
+        if status != "ok":
+            failed.append(module)
+        print(f"{module:28s} {seconds * 1000:8.1f} ms  (budget {budget * 1000 if budget else float('nan'):.0f} ms) {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
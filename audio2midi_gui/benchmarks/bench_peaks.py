@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Waveform peak pyramid: build time, size and per-redraw query time for long files.
+
+Writes a synthetic mono file of the requested length (16-bit WAV), then
+times the streaming pyramid build and `window` queries at several zoom
+levels for a 1600 px wide display.
+
+Run from the project root:
+    python -m benchmarks.bench_peaks --minutes 10 60
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import soundfile as sf
+from backend.peaks import PeakPyramid
+
+SR = 44100
+WIDTH = 1600
+
+
+def write_long_file(path, minutes, block_seconds=60):
+    rng = np.random.default_rng(0)
+    with sf.SoundFile(path, 'w', samplerate=SR, channels=1, subtype='PCM_16') as f:
+        for _ in range(int(minutes * 60 / block_seconds)):
+            t = np.arange(SR * block_seconds) / SR
+            f.write((0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))).astype(np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the waveform peak pyramid")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 60])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in args.minutes:
+            path = os.path.join(tmp, f"{minutes}min.wav")
+            write_long_file(path, minutes)
+
+            started = time.perf_counter()
+            pyramid = PeakPyramid.from_file(path)
+            build = time.perf_counter() - started
+
+            queries = []
+            for span in (pyramid.duration, 600, 60, 5, 0.5):
+                started = time.perf_counter()
+                for start in np.linspace(0, max(0.0, pyramid.duration - span), 20):
+                    pyramid.window(start, start + span, WIDTH)
+                queries.append((span, (time.perf_counter() - started) / 20))
+
+            print(f"{minutes:5.0f} min: build {build:6.2f}s, {len(pyramid.levels)} levels, "
+                  f"{pyramid.nbytes / 1e6:6.1f} MB (audio as float32: {pyramid.frames * 4 / 1e6:7.1f} MB)")
+            for span, seconds in queries:
+                print(f"    window {span:7.1f}s -> {seconds * 1e3:6.3f} ms per redraw")
+
+
+if __name__ == "__main__":
+    main()
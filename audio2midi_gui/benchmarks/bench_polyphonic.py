@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Real-time factor of the vectorized polyphonic engine on long synthetic chords.
+
+Run from the project root:
+    python -m benchmarks.bench_polyphonic --seconds 60 600
+"""
+import argparse
+import time
+import numpy as np
+import librosa
+from backend.polyphonic import transcribe_polyphonic
+
+SR = 22050
+PROGRESSION = [[60, 64, 67], [57, 60, 64], [53, 57, 60, 65], [55, 59, 62, 67]]
+
+
+def synth_chords(seconds, sr=SR, chord_seconds=1.0, seed=0):
+    """Decaying harmonic chords, one every `chord_seconds`, deterministic for a seed."""
+    rng = np.random.default_rng(seed)
+    n = int(chord_seconds * sr)
+    t = np.arange(n) / sr
+    envelope = np.minimum(1.0, t * 50) * np.exp(-3 * t)
+    audio = np.zeros(int(seconds * sr), dtype=np.float32)
+    for i, start in enumerate(range(0, len(audio) - n + 1, n)):
+        chord = np.array(PROGRESSION[i % len(PROGRESSION)]) + rng.integers(-2, 3)
+        freqs = librosa.midi_to_hz(chord)[:, None] * np.arange(1, 7)[None, :]
+        amps = np.where(freqs < sr / 2, 1.0 / np.arange(1, 7), 0.0)
+        block = (amps[..., None] * np.sin(2 * np.pi * freqs[..., None] * t)).sum(axis=(0, 1))
+        audio[start:start + n] = envelope * block
+    return audio / (2 * np.abs(audio).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark polyphonic transcription")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60, 300])
+    args = parser.parse_args()
+
+    # Warm up librosa's filter caches and numba
+    transcribe_polyphonic(synth_chords(2), SR)
+    for seconds in args.seconds:
+        audio = synth_chords(seconds)
+        start = time.perf_counter()
+        notes = transcribe_polyphonic(audio, SR)
+        elapsed = time.perf_counter() - start
+        print(f"{seconds:7.0f}s audio: {elapsed:7.3f}s, RTF {elapsed / seconds:.4f}, {len(notes)} notes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Per-file separation latency: `python -m demucs` subprocess vs resident engine.
+
+Run from the project root:
+    python -m benchmarks.bench_separation tests/assets/mix_short.wav -n 3
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from backend.separation import separate, SeparationEngine
+
+
+def bench_subprocess(inputs, out_root, device):
+    timings = []
+    for i, path in enumerate(inputs):
+        start = time.perf_counter()
+        separate(path, str(Path(out_root) / f"sub_{i}"), device=device)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_engine(inputs, out_root, device):
+    start = time.perf_counter()
+    engine = SeparationEngine(device=device)
+    engine.load()
+    load_time = time.perf_counter() - start
+
+    timings = []
+    for i, path in enumerate(inputs):
+        start = time.perf_counter()
+        engine.separate(path, Path(out_root) / f"engine_{i}")
+        timings.append(time.perf_counter() - start)
+    return load_time, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark separation latency")
+    parser.add_argument("inputs", nargs="+", help="Audio files to separate")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Passes over the inputs")
+    parser.add_argument("--device", default="cpu", help="cpu or cuda")
+    args = parser.parse_args()
+
+    inputs = args.inputs * args.repeat
+    with tempfile.TemporaryDirectory() as out_root:
+        sub = bench_subprocess(inputs, out_root, args.device)
+        load_time, eng = bench_engine(inputs, out_root, args.device)
+
+    print(f"files: {len(inputs)}")
+    print(f"subprocess: mean {sum(sub) / len(sub):.3f}s/file, total {sum(sub):.3f}s")
+    print(f"engine:     load {load_time:.3f}s, mean {sum(eng) / len(eng):.3f}s/file, "
+          f"total {load_time + sum(eng):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
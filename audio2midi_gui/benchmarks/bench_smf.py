@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+MIDI write throughput: direct SMF encoder vs pretty_midi.
+
+Run from the project root:
+    python -m benchmarks.bench_smf --notes 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pretty_midi
+from backend.smf import write_smf
+
+
+def random_notes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    onset = np.sort(rng.uniform(0, n / 20, n))
+    return onset, onset + rng.uniform(0.05, 1.0, n), rng.integers(21, 109, n), rng.integers(1, 128, n)
+
+
+def write_pretty_midi(path, onset, offset, pitch, velocity):
+    midi = pretty_midi.PrettyMIDI(initial_tempo=120)
+    instrument = pretty_midi.Instrument(program=0)
+    for a, b, p, v in zip(onset.tolist(), offset.tolist(), pitch.tolist(), velocity.tolist()):
+        instrument.notes.append(pretty_midi.Note(velocity=v, pitch=p, start=a, end=b))
+    midi.instruments.append(instrument)
+    midi.write(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MIDI writing")
+    parser.add_argument("--notes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--skip-reference", action="store_true", help="Only time the direct encoder")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.notes:
+            notes = random_notes(n)
+            path = os.path.join(tmp, 'direct.mid')
+            start = time.perf_counter()
+            write_smf(path, *notes)
+            direct = time.perf_counter() - start
+            line = f"{n:8d} notes: direct {direct:7.3f}s ({n / direct:,.0f} notes/s)"
+            if not args.skip_reference:
+                ref_path = os.path.join(tmp, 'ref.mid')
+                start = time.perf_counter()
+                write_pretty_midi(ref_path, *notes)
+                reference = time.perf_counter() - start
+                with open(path, 'rb') as a, open(ref_path, 'rb') as b:
+                    same = a.read() == b.read()
+                line += f", pretty_midi {reference:7.3f}s, speedup {reference / direct:5.1f}x, identical={same}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+Latency of the streaming transcriber replaying a file block by block.
+
+Run from the project root:
+    python -m benchmarks.bench_streaming --block-size 256 512 1024
+"""
+import argparse
+import soundfile as sf
+from backend.streaming import StreamingTranscriber, blocks_from_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming transcription latency")
+    parser.add_argument("input", nargs="?", default="tests/assets/sine_notes.wav")
+    parser.add_argument("--block-size", type=int, nargs="+", default=[256, 512, 1024])
+    args = parser.parse_args()
+
+    sr = sf.info(args.input).samplerate
+    for block_size in args.block_size:
+        transcriber = StreamingTranscriber(sr, block_size=block_size)
+        events = list(transcriber.stream(blocks_from_file(args.input, block_size)))
+        stats = transcriber.latency_stats(events)
+        notes = sum(1 for e in events if e['type'] == 'note_on')
+        print(f"block {block_size:5d} ({stats['block_duration'] * 1000:5.1f} ms): {notes} notes, "
+              f"note-on latency mean {stats['note_on_latency_mean'] * 1000:.1f} ms "
+              f"max {stats['note_on_latency_max'] * 1000:.1f} ms, "
+              f"compute/block mean {stats['block_compute_mean'] * 1000:.3f} ms "
+              f"p99 {stats['block_compute_p99'] * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
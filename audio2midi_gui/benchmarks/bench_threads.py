@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Throughput of process x thread splits for CPU transcription of the test assets.
+
+Every split runs in a fresh interpreter so thread limits never leak between
+runs. Prints wall time per split and the fastest one.
+
+Run from the project root:
+    python -m benchmarks.bench_threads --copies 8
+"""
+import argparse
+import glob
+import subprocess
+import sys
+import time
+from backend.threads import plan, available_cores, limit_threads, POLICIES
+
+
+def run_split(stems, processes, threads, model):
+    from backend.scheduler import Scheduler, stem_task
+    import os
+    import shutil
+    import tempfile
+
+    if processes == 1:
+        limit_threads(threads)
+    scheduler = Scheduler(cpu_slots=processes, processes=processes > 1, worker_threads=threads)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, stem in enumerate(stems):
+            path = os.path.join(tmp, f"{i}_{os.path.basename(stem)}")
+            shutil.copy(stem, path)
+            paths.append(path)
+        started = time.perf_counter()
+        for path in paths:
+            scheduler.submit(stem_task(path, model))
+        tasks = scheduler.run()
+        elapsed = time.perf_counter() - started
+    scheduler.shutdown()
+    failed = [t for t in tasks if t.state != 'done']
+    if failed:
+        raise RuntimeError(f"{len(failed)} tasks failed: {failed[0].error}")
+    return elapsed
+
+
+def splits(cores):
+    found = {(p, cores // p) for p in range(1, cores + 1) if cores // p >= 1}
+    found |= {(s['processes'], s['threads']) for s in (plan(policy, cores=cores) for policy in POLICIES)}
+    return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process/thread splits")
+    parser.add_argument("--stems", nargs="+", default=sorted(glob.glob("tests/assets/*_stem.wav")
+                                                            + glob.glob("tests/assets/*_short.wav")))
+    parser.add_argument("--copies", type=int, default=4, help="Copies of each stem in the workload")
+    parser.add_argument("--model", default="heuristic_polyphonic")
+    parser.add_argument("--cores", type=int, default=available_cores())
+    parser.add_argument("--single", type=int, nargs=2, metavar=("PROCESSES", "THREADS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    stems = args.stems * args.copies
+    if args.single:
+        print(run_split(stems, *args.single, args.model))
+        return
+
+    policies = {}
+    for policy in POLICIES:
+        split = plan(policy, cores=args.cores)
+        policies.setdefault((split['processes'], split['threads']), []).append(policy)
+    results = []
+    for processes, threads in splits(args.cores):
+        cmd = [sys.executable, '-m', 'benchmarks.bench_threads', '--single', str(processes), str(threads),
+               '--copies', str(args.copies), '--model', args.model, '--stems', *args.stems]
+        elapsed = float(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.split()[-1])
+        results.append((elapsed, processes, threads))
+        label = '/'.join(policies.get((processes, threads), []))
+        print(f"{processes:3d} processes x {threads:3d} threads: {elapsed:7.2f}s "
+              f"({len(stems) / elapsed:6.2f} stems/s) {label}", flush=True)
+
+    elapsed, processes, threads = min(results)
+    print(f"best: {processes} processes x {threads} threads ({elapsed:.2f}s for {len(stems)} stems)")
+
+
+if __name__ == "__main__":
+    main()
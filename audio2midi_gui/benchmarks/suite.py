@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+"""
+Stage-by-stage benchmark of the pipeline on synthetic long-form inputs.
+
+For every size a deterministic mix of sine melodies, dense chords and
+percussive clicks (see `benchmarks.synth`) is separated, analysed,
+transcribed by every model and written to MIDI. Each stage runs in a fresh
+interpreter, so its peak RSS is its own, and is timed by `backend.metrics`
+after a warm-up run on a short clip. Throughput and peak memory are
+compared against a stored baseline; the exit status is 1 when a stage
+regressed by more than the thresholds, failed (or was killed), or has
+baseline rows but produced none. Stages the baseline lists under
+`expected_failures` (e.g. a model that is not installed on the reference
+machine) may fail without failing the run.
+
+Separation uses a local stub model (fixed band-split filters) unless
+`--separation` asks for Demucs or Spleeter, so the suite runs on CPU-only
+machines without model weights.
+
+Run from the project root:
+    python -m benchmarks.suite --sizes 10s 1m 10m 60m
+    python -m benchmarks.suite --sizes 10s 1m --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from benchmarks.synth import SIZES, write_asset
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+# Allowed throughput drop and peak memory growth (fractions); stages whose
+# baseline wall time is under min_wall seconds are reported but not gated
+THRESHOLDS = {'throughput': 0.25, 'memory': 0.25, 'min_wall': 0.2}
+WARMUP_SECONDS = 2
+# Transcription model -> stem it transcribes
+MODELS = {
+    'heuristic_polyphonic': 'other',
+    'onsets_frames': 'other',
+    'crepe_monophonic': 'vocals',
+    'mt3': 'other',
+}
+# Stub separator bands in Hz: (low, high), None for open
+STUB_BANDS = {'bass': (None, 250.0), 'vocals': (500.0, 2000.0), 'drums': (5000.0, None)}
+
+
+def stub_separate_block(audio, sr):
+    """
+    Band-split stand-in for Demucs with the `separate_chunked` block signature.
+
+    Bass, vocals and drums are fixed filter bands; 'other' is the residual,
+    so the stems still sum to the mix.
+    """
+    from scipy.signal import butter, sosfilt
+
+    stems = {}
+    for name, (low, high) in STUB_BANDS.items():
+        if low is None:
+            sos = butter(4, high, btype='lowpass', fs=sr, output='sos')
+        elif high is None:
+            sos = butter(4, low, btype='highpass', fs=sr, output='sos')
+        else:
+            sos = butter(4, [low, high], btype='bandpass', fs=sr, output='sos')
+        stems[name] = sosfilt(sos, audio, axis=0).astype('float32')
+    stems['other'] = audio - sum(stems.values())
+    return stems
+
+
+def warm_up(job, model, work_dir, separation):
+    """
+    Run `job` once on a short clip, so first-call costs (lazy imports, numba
+    compilation, filter banks, model loading) are not timed.
+    """
+    clip = work_dir / 'warmup.wav'
+    if not clip.exists():
+        write_asset(clip, WARMUP_SECONDS)
+    if job == 'separate':
+        if separation == 'stub':
+            from backend.separation import separate_chunked
+
+            separate_chunked(clip, work_dir / 'warmup_stems', stub_separate_block)
+        else:
+            from backend.separation import separate
+
+            separate(clip, work_dir / 'warmup_stems', backend=separation)
+    elif job == 'detect':
+        from backend.instrument_detect import detect_instruments
+
+        detect_instruments([str(clip)])
+    elif job == 'transcribe':
+        from backend.transcribe import transcribe_stem_to_midi
+
+        transcribe_stem_to_midi(str(clip), model=model, out_midi_path=str(work_dir / 'warmup.mid'))
+
+
+def run_job(job, model, mix_path, work_dir, separation):
+    """Run one stage in this process and return its metrics records."""
+    from backend import metrics
+
+    metrics.configure(None)
+    work_dir = Path(work_dir)
+    warm_up(job, model, work_dir, separation)
+    skip = len(metrics.recent())
+    stems_dir = work_dir / 'stems'
+    if job == 'separate':
+        if separation == 'stub':
+            from backend.separation import separate_chunked
+            from backend.utils import audio_duration
+
+            with metrics.stage('separate', audio_duration(mix_path), backend='stub'):
+                separate_chunked(mix_path, stems_dir, stub_separate_block)
+        else:
+            from backend.separation import separate
+
+            separate(mix_path, stems_dir, backend=separation)
+    elif job == 'detect':
+        from backend.instrument_detect import detect_instruments
+
+        detect_instruments(sorted(str(path) for path in stems_dir.glob('*.wav')))
+    elif job == 'transcribe':
+        from backend.transcribe import transcribe_stem_to_midi
+
+        _, summary = transcribe_stem_to_midi(str(stems_dir / f"{MODELS[model]}.wav"), model=model,
+                                             out_midi_path=str(work_dir / f"{model}.mid"))
+        summary['notes'].save(work_dir / f"{model}.npz")
+    elif job == 'write':
+        from backend.midi_writer import write_midi_from_notes
+        from backend.notes import NoteArray
+
+        arrays = []
+        for path in sorted(work_dir.glob('*.npz')):
+            notes = NoteArray.load(path)
+            notes.tracks = [path.stem]
+            arrays.append(notes)
+        if not arrays:
+            raise RuntimeError("No transcriptions to write")
+        write_midi_from_notes(NoteArray.concatenate(arrays), work_dir / 'all.mid')
+    else:
+        raise ValueError(f"Unknown job {job}")
+    return metrics.recent()[skip:]
+
+
+def jobs():
+    return [('separate', None), ('detect', None)] + [('transcribe', model) for model in MODELS] + [('write', None)]
+
+
+def run_isolated(job, model, mix_path, work_dir, separation):
+    """
+    `run_job` in a fresh interpreter.
+
+    Returns:
+        tuple: (records, error) where error is the last stderr line (or the
+            signal) on failure.
+    """
+    cmd = [sys.executable, '-m', 'benchmarks.suite', '--job', job, '--mix', str(mix_path),
+           '--work', str(work_dir), '--separation', separation]
+    if model:
+        cmd += ['--model', model]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode < 0:
+        # Usually SIGKILL from the OOM killer
+        return [], f"killed by signal {-result.returncode}"
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return [], lines[-1] if lines else f"exit status {result.returncode}"
+    return json.loads(result.stdout.strip().splitlines()[-1]), None
+
+
+def aggregate(records, prefix):
+    """
+    Per-stage totals of one job's records.
+
+    Returns:
+        dict: '<prefix>/<stage>' -> wall_seconds, cpu_seconds, audio_seconds,
+            notes, peak_rss_bytes, rss_growth_bytes and throughput (audio
+            seconds per wall second, or notes per wall second for stages
+            without audio).
+    """
+    rows = {}
+    for record in records:
+        row = rows.setdefault(f"{prefix}/{record['stage']}", {
+            'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'audio_seconds': 0.0, 'notes': 0,
+            'peak_rss_bytes': 0, 'rss_growth_bytes': 0})
+        row['wall_seconds'] += record['wall_seconds']
+        row['cpu_seconds'] += record['cpu_seconds']
+        row['audio_seconds'] += record.get('audio_seconds') or 0.0
+        row['notes'] += record.get('notes') or 0
+        row['peak_rss_bytes'] = max(row['peak_rss_bytes'], record['peak_rss_bytes'])
+        row['rss_growth_bytes'] = max(row['rss_growth_bytes'], record['rss_growth_bytes'])
+    for row in rows.values():
+        work = row['audio_seconds'] or row['notes']
+        row['throughput'] = work / row['wall_seconds'] if row['wall_seconds'] > 0 else 0.0
+    return rows
+
+
+def compare(results, baseline, thresholds):
+    """
+    Regressions of `results` against `baseline` rows.
+
+    A baseline row without a result (its stage failed or never ran) is a
+    regression with metric 'missing' and current value None.
+
+    Returns:
+        list: (key, metric, baseline value, current value) per regression.
+    """
+    regressions = []
+    for key, base in baseline.items():
+        row = results.get(key)
+        if row is None:
+            regressions.append((key, 'missing', base['throughput'], None))
+            continue
+        if (base['wall_seconds'] >= thresholds['min_wall']
+                and row['throughput'] < base['throughput'] * (1 - thresholds['throughput'])):
+            regressions.append((key, 'throughput', base['throughput'], row['throughput']))
+        if base['peak_rss_bytes'] and row['peak_rss_bytes'] > base['peak_rss_bytes'] * (1 + thresholds['memory']):
+            regressions.append((key, 'peak_rss_bytes', base['peak_rss_bytes'], row['peak_rss_bytes']))
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {'thresholds': {}, 'results': {}}
+    baseline.setdefault('expected_failures', {})
+    return baseline
+
+
+def save_baseline(path, results, thresholds, failures=()):
+    """
+    Merge `results` into the baseline at `path` (other sizes are kept).
+
+    Stages in `failures` become expected failures and lose their rows;
+    stages that ran are no longer expected to fail.
+    """
+    baseline = load_baseline(path)
+    ran = {key.rsplit('/', 1)[0] for key in results}
+    baseline['results'].update(results)
+    expected = {label: error for label, error in baseline['expected_failures'].items() if label not in ran}
+    for label, error in failures:
+        expected[label] = error
+        baseline['results'] = {key: row for key, row in baseline['results'].items()
+                               if key.rsplit('/', 1)[0] != label}
+    baseline['results'] = dict(sorted(baseline['results'].items()))
+    baseline['expected_failures'] = dict(sorted(expected.items()))
+    baseline['thresholds'] = thresholds
+    baseline['machine'] = {'platform': platform.platform(), 'processor': platform.processor(),
+                           'cpus': os.cpu_count(), 'python': platform.python_version()}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+
+
+def print_row(key, row, base):
+    unit = 'x realtime' if row['audio_seconds'] else 'notes/s'
+    line = (f"{key:40s} {row['wall_seconds']:8.3f}s wall {row['cpu_seconds']:8.3f}s cpu "
+            f"{row['throughput']:10.1f} {unit:10s} {row['peak_rss_bytes'] / 2 ** 20:7.0f} MB peak")
+    if base:
+        change = row['throughput'] / base['throughput'] - 1 if base['throughput'] else 0.0
+        line += f"  ({change:+.0%} throughput vs baseline)"
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic inputs")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--separation", choices=["stub", "demucs", "spleeter"], default="stub")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--assets", help="Keep generated inputs here and reuse them (default: temporary)")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--max-slowdown", type=float, help="Allowed throughput drop, e.g. 0.25")
+    parser.add_argument("--max-memory-growth", type=float, help="Allowed peak RSS growth, e.g. 0.25")
+    parser.add_argument("--min-wall", type=float, help="Stages faster than this in the baseline are not gated")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--job", help=argparse.SUPPRESS)
+    parser.add_argument("--model", help=argparse.SUPPRESS)
+    parser.add_argument("--mix", help=argparse.SUPPRESS)
+    parser.add_argument("--work", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.job:
+        print(json.dumps(run_job(args.job, args.model, args.mix, args.work, args.separation), default=str))
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    thresholds = dict(THRESHOLDS, **baseline['thresholds'])
+    for name, value in (('throughput', args.max_slowdown), ('memory', args.max_memory_growth),
+                        ('min_wall', args.min_wall)):
+        if value is not None:
+            thresholds[name] = value
+
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        assets = Path(args.assets or tmp)
+        assets.mkdir(parents=True, exist_ok=True)
+        for size in args.sizes:
+            mix_path = assets / f"mix_{size}_seed{args.seed}.wav"
+            if not mix_path.exists():
+                write_asset(mix_path, SIZES[size], seed=args.seed)
+            work_dir = Path(tmp) / size
+            work_dir.mkdir()
+            for job, model in jobs():
+                label = f"{size}/{model or job}"
+                records, error = run_isolated(job, model, mix_path, work_dir, args.separation)
+                if error:
+                    failures.append((label, error))
+                    print(f"{label:40s} FAILED: {error}", flush=True)
+                    if job == 'separate':
+                        break
+                    continue
+                rows = aggregate(records, label)
+                for key, row in rows.items():
+                    print_row(key, row, baseline['results'].get(key))
+                results.update(rows)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'thresholds': thresholds, 'results': results, 'failures': failures}, f, indent=2)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, thresholds, failures)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    # Only the sizes of this run are expected to have rows
+    expected = {key: row for key, row in baseline['results'].items() if key.split('/', 1)[0] in args.sizes}
+    regressions = compare(results, expected, thresholds)
+    for key, metric, base, current in regressions:
+        if current is None:
+            print(f"REGRESSION {key}: no result (baseline {base:.4g})")
+        else:
+            print(f"REGRESSION {key}: {metric} {base:.4g} -> {current:.4g}")
+    unexpected = [(label, error) for label, error in failures if label not in baseline['expected_failures']]
+    for label, error in failures:
+        if label in baseline['expected_failures']:
+            print(f"EXPECTED FAILURE {label}: {error}")
+    if baseline['results']:
+        print(f"{len(regressions)} regressions against {args.baseline} "
+              f"(slowdown > {thresholds['throughput']:.0%}, memory growth > {thresholds['memory']:.0%})")
+    if unexpected:
+        print(f"{len(unexpected)} stages failed: {', '.join(label for label, _ in unexpected)}")
+    return 1 if regressions or unexpected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Deterministic synthetic long-form inputs for the benchmark suite.
+
+Every sound is an event on a fixed grid whose parameters come from
+`default_rng([seed, kind, index])`, so any block of a signal can be rendered
+on its own and a 60 minute file is streamed to disk without ever being held
+in memory. The same seed gives the same samples on every machine and for
+every block size.
+"""
+from functools import lru_cache
+import numpy as np
+import librosa
+import soundfile as sf
+
+SR = 44100
+SIZES = {'10s': 10, '1m': 60, '10m': 600, '60m': 3600}
+
+MELODY_SECONDS = 0.25  # one melody note (or rest) per grid step
+CHORD_SECONDS = 0.5
+CLICK_SECONDS = 0.125
+PROGRESSION = [[48, 60, 64, 67, 71], [45, 57, 60, 64, 67], [41, 53, 57, 60, 65, 69], [43, 55, 59, 62, 65, 67]]
+# Mix weights; they sum to 1, so the mix never clips
+WEIGHTS = {'melody': 0.4, 'chords': 0.35, 'clicks': 0.25}
+KIND_IDS = {'melody': 0, 'chords': 1, 'clicks': 2}
+BLOCK_SECONDS = 30
+
+
+def _envelope(n, sr, attack=0.005, decay=3.0):
+    t = np.arange(n) / sr
+    return np.minimum(1.0, t / attack) * np.exp(-decay * t)
+
+
+def melody_note(rng, sr):
+    """A sine note with two weak harmonics; one step in eight is a rest."""
+    if rng.random() < 0.125:
+        return np.zeros(int(MELODY_SECONDS * sr))
+    return _melody_wave(int(rng.integers(62, 86)), sr)
+
+
+@lru_cache(maxsize=None)
+def _melody_wave(pitch, sr):
+    n = int(MELODY_SECONDS * sr)
+    freq = librosa.midi_to_hz(pitch)
+    t = np.arange(n) / sr
+    tone = np.sin(2 * np.pi * freq * t) + 0.2 * np.sin(4 * np.pi * freq * t) + 0.1 * np.sin(6 * np.pi * freq * t)
+    return _envelope(n, sr, decay=4.0) * tone / 1.3
+
+
+def chord(rng, sr):
+    """A dense chord of five or six harmonic tones from a progression, randomly transposed."""
+    return _chord_wave(int(rng.integers(len(PROGRESSION))), int(rng.integers(-3, 4)), sr)
+
+
+@lru_cache(maxsize=None)
+def _chord_wave(index, shift, sr):
+    # Only len(PROGRESSION) * 7 distinct chords exist; each is synthesized once
+    n = int(CHORD_SECONDS * sr)
+    harmonics = np.arange(1, 7)
+    freqs = librosa.midi_to_hz(np.array(PROGRESSION[index]) + shift)[:, None] * harmonics[None, :]
+    amps = np.where(freqs < sr / 2, 1.0 / harmonics, 0.0)
+    t = np.arange(n) / sr
+    tone = np.zeros(n)
+    for freq, amp in zip(freqs.ravel(), amps.ravel()):
+        if amp:
+            tone += amp * np.sin(2 * np.pi * freq * t)
+    return _envelope(n, sr, decay=5.0) * tone / amps.sum()
+
+
+def click(rng, sr):
+    """A decaying noise burst; downbeats are accented, some off-beats are dropped."""
+    n = int(CLICK_SECONDS * sr)
+    level = rng.choice([0.0, 0.4, 0.7, 1.0], p=[0.2, 0.3, 0.3, 0.2])
+    return level * _envelope(n, sr, attack=0.0005, decay=60.0) * rng.uniform(-1, 1, n)
+
+
+GENERATORS = {'melody': (melody_note, MELODY_SECONDS), 'chords': (chord, CHORD_SECONDS),
+              'clicks': (click, CLICK_SECONDS)}
+
+
+def render(kind, start, n, sr=SR, seed=0):
+    """
+    Samples [start, start + n) of one synthetic part.
+
+    Args:
+        kind (str): 'melody', 'chords' or 'clicks'.
+        start (int): First sample.
+        n (int): Number of samples.
+        sr (int): Sample rate.
+        seed (int): Seed of the whole signal.
+
+    Returns:
+        np.ndarray: float64 block.
+    """
+    generate, seconds = GENERATORS[kind]
+    period = int(seconds * sr)
+    block = np.zeros(n)
+    # Events fill exactly one grid step, so only those starting inside the block overlap it
+    for index in range(start // period, -(-(start + n) // period)):
+        event = generate(np.random.default_rng([seed, KIND_IDS[kind], index]), sr)
+        lo = index * period - start
+        a, b = max(0, lo), min(n, lo + len(event))
+        block[a:b] += event[a - lo:b - lo]
+    return block
+
+
+def mix(start, n, sr=SR, seed=0, kinds=tuple(WEIGHTS)):
+    """Weighted sum of the parts in `kinds`."""
+    return sum(WEIGHTS[kind] * render(kind, start, n, sr, seed) for kind in kinds)
+
+
+def write_asset(path, seconds, sr=SR, seed=0, kinds=tuple(WEIGHTS), block_seconds=BLOCK_SECONDS):
+    """
+    Stream a mono 16-bit WAV of `mix` to `path`, block by block.
+
+    Returns:
+        str: `path`.
+    """
+    total = int(seconds * sr)
+    block = int(block_seconds * sr)
+    with sf.SoundFile(str(path), 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        for start in range(0, total, block):
+            f.write(mix(start, min(block, total - start), sr, seed, kinds).astype(np.float32))
+    return str(path)
@@ -21,7 +21,6 @@ a = Analysis(
         'spleeter',
         'crepe',
         'pretty_midi',
-        'sklearn.neighbors',
         'librosa',
         'torch',
         'tensorflow',
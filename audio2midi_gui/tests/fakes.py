@@ -0,0 +1,25 @@
+"""Stand-ins for the model backends, shared by the tests that run whole conversions."""
+import shutil
+import numpy as np
+import soundfile as sf
+from pathlib import Path
+from backend.utils import normalize_wav
+from backend.activity import file_activity
+
+
+def copy_separator(input_path, out_dir, device=None, backend='demucs', cache=None, chunk_seconds=None):
+    # Stands in for Demucs: the whole mix becomes the single 'other' stem
+    if 'broken' in Path(input_path).name:
+        raise RuntimeError("cannot separate")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copy(input_path, out_dir / 'other.wav')
+    return [normalize_wav(out_dir / 'other.wav')]
+
+
+def silent_drums_separator(input_path, out_dir, **kwargs):
+    # An a cappella mix: the drums stem Demucs emits is pure silence
+    summary = copy_separator(input_path, out_dir, **kwargs)
+    drums = Path(out_dir) / 'drums.wav'
+    sf.write(drums, np.zeros(44100, dtype=np.float32), 44100, subtype='PCM_16')
+    return [dict(stem, **file_activity(stem['path'])) for stem in summary + [normalize_wav(drums)]]
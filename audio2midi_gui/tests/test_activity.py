@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import soundfile as sf
+from backend.activity import active_regions, file_activity, PAD_SECONDS
+from backend.chunking import framewise, gate, split_points
+from backend.transcribe import transcribe_stem_to_midi
+
+SR = 22050
+
+
+def tone(seconds, sr=SR, freq=440.0):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+class TestActivity(unittest.TestCase):
+
+    def test_regions_are_padded_and_bridged(self):
+        silence = np.zeros(SR * 2, dtype=np.float32)
+        audio = np.concatenate([silence, tone(1), np.zeros(SR // 5, np.float32), tone(1), silence])
+        regions = active_regions(audio, SR)
+        self.assertEqual(len(regions), 1)
+        start, end = regions[0]
+        self.assertAlmostEqual(start / SR, 2 - PAD_SECONDS, delta=0.1)
+        self.assertAlmostEqual(end / SR, 4.2 + PAD_SECONDS, delta=0.1)
+        self.assertEqual(active_regions(silence, SR), [])
+        # Separation bleed far below the threshold is silence
+        self.assertEqual(active_regions(silence + 1e-4, SR), [])
+
+    def test_file_activity(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            silent = Path(temp_dir) / 'drums.wav'
+            sf.write(silent, np.zeros((SR * 3, 2), dtype=np.float32), SR)
+            self.assertEqual(file_activity(silent), {'active': False, 'active_seconds': 0.0})
+        summary = file_activity('tests/assets/piano_short.wav')
+        self.assertTrue(summary['active'])
+        self.assertGreater(summary['active_seconds'], 0.5)
+
+    def test_silent_chunks_are_not_computed(self):
+        audio = np.concatenate([np.zeros(SR * 20, np.float32), tone(5), np.zeros(SR * 20, np.float32)])
+        boundaries, active = gate(split_points(audio, SR, 512), active_regions(audio, SR), 512, len(audio))
+        self.assertEqual(active.count(True), 1)
+
+        computed = []
+
+        def rms(chunk):
+            computed.append(len(chunk))
+            frames = np.pad(chunk, 1024)[np.arange(1 + len(chunk) // 512)[:, None] * 512 + np.arange(2048)]
+            return np.sqrt(np.mean(frames ** 2, axis=1))
+
+        gated = framewise(audio, rms, boundaries, 512, 2048, workers=1, active=active)
+        full = rms(audio)
+        self.assertLess(computed[0], 7 * SR)
+        self.assertEqual(gated.shape, full.shape)
+        np.testing.assert_allclose(gated, full, atol=1e-6)
+
+    def test_silent_stem_is_not_transcribed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            silent = Path(temp_dir) / 'bass.wav'
+            sf.write(silent, np.zeros(SR * 3, dtype=np.float32), SR)
+            midi_path, summary = transcribe_stem_to_midi(str(silent), model='heuristic_polyphonic')
+            self.assertEqual(summary['skipped'], 'silent')
+            self.assertEqual(len(summary['notes']), 0)
+            self.assertAlmostEqual(summary['skipped_seconds'], 3.0)
+            self.assertTrue(os.path.exists(midi_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from backend.batch import find_inputs, run_batch, Manifest
+from backend.metrics import read_records
+from fakes import copy_separator, silent_drums_separator
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.inputs = Path(self.tmp.name) / 'in'
+        (self.inputs / 'album').mkdir(parents=True)
+        shutil.copy('tests/assets/piano_short.wav', self.inputs / 'a.wav')
+        shutil.copy('tests/assets/sine_notes.wav', self.inputs / 'album' / 'b.wav')
+        (self.inputs / 'notes.txt').write_text('not audio')
+        self.out = Path(self.tmp.name) / 'out'
+        self.options = {'model': 'heuristic_polyphonic', 'separate_fn': copy_separator}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_find_inputs(self):
+        found = find_inputs([self.inputs])
+        self.assertEqual([name for _, name in found], ['a', 'album/b'])
+
+    def test_batch_writes_midi_and_manifest(self):
+        records = []
+        totals = run_batch([self.inputs], self.out, jobs=2, on_record=records.append, **self.options)
+        self.assertEqual((totals['done'], totals['failed'], totals['skipped']), (2, 0, 0))
+        self.assertTrue((self.out / 'a' / 'other.mid').exists())
+        self.assertTrue((self.out / 'album' / 'b' / 'other.mid').exists())
+        self.assertTrue(all(r['realtime_factor'] > 0 for r in records))
+
+        with open(self.out / 'manifest.jsonl') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(sorted(r['input'] for r in lines), sorted(p for p, _ in find_inputs([self.inputs])))
+
+        # Worker processes append their stage records to the run's metrics file
+        stages = [r['stage'] for r in read_records(self.out / 'metrics.jsonl')]
+        self.assertEqual(stages.count('transcribe'), 2)
+        self.assertEqual(stages.count('midi_write'), 2)
+        self.assertIn('audio2midi_stage_wall_seconds_total{stage="transcribe"',
+                      (self.out / 'metrics.prom').read_text())
+
+    def test_silent_stems_are_skipped(self):
+        records = []
+        run_batch([self.inputs / 'a.wav'], self.out, jobs=1, on_record=records.append,
+                  model='heuristic_polyphonic', separate_fn=silent_drums_separator)
+        self.assertEqual(records[0]['silent_stems'], ['drums'])
+        self.assertEqual([stem['stem'] for stem in records[0]['stems']], ['other'])
+        self.assertFalse((self.out / 'a' / 'drums.mid').exists())
+
+    def test_resume_skips_finished_and_retries_failed(self):
+        shutil.copy('tests/assets/sine_notes.wav', self.inputs / 'broken.wav')
+        totals = run_batch([self.inputs], self.out, **self.options)
+        self.assertEqual((totals['done'], totals['failed']), (2, 1))
+
+        # Simulate a crash mid-write: the torn line is ignored
+        with open(self.out / 'manifest.jsonl', 'a') as f:
+            f.write('{"input": "trunc')
+        os.rename(self.inputs / 'broken.wav', self.inputs / 'broken_fixed.wav')
+        shutil.copy('tests/assets/sine_notes.wav', self.inputs / 'c.wav')
+
+        totals = run_batch([self.inputs], self.out, **self.options)
+        self.assertEqual((totals['skipped'], totals['done'], totals['failed']), (2, 1, 1))
+        manifest = Manifest(self.out / 'manifest.jsonl')
+        self.assertTrue(manifest.is_done(str(self.inputs / 'c.wav')))
+
+        # The same file under another spelling of its path
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.inputs)
+            self.assertTrue(manifest.is_done('c.wav'))
+            self.assertTrue(manifest.is_done(os.path.join('album', '..', 'c.wav')))
+        finally:
+            os.chdir(cwd)
+
+        # A changed input is redone
+        os.utime(self.inputs / 'a.wav', ns=(0, 0))
+        totals = run_batch([self.inputs], self.out, **self.options)
+        self.assertEqual(totals['done'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
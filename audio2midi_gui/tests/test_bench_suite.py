@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import soundfile as sf
+from benchmarks.synth import mix, write_asset, SR
+from benchmarks.suite import aggregate, compare, stub_separate_block, save_baseline, load_baseline, THRESHOLDS
+
+
+class TestBenchSuite(unittest.TestCase):
+
+    def test_assets_are_deterministic_and_block_independent(self):
+        whole = mix(1000, 3 * SR)
+        pieces = np.concatenate([mix(1000, SR // 3), mix(1000 + SR // 3, 3 * SR - SR // 3)])
+        np.testing.assert_array_equal(whole, pieces)
+        self.assertFalse(np.array_equal(whole, mix(1000, 3 * SR, seed=1)))
+        self.assertLessEqual(np.abs(whole).max(), 1.0)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            a = write_asset(Path(temp_dir) / 'a.wav', 3, block_seconds=1)
+            b = write_asset(Path(temp_dir) / 'b.wav', 3, block_seconds=2)
+            np.testing.assert_array_equal(sf.read(a)[0], sf.read(b)[0])
+
+    def test_stub_separator_stems_sum_to_mix(self):
+        audio = mix(0, SR).astype(np.float32)[:, None]
+        stems = stub_separate_block(audio, SR)
+        self.assertEqual(sorted(stems), ['bass', 'drums', 'other', 'vocals'])
+        np.testing.assert_allclose(sum(stems.values()), audio, atol=1e-5)
+
+    def test_compare_flags_slowdown_and_memory(self):
+        records = [{'stage': 'transcribe', 'wall_seconds': 2.0, 'cpu_seconds': 2.0, 'audio_seconds': 60.0,
+                    'peak_rss_bytes': 100, 'rss_growth_bytes': 10}]
+        current = aggregate(records, '1m/heuristic_polyphonic')
+        self.assertEqual(current['1m/heuristic_polyphonic/transcribe']['throughput'], 30.0)
+
+        baseline = {'1m/heuristic_polyphonic/transcribe': dict(current['1m/heuristic_polyphonic/transcribe'])}
+        self.assertEqual(compare(current, baseline, THRESHOLDS), [])
+        baseline['1m/heuristic_polyphonic/transcribe'].update(throughput=60.0, peak_rss_bytes=50)
+        self.assertEqual([metric for _, metric, _, _ in compare(current, baseline, THRESHOLDS)],
+                         ['throughput', 'peak_rss_bytes'])
+        # Too short in the baseline to time reliably: only memory is gated
+        baseline['1m/heuristic_polyphonic/transcribe']['wall_seconds'] = 0.01
+        self.assertEqual([metric for _, metric, _, _ in compare(current, baseline, THRESHOLDS)],
+                         ['peak_rss_bytes'])
+
+    def test_missing_rows_and_expected_failures(self):
+        records = [{'stage': 'transcribe', 'wall_seconds': 2.0, 'cpu_seconds': 2.0, 'audio_seconds': 60.0,
+                    'peak_rss_bytes': 100, 'rss_growth_bytes': 10}]
+        current = aggregate(records, '1m/heuristic_polyphonic')
+        baseline = dict(current, **aggregate(records, '1m/mt3'))
+        self.assertEqual(compare(current, baseline, THRESHOLDS), [('1m/mt3/transcribe', 'missing', 30.0, None)])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'baseline.json'
+            save_baseline(path, baseline, THRESHOLDS)
+            # mt3 now fails: its rows are dropped and the failure is expected from then on
+            save_baseline(path, current, THRESHOLDS, [('1m/mt3', 'killed by signal 9')])
+            saved = load_baseline(path)
+            self.assertEqual(list(saved['results']), ['1m/heuristic_polyphonic/transcribe'])
+            self.assertEqual(saved['expected_failures'], {'1m/mt3': 'killed by signal 9'})
+            save_baseline(path, baseline, THRESHOLDS)
+            self.assertEqual(load_baseline(path)['expected_failures'], {})
+
+if __name__ == '__main__':
+    unittest.main()
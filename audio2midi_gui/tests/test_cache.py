@@ -0,0 +1,124 @@
+import os
+import time
+import shutil
+import unittest
+import tempfile
+from unittest import mock
+from pathlib import Path
+from backend.cache import ArtifactStore, StemCache, TranscriptionCache, make_key
+from backend.notes import NoteArray
+from backend.separation import separate
+from backend.transcribe import transcribe_stem_to_midi, NOTES_VERSION
+from backend.utils import hash_audio
+
+class TestCache(unittest.TestCase):
+
+    def test_hash_ignores_filename(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            renamed = Path(temp_dir) / 'renamed.wav'
+            shutil.copy('tests/assets/mix_short.wav', renamed)
+            self.assertEqual(hash_audio(renamed), hash_audio('tests/assets/mix_short.wav'))
+            self.assertNotEqual(hash_audio(renamed), hash_audio('tests/assets/piano_short.wav'))
+
+    def test_stem_cache_roundtrip(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = StemCache(Path(temp_dir) / 'cache')
+            key = cache.key(hash_audio('tests/assets/mix_short.wav'), 'demucs', 4, 'cpu')
+            self.assertNotEqual(key, cache.key(hash_audio('tests/assets/mix_short.wav'), 'spleeter', 4, 'cpu'))
+            self.assertIsNone(cache.fetch(key, Path(temp_dir) / 'miss'))
+
+            summary = [{'path': 'tests/assets/vocal_stem.wav', 'duration': 2.0,
+                        'sample_rate': 44100, 'channels': 1}]
+            cache.store(key, summary, 'demucs')
+
+            out_dir = Path(temp_dir) / 'hit'
+            fetched = cache.fetch(key, out_dir)
+            self.assertEqual(fetched[0]['path'], str(out_dir / 'vocal_stem.wav'))
+            self.assertEqual(fetched[0]['duration'], 2.0)
+            self.assertTrue(os.path.exists(fetched[0]['path']))
+
+    def test_separation_hits_requested_backend_only(self):
+        input_path = 'tests/assets/mix_short.wav'
+        summary = [{'path': 'tests/assets/vocal_stem.wav', 'duration': 2.0, 'sample_rate': 44100, 'channels': 1}]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = StemCache(Path(temp_dir) / 'cache')
+            audio_hash = hash_audio(input_path)
+            self.assertNotEqual(cache.key(audio_hash, 'demucs', 4, 'cpu'),
+                                cache.key(audio_hash, 'demucs', 4, 'cpu', chunk_seconds=30.0))
+            # A Spleeter fallback stored for this input
+            cache.store(cache.key(audio_hash, 'spleeter', 4, 'cpu'), summary, 'spleeter')
+
+            with mock.patch('backend.separation._separate_uncached', return_value=(summary, 'demucs')) as run:
+                separate(input_path, Path(temp_dir) / 'a', device='cpu', backend='spleeter', cache=cache)
+                self.assertEqual(run.call_count, 0)
+                separate(input_path, Path(temp_dir) / 'b', device='cpu', backend='spleeter', cache=cache,
+                         chunk_seconds=30.0)
+                self.assertEqual(run.call_count, 1)
+                separate(input_path, Path(temp_dir) / 'c', device='cpu', backend='demucs', cache=cache)
+                self.assertEqual(run.call_count, 2)
+                separate(input_path, Path(temp_dir) / 'd', device='cpu', backend='demucs', cache=cache)
+                self.assertEqual(run.call_count, 2)
+
+    def test_lru_eviction(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            asset = 'tests/assets/piano_short.wav'
+            size = os.path.getsize(asset)
+            store = ArtifactStore(temp_dir, max_bytes=2 * size + 1024)
+            keys = [make_key('entry', i) for i in range(3)]
+
+            store.put(keys[0], {'a.wav': asset}, {})
+            store.put(keys[1], {'a.wav': asset}, {})
+            # Touch the first entry so the second becomes least recently used
+            past = time.time() - 60
+            os.utime(store.entry_dir(keys[1]) / 'meta.json', (past, past))
+            self.assertIsNotNone(store.get(keys[0]))
+            store.put(keys[2], {'a.wav': asset}, {})
+
+            self.assertIsNotNone(store.get(keys[0]))
+            self.assertIsNone(store.get(keys[1]))
+            self.assertIsNotNone(store.get(keys[2]))
+            self.assertLessEqual(store.size(), store.max_bytes)
+
+    def test_transcription_cache_export(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = TranscriptionCache(temp_dir)
+            key = cache.key('abc', 'heuristic_polyphonic', None, 'cpu', {'time_precision': 10}, NOTES_VERSION)
+            self.assertNotEqual(key, cache.key('abc', 'heuristic_polyphonic', None, 'cpu',
+                                               {'time_precision': 20}, NOTES_VERSION))
+            self.assertIsNone(cache.fetch(key))
+
+            notes = NoteArray.from_arrays([0.0, 1.0], [0.5, 1.5], [60, 64], [0.8, 0.6])
+            cache.store(key, notes, {'tempo': 120.0, 'model_used': 'heuristic_polyphonic', 'instrument': None})
+            fetched, meta = cache.fetch(key)
+            self.assertEqual(list(fetched.pitch), [60, 64])
+            self.assertEqual(meta['tempo'], 120.0)
+
+            slow = cache.export(key, Path(temp_dir) / 'slow.mid', tempo=60.0, program=24)
+            fast = cache.export(key, Path(temp_dir) / 'fast.mid')
+            self.assertNotEqual(Path(slow).read_bytes(), Path(fast).read_bytes())
+            self.assertEqual(cache.stats()['hits'], 3)
+            self.assertEqual(cache.stats()['misses'], 1)
+            self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_transcribe_uses_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            stem = Path(temp_dir) / 'piano.wav'
+            shutil.copy('tests/assets/piano_short.wav', stem)
+            cache = TranscriptionCache(Path(temp_dir) / 'notes')
+
+            midi_path, first = transcribe_stem_to_midi(str(stem), model='heuristic_polyphonic', cache=cache)
+            self.assertEqual(midi_path, str(stem.with_suffix('.mid')))
+            self.assertEqual(first['cache'], 'miss')
+            os.remove(midi_path)
+
+            _, second = transcribe_stem_to_midi(str(stem), model='heuristic_polyphonic', cache=cache)
+            self.assertEqual(second['cache'], 'hit')
+            self.assertTrue(os.path.exists(midi_path))
+            self.assertEqual(list(second['notes'].pitch), list(first['notes'].pitch))
+
+            _, changed = transcribe_stem_to_midi(str(stem), model='heuristic_polyphonic', time_precision=20,
+                                                 cache=cache)
+            self.assertEqual(changed['cache'], 'miss')
+
+if __name__ == '__main__':
+    unittest.main()
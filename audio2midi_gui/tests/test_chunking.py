@@ -0,0 +1,123 @@
+import unittest
+from unittest import mock
+import numpy as np
+import librosa
+from backend.chunking import split_points, chunk_slices, framewise
+from backend.crepe_runner import CrepeRunner
+from backend.features import StemFeatures
+from backend.polyphonic import transcribe_polyphonic, cqt_magnitude, cqt_salience, HOP_LENGTH
+from backend.transcribe import _transcribe_crepe_mono, _transcribe_heuristic, VOICING_THRESHOLD
+
+SR = 22050
+
+
+def phrases(seconds, sr=SR, phrase=7.0, gap=1.0):
+    """Harmonic tones in `phrase`-second runs separated by `gap` seconds of silence."""
+    audio = np.zeros(int(seconds * sr), dtype=np.float32)
+    t = np.arange(int(0.5 * sr)) / sr
+    pitches = [60, 64, 67, 72, 55, 59, 62]
+    for i, start in enumerate(np.arange(0, seconds - 0.5, 0.5)):
+        if start % (phrase + gap) >= phrase:
+            continue
+        freq = librosa.midi_to_hz(pitches[i % len(pitches)])
+        tone = sum(np.sin(2 * np.pi * k * freq * t) / k for k in range(1, 4)) * np.exp(-4 * t)
+        audio[int(start * sr):int(start * sr) + len(t)] = 0.3 * tone
+    return audio
+
+
+class FakeCrepe(CrepeRunner):
+    """Pitch from each frame's zero crossings, so tests need no TensorFlow."""
+
+    def predict_many(self, signals, step_size=None):
+        results = []
+        for audio, sr in signals:
+            frames, voiced = self._frames(audio, sr, step_size)
+            crossings = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1)
+            frequency = np.where(voiced, crossings * sr / (2 * frames.shape[1]), 0.0)
+            results.append((np.arange(len(frames)) * step_size / 1000.0, frequency, voiced * 0.9))
+        return results
+
+
+class UnsureCrepe(FakeCrepe):
+    """FakeCrepe that finds no pitch in the first quarter of every signal and is unsure of the second half."""
+
+    def predict_many(self, signals, step_size=None):
+        results = super().predict_many(signals, step_size)
+        for _, frequency, confidence in results:
+            frequency[:len(frequency) // 4] = 0.0
+            confidence[len(confidence) // 2:] = VOICING_THRESHOLD / 2
+        return results
+
+
+class TestChunking(unittest.TestCase):
+
+    def test_splits_in_silence(self):
+        audio = phrases(70)
+        boundaries = split_points(audio, SR, HOP_LENGTH)
+        self.assertEqual(boundaries[0], 0)
+        self.assertEqual(boundaries[-1], len(audio))
+        self.assertGreater(len(boundaries), 2)
+        for boundary in boundaries[1:-1]:
+            self.assertEqual(boundary % HOP_LENGTH, 0)
+            self.assertEqual(np.abs(audio[boundary - 1000:boundary + 1000]).max(), 0.0)
+
+        self.assertEqual(split_points(audio[:SR * 10], SR, HOP_LENGTH), [0, SR * 10])
+
+    def test_slices_cover_frame_grid(self):
+        boundaries = [0, 5120, 10240, 12345]
+        slices = chunk_slices(12345, boundaries, 512, 1000)
+        self.assertEqual(sum(count for _, _, _, count in slices), 1 + 12345 // 512)
+        self.assertEqual(slices[0][:2], (0, 5120 + 1024))
+
+    def test_framewise_stft_is_exact(self):
+        audio = phrases(70)
+        stft = lambda x: np.abs(librosa.stft(x, n_fft=2048, hop_length=512))
+        stitched = framewise(audio, stft, split_points(audio, SR, 512), 512, 2048, workers=2)
+        np.testing.assert_array_equal(stitched, stft(audio))
+
+    def test_heuristic_matches_single_pass(self):
+        audio = phrases(70)
+        single = transcribe_polyphonic(audio, SR, cqt=cqt_magnitude(audio, SR))
+        chunked = _transcribe_heuristic(StemFeatures(audio=audio, sr=SR, workers=2))
+        self.assertGreater(len(single), 50)
+        np.testing.assert_array_equal(chunked.onset, single.onset)
+        np.testing.assert_array_equal(chunked.offset, single.offset)
+        np.testing.assert_array_equal(chunked.pitch, single.pitch)
+
+    def test_salience_chunks_match_whole_signal(self):
+        # Chunks are reduced to salience one by one; the stitched result is the whole signal's
+        # (every region active, so no frame is gated to zero)
+        audio = phrases(70)
+        features = StemFeatures(audio=audio, sr=SR, workers=2)
+        with mock.patch('backend.features.active_regions', lambda audio, sr: [(0, len(audio))]), \
+                mock.patch('backend.polyphonic.cqt_magnitude', wraps=cqt_magnitude) as cqt:
+            self.assertGreater(len(features.chunks(HOP_LENGTH)[0]), 2)
+            stitched = features.cqt_salience()
+        self.assertTrue(all(len(call.args[0]) < len(audio) for call in cqt.call_args_list))
+        np.testing.assert_allclose(stitched, cqt_salience(audio, SR), rtol=1e-4, atol=1e-4)
+        self.assertFalse(any(key[0].startswith('cqt') for key in features._cache))
+
+    def test_crepe_drops_unvoiced_onsets(self):
+        # Onsets on unpitched or low-confidence frames used to become pitch-0 notes
+        features = StemFeatures(audio=phrases(20), sr=SR)
+        with mock.patch('backend.transcribe.get_runner', return_value=FakeCrepe()):
+            voiced = _transcribe_crepe_mono(features, 10)
+        with mock.patch('backend.transcribe.get_runner', return_value=UnsureCrepe()):
+            unsure = _transcribe_crepe_mono(features, 10)
+        self.assertGreater(len(unsure), 0)
+        self.assertLess(len(unsure), len(voiced))
+        for notes in (voiced, unsure):
+            self.assertTrue((notes.pitch > 0).all())
+
+    def test_crepe_matches_single_pass(self):
+        audio = phrases(70)
+        with mock.patch('backend.transcribe.get_runner', return_value=FakeCrepe()):
+            chunked = _transcribe_crepe_mono(StemFeatures(audio=audio, sr=SR), 10)
+            with mock.patch('backend.features.split_points', lambda audio, sr, hop: [0, len(audio)]):
+                single = _transcribe_crepe_mono(StemFeatures(audio=audio, sr=SR), 10)
+        self.assertGreater(len(single), 50)
+        np.testing.assert_array_equal(chunked.onset, single.onset)
+        np.testing.assert_array_equal(chunked.pitch, single.pitch)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+import importlib.util
+import numpy as np
+import librosa
+from backend.crepe_runner import CrepeRunner, MODEL_SR
+
+class TestCrepeRunner(unittest.TestCase):
+
+    def test_silent_frames_skipped(self):
+        runner = CrepeRunner(step_size=10)
+        t = np.arange(MODEL_SR) / MODEL_SR
+        audio = np.concatenate([np.zeros(MODEL_SR), 0.5 * np.sin(2 * np.pi * 220 * t)]).astype(np.float32)
+        frames, voiced = runner._frames(audio, MODEL_SR, 10)
+        self.assertEqual(frames.shape, (201, 1024))
+        self.assertFalse(voiced[:90].any())
+        self.assertTrue(voiced[110:].all())
+
+    @unittest.skipUnless(importlib.util.find_spec('crepe'), "crepe not installed")
+    def test_batched_matches_single(self):
+        audio, sr = librosa.load('tests/assets/sine_notes.wav', sr=None)
+        runner = CrepeRunner(model_capacity='tiny', batch_frames=64)
+        time, frequency, confidence = runner.predict(audio, sr)
+        batched = runner.predict_many([(audio, sr), (audio[:sr // 2], sr)])
+
+        np.testing.assert_allclose(batched[0][1], frequency, rtol=1e-4)
+        self.assertEqual(len(batched[1][0]), 51)
+        # C4 in the first half second
+        voiced = confidence[5:45] > 0.5
+        self.assertAlmostEqual(np.median(librosa.hz_to_midi(frequency[5:45][voiced])), 60, delta=1)
+
+if __name__ == '__main__':
+    unittest.main()
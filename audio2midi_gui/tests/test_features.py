@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+import numpy as np
+import librosa
+from backend.features import StemFeatures
+from backend.instrument_detect import analyze_stem, extract_features
+
+class TestStemFeatures(unittest.TestCase):
+
+    def test_decode_and_stft_once(self):
+        features = StemFeatures('tests/assets/piano_stem.wav')
+        with mock.patch('librosa.load', wraps=librosa.load) as load, \
+                mock.patch('librosa.stft', wraps=librosa.stft) as stft:
+            analyze_stem('tests/assets/piano_stem.wav', features=features)
+            features.tempo()
+            features.onset_times()
+            features.chroma()
+            analyze_stem('tests/assets/piano_stem.wav', features=features)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(stft.call_count, 1)
+
+    def test_memo_keeps_frame_summaries_only(self):
+        features = StemFeatures('tests/assets/piano_stem.wav')
+        analyze_stem('tests/assets/piano_stem.wav', features=features)
+        features.tempo()
+        features.onset_times()
+        features.chroma()
+
+        audio, sr = features.audio()
+        n_frames = 1 + len(audio) // 512
+        stft_bytes = 1025 * n_frames * 4
+        # Transforms only: arrays that own memory (or the base they view), each counted once
+        owned = {}
+        for key, value in features._cache.items():
+            values = value.values() if isinstance(value, dict) else [value]
+            for array in values:
+                if isinstance(array, np.ndarray) and key[0] != 'audio':
+                    base = array if array.base is None else array.base
+                    owned[id(base)] = base.nbytes
+        self.assertLess(sum(owned.values()), stft_bytes / 4)
+        self.assertNotIn('mel', features._cache[('spectral', None)])
+
+    def test_matches_direct_computation(self):
+        audio, sr = librosa.load('tests/assets/piano_stem.wav', sr=None)
+        features = StemFeatures(audio=audio, sr=sr)
+        np.testing.assert_allclose(features.onset_envelope(),
+                                   librosa.onset.onset_strength(y=audio, sr=sr), rtol=1e-4, atol=1e-4)
+        np.testing.assert_allclose(features.onset_times(),
+                                   librosa.onset.onset_detect(y=audio, sr=sr, units='time'))
+        direct = [np.mean(librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)[0]),
+                  librosa.feature.spectral_centroid(y=audio, sr=sr)[0].mean(),
+                  librosa.feature.zero_crossing_rate(y=audio)[0].mean(),
+                  librosa.feature.rms(y=audio)[0].mean()]
+        np.testing.assert_allclose(extract_features(audio, sr), direct, rtol=1e-3)
+
+    def test_resampled_signal_memoized(self):
+        features = StemFeatures('tests/assets/vocal_stem.wav')
+        audio, sr = features.audio(16000)
+        self.assertEqual(sr, 16000)
+        self.assertIs(features.audio(16000)[0], audio)
+        self.assertEqual(features.sr, 44100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,12 @@
+import tempfile
 import unittest
-from backend.instrument_detect import analyze_stem, choose_transcription_model
+from pathlib import Path
+import numpy as np
+import soundfile as sf
+from backend.features import StemFeatures
+from backend.instrument_detect import (analyze_stem, choose_transcription_model, detect_instruments, read_windows,
+                                       build_classifier, load_classifier, KNNClassifier, training_features,
+                                       training_labels, N_WINDOWS, WINDOW_SECONDS)
 
 class TestInstrumentDetect(unittest.TestCase):
 
@@ -19,5 +26,35 @@ class TestInstrumentDetect(unittest.TestCase):
         model = choose_transcription_model(stem_info)
         self.assertEqual(model, 'crepe_monophonic')
 
+    def test_classifier_roundtrip(self):
+        # The shipped file is the serialized built-in training set
+        shipped = load_classifier()
+        np.testing.assert_array_equal(shipped.features, training_features)
+        self.assertEqual(sorted(shipped.classes), sorted(training_labels))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'knn.npz'
+            build_classifier().save(path)
+            loaded = KNNClassifier.load(path)
+            probe = np.array(training_features) * 1.1
+            self.assertEqual(list(loaded.predict(probe)), list(build_classifier().predict(probe)))
+
+    def test_long_stem_reads_bounded_windows(self):
+        sr = 8000
+        audio = np.random.default_rng(0).uniform(-0.5, 0.5, sr * 120).astype(np.float32)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'long.wav'
+            sf.write(path, audio, sr, subtype='FLOAT')
+            windows, rate = read_windows(path)
+        self.assertEqual(rate, sr)
+        self.assertEqual(windows.shape, (N_WINDOWS, int(WINDOW_SECONDS * sr)))
+        np.testing.assert_array_equal(windows[0], audio[:windows.shape[1]])
+        np.testing.assert_array_equal(windows[-1], audio[-windows.shape[1]:])
+
+    def test_batch_matches_single(self):
+        stems = ['tests/assets/piano_stem.wav', 'tests/assets/vocal_stem.wav', 'tests/assets/mix_short.wav']
+        batched = detect_instruments(stems)
+        self.assertEqual(batched, [analyze_stem(stem) for stem in stems])
+        self.assertEqual(detect_instruments([StemFeatures(stems[0]), stems[1]]), batched[:2])
+
 if __name__ == '__main__':
     unittest.main()
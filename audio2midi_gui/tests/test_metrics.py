@@ -0,0 +1,76 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from backend import metrics
+from backend.transcribe import transcribe_stem_to_midi
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'metrics.jsonl'
+        self.previous = metrics.metrics_path()
+        metrics.configure(self.path)
+
+    def tearDown(self):
+        metrics.configure(self.previous)
+        self.tmp.cleanup()
+
+    def test_stage_record(self):
+        with metrics.stage('separate', 10.0, backend='demucs') as record:
+            time.sleep(0.05)
+            record['cache'] = 'miss'
+        with self.assertRaises(ValueError):
+            with metrics.stage('separate', 10.0, backend='demucs'):
+                raise ValueError("bad input")
+
+        ok, failed = metrics.read_records(self.path)
+        self.assertGreaterEqual(ok['wall_seconds'], 0.05)
+        self.assertAlmostEqual(ok['realtime_factor'], 10.0 / ok['wall_seconds'])
+        self.assertGreaterEqual(ok['cpu_seconds'], 0.0)
+        self.assertGreater(ok['peak_rss_bytes'], 0)
+        self.assertEqual((ok['cache'], ok['pid']), ('miss', os.getpid()))
+        self.assertEqual(failed['error'], 'ValueError')
+
+    def test_prometheus_text(self):
+        records = [
+            {'stage': 'transcribe', 'model': 'crepe_monophonic', 'wall_seconds': 2.0, 'cpu_seconds': 1.5,
+             'audio_seconds': 30.0, 'notes': 40, 'peak_rss_bytes': 100},
+            {'stage': 'transcribe', 'model': 'crepe_monophonic', 'wall_seconds': 1.0, 'cpu_seconds': 0.5,
+             'audio_seconds': 10.0, 'notes': 10, 'peak_rss_bytes': 300, 'error': 'RuntimeError'},
+            {'stage': 'midi_write', 'wall_seconds': 0.01, 'cpu_seconds': 0.01, 'notes': 50, 'peak_rss_bytes': 200},
+        ]
+        text = metrics.prometheus_text(records)
+        self.assertIn('audio2midi_stage_calls_total{stage="transcribe",model="crepe_monophonic"} 2', text)
+        self.assertIn('audio2midi_stage_errors_total{stage="transcribe",model="crepe_monophonic"} 1', text)
+        self.assertIn('audio2midi_stage_wall_seconds_total{stage="transcribe",model="crepe_monophonic"} 3.0', text)
+        self.assertIn('audio2midi_stage_audio_seconds_total{stage="transcribe",model="crepe_monophonic"} 40.0', text)
+        self.assertIn('audio2midi_stage_peak_rss_bytes{stage="transcribe",model="crepe_monophonic"} 300', text)
+        self.assertIn('audio2midi_stage_notes_total{stage="midi_write"} 50', text)
+        self.assertIn('# TYPE audio2midi_stage_peak_rss_bytes gauge', text)
+
+        # Label values are escaped as the text format requires
+        escaped = metrics.prometheus_text([{'stage': 'separate', 'backend': 'my "demucs"\\v2\nbeta'}])
+        self.assertIn('audio2midi_stage_calls_total{stage="separate",backend="my \\"demucs\\"\\\\v2\\nbeta"} 1',
+                      escaped)
+
+        out = Path(self.tmp.name) / 'metrics.prom'
+        metrics.write_prometheus(records, out)
+        self.assertEqual(out.read_text(), text)
+
+    def test_transcription_stages(self):
+        out = Path(self.tmp.name) / 'piano.mid'
+        _, summary = transcribe_stem_to_midi('tests/assets/piano_short.wav', model='heuristic_polyphonic',
+                                             out_midi_path=str(out))
+        records = {r['stage']: r for r in metrics.read_records(self.path)}
+        self.assertEqual(set(records), {'decode', 'tempo', 'transcribe', 'midi_write'})
+        self.assertEqual(records['transcribe']['model'], 'heuristic_polyphonic')
+        self.assertEqual(records['transcribe']['notes'], len(summary['notes']))
+        self.assertAlmostEqual(records['decode']['audio_seconds'], records['transcribe']['audio_seconds'])
+        self.assertGreater(records['transcribe']['realtime_factor'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
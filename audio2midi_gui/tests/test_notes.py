@@ -0,0 +1,69 @@
+import json
+import os
+import unittest
+import tempfile
+import numpy as np
+import pretty_midi
+from pathlib import Path
+from backend.notes import NoteArray
+from backend.midi_writer import write_midi_from_notes
+
+class TestNoteArray(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/assets/notes.json') as f:
+            self.dicts = json.load(f)
+        self.notes = NoteArray.from_dicts(self.dicts)
+
+    def test_from_dicts_both_schemas(self):
+        self.assertEqual(len(self.notes), 3)
+        self.assertEqual(self.notes.tracks, ['piano', 'guitar'])
+        self.assertEqual(self.notes.pitch.tolist(), [60, 62, 64])
+        self.assertEqual(self.notes.velocity.tolist(), [101, 88, 114])
+
+        transcribed = NoteArray.from_dicts([{'onset': 0.1, 'offset': 0.2, 'pitch': 61, 'velocity': 0.5}])
+        self.assertEqual(transcribed[0]['pitch'], 61)
+        self.assertAlmostEqual(transcribed[0]['onset'], 0.1)
+
+        # Export dicts round-trip exactly
+        again = NoteArray.from_dicts(self.notes.to_dicts('export'))
+        np.testing.assert_array_equal(again.data, self.notes.data)
+
+    def test_vectorized_ops(self):
+        shifted = self.notes.shifted(1.0)
+        np.testing.assert_allclose(shifted.onset, [1.0, 1.5, 2.0])
+        np.testing.assert_allclose(self.notes.onset, [0.0, 0.5, 1.0])
+
+        self.assertEqual(self.notes.between(0.6, 1.2).pitch.tolist(), [62, 64])
+
+        merged = NoteArray.concatenate([shifted, self.notes]).sorted()
+        self.assertEqual(merged.onset.tolist(), [0.0, 0.5, 1.0, 1.0, 1.5, 2.0])
+        self.assertEqual(merged.tracks, ['piano', 'guitar'])
+
+        tracks = merged.by_track()
+        self.assertEqual(sorted(tracks), ['guitar', 'piano'])
+        self.assertEqual(len(tracks['piano']), 4)
+        self.assertTrue(np.shares_memory(tracks['piano'].data, tracks['guitar'].data.base))
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'notes.npz')
+            self.notes.save(path)
+            loaded = NoteArray.load(path)
+            np.testing.assert_array_equal(loaded.data, self.notes.data)
+            self.assertEqual(loaded.tracks, self.notes.tracks)
+
+    def test_writer_accepts_both(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            from_dicts = Path(temp_dir) / 'dicts.mid'
+            from_array = Path(temp_dir) / 'array.mid'
+            write_midi_from_notes(self.dicts, str(from_dicts))
+            write_midi_from_notes(self.notes, str(from_array))
+            self.assertEqual(from_dicts.read_bytes(), from_array.read_bytes())
+
+            write_midi_from_notes(self.notes, str(Path(temp_dir) / 'tracks'), separate=True)
+            piano = pretty_midi.PrettyMIDI(str(Path(temp_dir) / 'tracks' / 'piano.mid'))
+            self.assertEqual([n.pitch for n in piano.instruments[0].notes], [60, 62])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import soundfile as sf
+from backend.peaks import PeakPyramid, load_peaks, peaks_path
+
+
+class TestPeaks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'piano.wav')
+        shutil.copy('tests/assets/piano_short.wav', self.path)
+        audio, self.sr = sf.read(self.path, dtype='float32', always_2d=True)
+        self.audio = audio.mean(axis=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_levels_match_brute_force(self):
+        pyramid = PeakPyramid.from_file(self.path, block_frames=1000)
+        self.assertEqual(pyramid.frames, len(self.audio))
+        for level, (mins, maxs) in enumerate(pyramid.levels):
+            size = pyramid.bin_size(level)
+            starts = np.arange(0, len(self.audio), size)
+            np.testing.assert_array_equal(mins, np.minimum.reduceat(self.audio, starts))
+            np.testing.assert_array_equal(maxs, np.maximum.reduceat(self.audio, starts))
+        self.assertGreater(len(pyramid.levels), 1)
+
+    def test_window_is_bounded_by_width(self):
+        pyramid = PeakPyramid.from_file(self.path)
+        for width in (10, 300, 5000):
+            times, mins, maxs = pyramid.window(0, pyramid.duration, width)
+            self.assertLessEqual(len(mins), width)
+            self.assertEqual(mins.min(), self.audio.min())
+            self.assertEqual(maxs.max(), self.audio.max())
+
+        # A zoomed-in window covers its own samples from a finer level
+        times, mins, maxs = pyramid.window(0.5, 0.6, 400)
+        segment = self.audio[int(0.5 * self.sr):int(0.6 * self.sr)]
+        self.assertLessEqual(times[0], 0.5)
+        self.assertLessEqual(mins.min(), segment.min())
+        self.assertGreaterEqual(maxs.max(), segment.max())
+        self.assertEqual(len(pyramid.window(3.0, 4.0, 100)[0]), 0)
+
+    def test_stored_next_to_audio_and_invalidated(self):
+        pyramid = load_peaks(self.path)
+        self.assertTrue(peaks_path(self.path).exists())
+        again = load_peaks(self.path)
+        for (a, b), (c, d) in zip(pyramid.levels, again.levels):
+            np.testing.assert_array_equal(a, c)
+            np.testing.assert_array_equal(b, d)
+
+        sf.write(self.path, np.zeros(1000, dtype=np.float32), self.sr)
+        self.assertEqual(load_peaks(self.path).frames, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
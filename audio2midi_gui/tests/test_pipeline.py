@@ -0,0 +1,53 @@
+import shutil
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from backend.pipeline import Pipeline
+from backend.notes import NoteArray
+from fakes import silent_drums_separator
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input = Path(self.tmp.name) / 'song.wav'
+        shutil.copy('tests/assets/piano_short.wav', self.input)
+        self.pipeline = Pipeline(jobs=1, model='heuristic_polyphonic', separate_fn=silent_drums_separator)
+
+    def tearDown(self):
+        self.pipeline.close()
+        self.tmp.cleanup()
+
+    def test_stream_yields_stage_events_per_stem(self):
+        events = list(self.pipeline.stream(self.input, Path(self.tmp.name) / 'out'))
+        self.assertEqual([(e['type'], e.get('stem')) for e in events],
+                         [('stem_separated', 'other'), ('stem_separated', 'drums'),
+                          ('instrument_detected', 'other'), ('notes_ready', 'other'), ('done', None)])
+        self.assertFalse(events[1]['active'])
+        self.assertEqual(events[2]['model'], 'heuristic_polyphonic')
+        ready = events[3]
+        self.assertIsInstance(ready['notes'], NoteArray)
+        self.assertGreater(len(ready['notes']), 0)
+        self.assertTrue(Path(ready['midi_path']).exists())
+        self.assertEqual((events[4]['stems'], events[4]['failed_stems']), (1, 0))
+
+    def test_astream_matches_stream(self):
+        async def collect():
+            async with Pipeline(jobs=1, model='heuristic_polyphonic', separate_fn=silent_drums_separator) as pipeline:
+                return [e async for e in pipeline.astream(self.input, Path(self.tmp.name) / 'async')]
+
+        events = asyncio.run(collect())
+        self.assertEqual([e['type'] for e in events],
+                         ['stem_separated', 'stem_separated', 'instrument_detected', 'notes_ready', 'done'])
+
+    def test_failed_separation_ends_stream(self):
+        broken = Path(self.tmp.name) / 'broken.wav'
+        shutil.copy(self.input, broken)
+        events = list(self.pipeline.stream(broken, Path(self.tmp.name) / 'broken'))
+        self.assertEqual([e['type'] for e in events], ['failed'])
+        self.assertIn('cannot separate', events[0]['error'])
+
+if __name__ == '__main__':
+    unittest.main()
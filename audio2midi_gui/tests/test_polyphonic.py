@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+import librosa
+from backend.polyphonic import transcribe_polyphonic
+
+SR = 22050
+
+def chord(pitches, seconds=1.0):
+    t = np.arange(int(seconds * SR)) / SR
+    envelope = np.minimum(1.0, t * 50) * np.exp(-3 * t)
+    audio = sum((1.0 / h) * np.sin(2 * np.pi * librosa.midi_to_hz(p) * h * t)
+                for p in pitches for h in range(1, 7))
+    return envelope * audio
+
+class TestPolyphonic(unittest.TestCase):
+
+    def test_chords(self):
+        chords = [[60, 64, 67], [60, 64, 67], [57, 60, 64], [53, 57, 60, 65]]
+        audio = np.concatenate([chord(c) for c in chords]).astype(np.float32)
+        audio /= 2 * np.abs(audio).max()
+
+        notes = transcribe_polyphonic(audio, SR)
+        for i, expected in enumerate(chords):
+            # Notes sounding in the middle of each chord
+            mid = i + 0.5
+            sounding = {n['pitch'] for n in notes if n['onset'] <= mid < n['offset']}
+            self.assertEqual(sounding, set(expected))
+
+        # Repeated chord is re-attacked, not merged into one long note
+        starts = sorted(n['onset'] for n in notes if n['pitch'] == 64)
+        self.assertAlmostEqual(starts[1], 1.0, delta=0.05)
+        for note in notes:
+            self.assertGreater(note['offset'], note['onset'])
+            self.assertTrue(0 < note['velocity'] <= 127)
+
+    def test_silence(self):
+        self.assertEqual(len(transcribe_polyphonic(np.zeros(SR, dtype=np.float32), SR)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
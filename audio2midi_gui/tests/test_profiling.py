@@ -0,0 +1,53 @@
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from backend import profiling
+from backend.transcribe import transcribe_stem_to_midi
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.previous = os.environ.get(profiling.PROFILE_ENV)
+        self.stem = Path(self.tmp.name) / 'piano.wav'
+        shutil.copy('tests/assets/piano_short.wav', self.stem)
+
+    def tearDown(self):
+        profiling.configure(self.previous)
+        self.tmp.cleanup()
+
+    def test_off_writes_nothing(self):
+        profiling.configure(None)
+        with profiling.profiled('transcribe', self.tmp.name, 'piano') as paths:
+            self.assertIsNone(paths)
+        profiling.configure('separate')
+        transcribe_stem_to_midi(str(self.stem), model='heuristic_polyphonic')
+        self.assertEqual(sorted(p.name for p in Path(self.tmp.name).iterdir()), ['piano.mid', 'piano.wav'])
+
+    def test_profiles_written_next_to_midi(self):
+        profiling.configure('transcribe')
+        transcribe_stem_to_midi(str(self.stem), model='heuristic_polyphonic')
+        base = Path(self.tmp.name) / 'piano.transcribe'
+
+        stats = pstats.Stats(f"{base}.prof")
+        self.assertTrue(any(name == 'transcribe_polyphonic' for _, _, name in stats.stats))
+
+        allocations = Path(f"{base}.alloc.txt").read_text()
+        self.assertTrue(allocations.startswith('peak traced:'))
+        self.assertIn('still allocated at exit', allocations)
+
+        lines = Path(f"{base}.folded").read_text().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertEqual(stack.split(';')[0], 'MainThread')
+            # Every sample is taken inside the profiled call; its inner functions are too quick to be sampled reliably
+            self.assertIn(';transcribe_stem_to_midi (', stack)
+
+if __name__ == '__main__':
+    unittest.main()
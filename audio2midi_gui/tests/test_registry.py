@@ -0,0 +1,80 @@
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from backend import registry
+
+HEAVY_MODULES = ['torch', 'tensorflow', 'crepe', 'demucs', 'sklearn', 'matplotlib', 'pygame']
+
+
+class TestRegistry(unittest.TestCase):
+
+    def tearDown(self):
+        registry._factories.pop('test_backend', None)
+        registry._instances.pop('test_backend', None)
+
+    def test_backend_imports_stay_light(self):
+        code = ("import sys, backend.separation, backend.transcribe, backend.instrument_detect, "
+                "backend.midi_writer, backend.registry, tools.export_midi; "
+                f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), '')
+
+    def test_loads_once_under_concurrency(self):
+        calls = []
+
+        def factory():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+        registry.register('test_backend', factory)
+        self.assertFalse(registry.is_loaded('test_backend'))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get('test_backend'))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+        registry.unload('test_backend')
+        self.assertFalse(registry.is_loaded('test_backend'))
+
+    def test_warm_up_reports_failures(self):
+        def factory():
+            raise ImportError("not installed")
+
+        registry.register('test_backend', factory)
+        seen = []
+        registry.warm_up(['test_backend'], on_loaded=lambda name, ok: seen.append((name, ok))).join()
+        self.assertEqual(seen, [('test_backend', False)])
+
+        with self.assertRaises(KeyError):
+            registry.get('no_such_backend')
+
+    def test_warm_worker_reports_each_backend(self):
+        registry.register('test_backend', object)
+        self.assertEqual(registry.warm_worker(['test_backend']), {'test_backend': True})
+        self.assertTrue(registry.is_loaded('test_backend'))
+
+    def test_worker_backends_follow_settings(self):
+        self.assertEqual(registry.worker_backends('demucs', 'auto', 'cpu'),
+                         ['instrument_classifier', 'crepe', 'demucs'])
+        # Separation on CUDA runs in the parent process; fixed models never need CREPE
+        self.assertEqual(registry.worker_backends('demucs', 'onsets_frames', 'cuda'), ['instrument_classifier'])
+        self.assertEqual(registry.worker_backends('spleeter', 'crepe_monophonic', 'cpu'),
+                         ['instrument_classifier', 'crepe'])
+
+    def test_instrument_classifier_is_lazy(self):
+        registry.unload('instrument_classifier')
+        from backend.instrument_detect import analyze_stem
+        self.assertFalse(registry.is_loaded('instrument_classifier'))
+        analyze_stem('tests/assets/piano_stem.wav')
+        self.assertTrue(registry.is_loaded('instrument_classifier'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from backend.scheduler import Scheduler, Task, DONE, FAILED, transcription_resource, submit_conversion, stem_result
+import numpy as np
+from backend.crepe_runner import CrepeRunner
+
+_lock = threading.Lock()
+_running = {'cpu': 0, 'gpu': 0}
+_peak = {'cpu': 0, 'gpu': 0}
+
+
+def work(resource, seconds=0.05, value=None):
+    with _lock:
+        _running[resource] += 1
+        _peak[resource] = max(_peak[resource], _running[resource])
+    time.sleep(seconds)
+    with _lock:
+        _running[resource] -= 1
+    return value
+
+
+def fail():
+    raise RuntimeError("boom")
+
+
+def square(x):
+    return x * x
+
+
+def die():
+    os._exit(1)
+
+
+class CountingCrepe(CrepeRunner):
+    """Fixed 220 Hz on voiced frames, so tests need no TensorFlow; records each call."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def predict_many(self, signals, step_size=None):
+        self.calls.append(len(signals))
+        results = []
+        for audio, sr in signals:
+            frames, voiced = self._frames(audio, sr, step_size)
+            results.append((np.arange(len(frames)) * step_size / 1000.0, np.where(voiced, 220.0, 0.0), voiced * 0.9))
+        return results
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        _peak.update(cpu=0, gpu=0)
+        self.scheduler = Scheduler(cpu_slots=2, gpu_slots=1, processes=False)
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def test_slots_and_dependencies(self):
+        gpu = [self.scheduler.submit(Task(work, args=('gpu',), resource='gpu')) for _ in range(3)]
+        cpu = [self.scheduler.submit(Task(work, args=('cpu',))) for _ in range(4)]
+        last = self.scheduler.submit(Task(work, args=('cpu', 0.0, 'last'), deps=gpu + cpu))
+        self.scheduler.run(timeout=10)
+
+        self.assertEqual(_peak, {'cpu': 2, 'gpu': 1})
+        self.assertEqual(last.result, 'last')
+        self.assertGreaterEqual(last.started_at, max(t.completed_at for t in gpu + cpu))
+        # GPU and CPU work overlapped
+        self.assertLess(max(t.started_at for t in cpu), max(t.completed_at for t in gpu))
+
+    def test_expansion_and_completion(self):
+        finished = []
+
+        def expand(n):
+            return [Task(work, args=('cpu', 0.01, i)) for i in range(n)]
+
+        root = self.scheduler.submit(Task(work, args=('gpu', 0.0, 3), resource='gpu', then=expand,
+                                          on_finish=finished.append))
+        after = self.scheduler.submit(Task(work, args=('cpu', 0.0), deps=[root]))
+        self.scheduler.run(timeout=10)
+
+        self.assertEqual([c.result for c in root.children], [0, 1, 2])
+        self.assertEqual(finished, [root])
+        self.assertGreaterEqual(root.completed_at, max(c.completed_at for c in root.children))
+        self.assertGreaterEqual(after.started_at, root.completed_at)
+
+    def test_failure_propagates(self):
+        root = self.scheduler.submit(Task(work, args=('cpu', 0.0, 1), then=lambda _: [Task(fail)]))
+        dependent = self.scheduler.submit(Task(work, args=('cpu',), deps=[Task(fail)]))
+        self.scheduler.run(timeout=10)
+        self.assertEqual(root.state, 'done')
+        self.assertEqual(root.failures()[0].error, 'boom')
+        self.assertEqual(dependent.state, 'failed')
+
+    def test_inline_tasks_do_not_wait(self):
+        # Each inline task makes the next one ready; none of them may wait out the poll interval
+        def expand(n):
+            return [Task(int, args=(n - 1,), resource='inline', then=expand)] if n > 1 else []
+
+        root = self.scheduler.submit(Task(int, args=(5,), resource='inline', then=expand))
+        after = self.scheduler.submit(Task(square, args=(3,), resource='inline', deps=[root]))
+        started = time.monotonic()
+        self.scheduler.run(timeout=10)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(after.result, 9)
+
+    def test_later_stages_run_first(self):
+        scheduler = Scheduler(cpu_slots=1, processes=False)
+        order = []
+        for name, stage in [('song 1', 0), ('song 2', 0), ('stem', 2)]:
+            scheduler.submit(Task(work, args=('cpu', 0.0), stage=stage,
+                                  on_finish=lambda t, name=name: order.append(name)))
+        scheduler.run(timeout=10)
+        scheduler.shutdown()
+        self.assertEqual(order, ['stem', 'song 1', 'song 2'])
+
+    def test_background_loop_and_cancel(self):
+        self.scheduler.start()
+        done = threading.Event()
+        self.scheduler.submit(Task(work, args=('gpu', 0.2), resource='gpu'))
+        queued = self.scheduler.submit(Task(work, args=('gpu',), resource='gpu', on_finish=lambda t: done.set()))
+        time.sleep(0.05)
+        self.scheduler.cancel()
+        self.assertTrue(done.wait(2))
+        self.assertEqual(queued.state, 'cancelled')
+
+    def test_process_pool(self):
+        scheduler = Scheduler(cpu_slots=2)
+        tasks = [scheduler.submit(Task(square, args=(i,))) for i in range(4)]
+        scheduler.run(timeout=30)
+        scheduler.shutdown()
+        self.assertEqual([t.result for t in tasks], [0, 1, 4, 9])
+
+    def test_dead_worker_fails_tasks(self):
+        scheduler = Scheduler(cpu_slots=1)
+        killed = scheduler.submit(Task(die))
+        # Submitted to the pool after the worker died
+        broken = scheduler.submit(Task(square, args=(2,)))
+        scheduler.run(timeout=30)
+        after = scheduler.submit(Task(square, args=(3,)))
+        scheduler.run(timeout=30)
+        scheduler.shutdown()
+        self.assertEqual((killed.state, broken.state), (FAILED, FAILED))
+        self.assertEqual((after.state, after.result), (DONE, 9))
+        self.assertEqual(scheduler.stats()['busy']['cpu'], 0)
+
+    def test_transcription_resource(self):
+        self.assertEqual(transcription_resource('piano', device='cuda'), 'gpu')
+        self.assertEqual(transcription_resource('piano', device='cpu'), 'cpu')
+        self.assertEqual(transcription_resource('vocals', device='cuda'), 'cpu')
+
+    def test_crepe_stems_share_one_batch(self):
+        runner = CountingCrepe()
+
+        def separator(input_path, out_dir, **kwargs):
+            # Two real stems plus one that cannot be decoded
+            for name in ('vocals', 'other'):
+                shutil.copy('tests/assets/vocal_stem.wav', os.path.join(out_dir, f'{name}.wav'))
+            with open(os.path.join(out_dir, 'bass.wav'), 'wb') as f:
+                f.write(b'not audio')
+            return [{'path': os.path.join(out_dir, f'{name}.wav')} for name in ('vocals', 'other', 'bass')]
+
+        with tempfile.TemporaryDirectory() as out_dir, \
+                mock.patch('backend.transcribe.get_runner', return_value=runner):
+            root = submit_conversion(self.scheduler, 'song.wav', out_dir, device='cpu', model='crepe_monophonic',
+                                     separate_fn=separator)
+            self.scheduler.run(timeout=120)
+
+            results = [stem_result(child) for child in root.children]
+            self.assertEqual(len(runner.calls), 1)
+            self.assertIsNone(results[2])
+            for summary in results[:2]:
+                self.assertEqual(summary['model_used'], 'crepe_monophonic')
+                self.assertTrue(os.path.exists(summary['midi_path']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,20 @@
 import unittest
+import importlib.util
 import os
+import shutil
 import tempfile
+import numpy as np
+import soundfile as sf
+import librosa
+from unittest import mock
 from pathlib import Path
-from backend.separation import separate
+from backend import registry, separation
+from backend.separation import separate, separate_chunked, resident_engine, SeparationEngine, SPLEETER_SR
 
 class TestSeparation(unittest.TestCase):
 
+    @unittest.skipUnless(importlib.util.find_spec('demucs') or importlib.util.find_spec('spleeter'),
+                         "neither demucs nor spleeter installed")
     def test_separate_short_mix(self):
         # Test with the short mix
         input_path = 'tests/assets/mix_short.wav'
@@ -28,5 +37,98 @@ class TestSeparation(unittest.TestCase):
                 self.assertGreater(item['duration'], 0)
                 self.assertEqual(item['sample_rate'], 44100)
 
+    @unittest.skipUnless(importlib.util.find_spec('demucs'), "demucs not installed")
+    def test_engine_reuses_model(self):
+        input_path = 'tests/assets/mix_short.wav'
+        engine = SeparationEngine(device='cpu')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Two inputs with the same name must not share an output directory
+            inputs = [str(Path(temp_dir) / folder / 'song.wav') for folder in ('a', 'b')]
+            for path in inputs:
+                os.makedirs(os.path.dirname(path))
+            shutil.copy(input_path, inputs[0])
+            shutil.copy('tests/assets/piano_short.wav', inputs[1])
+            results = engine.separate_many(inputs, Path(temp_dir) / 'out')
+            model = engine.load()
+            summary = separate(input_path, str(Path(temp_dir) / 'again'), engine=engine)
+
+            self.assertIs(engine.load(), model)
+            for path in inputs:
+                self.assertEqual(len(results[path]), 4)
+            dirs = [{os.path.dirname(item['path']) for item in results[path]} for path in inputs]
+            self.assertEqual(len(dirs[0] | dirs[1]), 2)
+            self.assertEqual(len(summary), 4)
+            for item in summary:
+                self.assertTrue(os.path.exists(item['path']))
+                self.assertEqual(item['sample_rate'], 44100)
+
+    def test_chunked_matches_single_shot(self):
+        input_path = 'tests/assets/mix_short.wav'
+        chunk_seconds = 1.0
+        max_frames = []
+
+        def separate_block(audio, sr):
+            # Linear stand-in for a separator: per-stem gains plus a short FIR
+            max_frames.append(len(audio))
+            smooth = np.apply_along_axis(lambda x: np.convolve(x, [0.25, 0.5, 0.25], 'same'), 0, audio)
+            return {'vocals': 0.5 * audio, 'drums': smooth, 'bass': 0.25 * smooth, 'other': audio - smooth}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            summary = separate_chunked(input_path, temp_dir, separate_block,
+                                       chunk_seconds=chunk_seconds, overlap_seconds=0.25)
+            self.assertEqual(len(summary), 4)
+            self.assertLessEqual(max(max_frames), chunk_seconds * 44100)
+
+            audio, sr = sf.read(input_path, dtype='float32', always_2d=True)
+            reference = separate_block(audio, sr)
+            for item in summary:
+                stem = Path(item['path']).stem
+                stitched, _ = sf.read(item['path'], dtype='float32', always_2d=True)
+                self.assertEqual(stitched.shape, reference[stem].shape)
+                np.testing.assert_allclose(stitched, reference[stem], atol=1e-3)
+
+    def test_chunked_rejects_bad_windows(self):
+        def separate_block(audio, sr):
+            raise AssertionError("nothing should be separated")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for chunk_seconds, overlap_seconds in [(0, 0), (-1.0, 0), (1.0, 1.0), (1.0, 2.0), (1.0, -0.5)]:
+                with self.assertRaises(ValueError):
+                    separate_chunked('tests/assets/mix_short.wav', temp_dir, separate_block,
+                                     chunk_seconds=chunk_seconds, overlap_seconds=overlap_seconds)
+
+    def test_resident_engine_is_kept_per_device(self):
+        with mock.patch.object(separation, 'default_device', return_value='cpu'), \
+                mock.patch.object(separation, 'SeparationEngine') as engine_class, \
+                mock.patch.dict(separation._engines, clear=True):
+            engine_class.side_effect = lambda device: mock.Mock(device=device)
+            engine = resident_engine('cuda')
+            self.assertIs(resident_engine('cuda'), engine)
+            self.assertEqual(engine_class.call_count, 1)
+            engine.load.assert_called_once_with()
+
+    @unittest.skipUnless(importlib.util.find_spec('demucs'), "demucs not installed")
+    def test_chunked_uses_resident_engine(self):
+        input_path = 'tests/assets/mix_short.wav'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            separate(input_path, str(Path(temp_dir) / 'a'), device='cpu', chunk_seconds=1.0)
+            engine = registry.get('demucs')
+            model = engine.load()
+            separate(input_path, str(Path(temp_dir) / 'b'), device='cpu', chunk_seconds=1.0)
+            self.assertIs(registry.get('demucs'), engine)
+            self.assertIs(engine.load(), model)
+
+    @unittest.skipUnless(importlib.util.find_spec('spleeter'), "spleeter not installed")
+    def test_chunked_spleeter_resamples_blocks(self):
+        # Spleeter only takes 44.1 kHz; a 48 kHz input must come out at 44.1 kHz with the same duration
+        audio, sr = sf.read('tests/assets/mix_short.wav', dtype='float32', always_2d=True)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = Path(temp_dir) / 'mix_48k.wav'
+            sf.write(input_path, librosa.resample(audio.T, orig_sr=sr, target_sr=48000).T, 48000)
+            summary = separate(str(input_path), str(Path(temp_dir) / 'stems'), backend='spleeter', chunk_seconds=1.0)
+            for item in summary:
+                self.assertEqual(item['sample_rate'], SPLEETER_SR)
+                self.assertAlmostEqual(item['duration'], len(audio) / sr, delta=0.01)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,115 @@
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from http.client import HTTPConnection
+from pathlib import Path
+from backend import metrics
+from backend.server import ConversionService, make_server
+from fakes import copy_separator
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.previous_metrics = metrics.metrics_path()
+        self.release = threading.Event()
+        self.release.set()
+
+    def tearDown(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        metrics.configure(self.previous_metrics)
+        self.tmp.cleanup()
+
+    def start(self, **kwargs):
+        def separator(*args, **options):
+            self.release.wait(30)
+            return copy_separator(*args, **options)
+
+        self.service = ConversionService(Path(self.tmp.name) / 'work', jobs=1, warm=False,
+                                         model='heuristic_polyphonic', separate_fn=separator, **kwargs)
+        self.server = make_server(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def request(self, method, url, body=None, headers=None):
+        connection = HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=60)
+        connection.request(method, url, body, headers or {})
+        response = connection.getresponse()
+        return response, response.read()
+
+    def test_upload_streams_stem_midi(self):
+        self.start()
+        response, body = self.request('POST', '/jobs?name=song.wav&stream=1',
+                                      Path('tests/assets/piano_short.wav').read_bytes())
+        self.assertEqual(response.status, 202)
+        events = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([e['type'] for e in events], ['queued', 'started', 'stem', 'done'])
+        stem = events[2]
+        self.assertEqual(stem['stem'], 'other')
+        self.assertGreater(stem['notes'], 0)
+
+        response, midi = self.request('GET', stem['midi_url'])
+        self.assertEqual(response.status, 200)
+        self.assertTrue(midi.startswith(b'MThd'))
+        response, combined = self.request('GET', events[3]['midi_url'])
+        self.assertTrue(combined.startswith(b'MThd'))
+
+        # Replayed in full for a client that connects later
+        response, body = self.request('GET', f"/jobs/{stem['job']}/events")
+        self.assertEqual(len(body.decode().splitlines()), 4)
+
+        response, body = self.request('GET', '/status')
+        status = json.loads(body)
+        self.assertEqual(status['jobs']['done'], 1)
+        self.assertEqual(status['queue_depth'], 0)
+        for stage in ('job', 'stem', 'transcribe:heuristic_polyphonic', 'midi_write'):
+            self.assertLessEqual(status['latency'][stage]['p50'], status['latency'][stage]['p99'])
+
+        response, body = self.request('GET', '/metrics')
+        self.assertIn(b'audio2midi_stage_calls_total{stage="transcribe"', body)
+
+    def test_full_queue_is_rejected(self):
+        self.start(max_active=1, max_queued=1)
+        self.release.clear()
+        path = str(Path('tests/assets/piano_short.wav').resolve())
+        headers = {'Content-Type': 'application/json'}
+        states = []
+        for _ in range(3):
+            response, body = self.request('POST', '/jobs', json.dumps({'path': path}), headers)
+            states.append((response.status, json.loads(body).get('state')))
+        self.assertEqual(states[:2], [(202, 'running'), (202, 'queued')])
+        self.assertEqual(states[2][0], 503)
+        self.assertEqual(response.getheader('Retry-After'), '5')
+        self.assertEqual(self.service.status()['queue_depth'], 1)
+
+        response, body = self.request('POST', '/jobs', json.dumps({'path': '/no/such.wav'}), headers)
+        self.assertEqual(response.status, 400)
+
+    def test_job_that_cannot_start_fails(self):
+        # A notes cache "directory" that is a file makes submit_conversion raise
+        blocker = Path(self.tmp.name) / 'not_a_dir'
+        blocker.write_text('')
+        self.start(max_active=1, notes_cache_dir=str(blocker / 'notes'))
+        path = str(Path('tests/assets/piano_short.wav').resolve())
+        response, body = self.request('POST', '/jobs?stream=1', json.dumps({'path': path}),
+                                      {'Content-Type': 'application/json'})
+        events = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([e['type'] for e in events], ['queued', 'started', 'failed'])
+
+        status = self.service.status()
+        self.assertEqual((status['jobs']['failed'], status['active']), (1, 0))
+
+    def test_warm_up_loads_configured_backends(self):
+        self.start(separation_backend='spleeter')
+        with mock.patch('backend.registry.warm_up') as warm_up:
+            self.service.warm_up()
+        # Neither CREPE (fixed model) nor Demucs (Spleeter separation) is loaded
+        self.assertEqual(warm_up.call_args.args[0], ['instrument_classifier'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import librosa
+from concurrent.futures import ProcessPoolExecutor
+from backend.shm import SharedAudioPool, DIR_PREFIX
+from backend.features import StemFeatures
+from backend.scheduler import Scheduler, Task, shared_task, stem_task, stem_result
+
+STEM = 'tests/assets/piano_stem.wav'
+
+
+def worker_view(handle):
+    audio = StemFeatures.from_shared(handle).audio()[0]
+    return float(audio.sum()), audio.flags.writeable
+
+
+def fail(stem_path, audio):
+    raise RuntimeError("worker failed")
+
+
+class TestSharedAudio(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.pool = SharedAudioPool(root=self.root.name)
+
+    def tearDown(self):
+        self.pool.close()
+        self.root.cleanup()
+
+    def test_decode_once_and_map(self):
+        handle = self.pool.put(STEM)
+        self.assertIs(self.pool.put(STEM), handle)
+        audio, sr = librosa.load(STEM, sr=None)
+        np.testing.assert_array_equal(handle.array(), audio)
+        self.assertEqual(handle.sr, sr)
+
+        # Only the handle crosses the process boundary; the worker maps the same samples read-only
+        self.assertLess(len(pickle.dumps(handle)), 512)
+        with ProcessPoolExecutor(1) as executor:
+            total, writeable = executor.submit(worker_view, handle).result()
+        self.assertAlmostEqual(total, float(audio.sum()), places=3)
+        self.assertFalse(writeable)
+
+        features = StemFeatures.from_shared(handle)
+        self.assertEqual(features.tempo(), StemFeatures(STEM).tempo())
+
+    def test_release_and_close(self):
+        handle = self.pool.put(STEM)
+        view = handle.array()
+        self.pool.release(STEM)
+        self.pool.release(STEM)
+        self.assertFalse(os.path.exists(handle.file))
+        # Existing views stay valid after unlinking
+        self.assertEqual(len(view), handle.length)
+        self.pool.put(STEM)
+        self.pool.close()
+        self.assertFalse(self.pool.dir.exists())
+
+    def test_stale_directories_are_swept(self):
+        stale = os.path.join(self.root.name, f"{DIR_PREFIX}999999999-abc")
+        os.mkdir(stale)
+        SharedAudioPool(root=self.root.name).close()
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(self.pool.dir.exists())
+
+    def test_scheduler_releases_after_success_and_failure(self):
+        scheduler = Scheduler(cpu_slots=1, processes=False)
+        ok = scheduler.submit(stem_task(STEM, 'heuristic_polyphonic', out_midi_path=os.path.join(self.root.name, 'p.mid'),
+                                        shared=self.pool))
+        broken = scheduler.submit(shared_task(self.pool, 'tests/assets/vocal_stem.wav',
+                                              lambda audio: Task(fail, args=('tests/assets/vocal_stem.wav', audio))))
+        scheduler.run(timeout=60)
+        scheduler.shutdown()
+        self.assertIsNotNone(stem_result(ok))
+        self.assertIsNone(stem_result(broken))
+        self.assertEqual(len(self.pool), 0)
+        self.assertEqual(os.listdir(self.pool.dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
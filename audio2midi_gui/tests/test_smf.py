@@ -0,0 +1,75 @@
+import json
+import os
+import unittest
+import tempfile
+import numpy as np
+import pretty_midi
+from backend.notes import NoteArray
+from backend.smf import write_smf, times_to_ticks
+from backend.midi_writer import TOOL_VERSION
+
+
+def pretty_midi_bytes(path, notes, tempo, program=0, name='', lyrics=(), texts=()):
+    midi = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+    instrument = pretty_midi.Instrument(program=program, name=name)
+    for onset, offset, pitch, velocity in zip(notes.onset.tolist(), notes.offset.tolist(),
+                                              notes.pitch.tolist(), notes.velocity.tolist()):
+        instrument.notes.append(pretty_midi.Note(velocity=velocity, pitch=pitch, start=onset, end=offset))
+    midi.instruments.append(instrument)
+    for text, time in lyrics:
+        midi.lyrics.append(pretty_midi.Lyric(text, time))
+    for text, time in texts:
+        midi.text_events.append(pretty_midi.Text(text, time))
+    midi.write(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestSMF(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def compare(self, notes, tempo, **kwargs):
+        ours = os.path.join(self.tmp.name, 'ours.mid')
+        ref = os.path.join(self.tmp.name, 'ref.mid')
+        write_smf(ours, notes.onset, notes.offset, notes.pitch, notes.velocity, tempo=tempo,
+                  program=kwargs.get('program', 0), track_name=kwargs.get('name'),
+                  lyrics=kwargs.get('lyrics', ()), texts=kwargs.get('texts', ()),
+                  chunk_events=kwargs.get('chunk_events', 1 << 16))
+        expected = pretty_midi_bytes(ref, notes, tempo, kwargs.get('program', 0), kwargs.get('name') or '',
+                                     kwargs.get('lyrics', ()), kwargs.get('texts', ()))
+        with open(ours, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+    def test_matches_pretty_midi_on_asset(self):
+        with open('tests/assets/notes.json') as f:
+            notes = NoteArray.from_dicts(json.load(f))
+        self.compare(notes, 120, name='Multi-track',
+                     lyrics=[(f"Generated by {TOOL_VERSION}", 0)], texts=[("Track: Multi-track", 0)])
+
+    def test_matches_pretty_midi_on_random_notes(self):
+        rng = np.random.default_rng(0)
+        for tempo in (60.0, 97.3, 120, 143.55):
+            onset = np.round(rng.uniform(0, 30, 500), 2)
+            onset[:5] = 0.0
+            notes = NoteArray.from_arrays(onset, onset + rng.uniform(0.01, 2, 500),
+                                          rng.integers(0, 128, 500), rng.integers(1, 128, 500))
+            # Small chunks exercise the block writer and running status across blocks
+            self.compare(notes, tempo, program=33, name='bass', chunk_events=7)
+
+    def test_empty_and_validation(self):
+        self.compare(NoteArray(), 120)
+        path = os.path.join(self.tmp.name, 'bad.mid')
+        with self.assertRaises(ValueError):
+            write_smf(path, [0.0], [1.0], [128], [100])
+
+    def test_times_to_ticks(self):
+        self.assertEqual(times_to_ticks([-1.0, 0.0, 0.5, 1.0], 120).tolist(), [0, 0, 220, 440])
+
+
+if __name__ == '__main__':
+    unittest.main()
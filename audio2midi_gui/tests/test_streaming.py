@@ -0,0 +1,29 @@
+import unittest
+import soundfile as sf
+from backend.streaming import StreamingTranscriber, blocks_from_file, notes_from_events
+
+class TestStreaming(unittest.TestCase):
+
+    def test_sine_notes_stream(self):
+        stem_path = 'tests/assets/sine_notes.wav'
+        sr = sf.info(stem_path).samplerate
+        transcriber = StreamingTranscriber(sr, block_size=512)
+        events = list(transcriber.stream(blocks_from_file(stem_path, 512)))
+        notes = notes_from_events(events)
+
+        self.assertEqual([n['pitch'] for n in notes], [60, 62, 64])
+        for note, expected in zip(notes, [0, 0.5, 1.0]):
+            self.assertAlmostEqual(note['onset'], expected, delta=0.05)
+
+        # Latency is bounded by the debounce blocks plus one block of compute
+        bound = transcriber.stable_blocks * 512 / sr + 0.05
+        stats = transcriber.latency_stats(events)
+        self.assertLess(stats['note_on_latency_max'], bound)
+
+    def test_silence_emits_nothing(self):
+        transcriber = StreamingTranscriber(44100)
+        events = list(transcriber.stream([[0.0] * 512] * 20))
+        self.assertEqual(events, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import unittest
+from backend.threads import plan, POLICIES
+
+
+class TestThreads(unittest.TestCase):
+
+    def test_plan_splits_core_budget(self):
+        self.assertEqual(plan('throughput', cores=32), {'processes': 32, 'threads': 1})
+        self.assertEqual(plan('latency', cores=32), {'processes': 1, 'threads': 32})
+        self.assertEqual(plan('balanced', cores=32), {'processes': 6, 'threads': 5})
+        # Spare cores go to threads when there are few tasks
+        self.assertEqual(plan('throughput', tasks=4, cores=32), {'processes': 4, 'threads': 8})
+        self.assertEqual(plan('latency', cores=32, processes=4), {'processes': 4, 'threads': 8})
+        for policy in POLICIES:
+            split = plan(policy, cores=3)
+            self.assertLessEqual(split['processes'] * split['threads'], 3)
+        with self.assertRaises(ValueError):
+            plan('fastest')
+
+    def test_limit_threads_before_numpy(self):
+        code = ("from backend.threads import limit_threads; limit_threads(2); import os, numpy; "
+                "print(os.environ['OMP_NUM_THREADS'], os.environ['OPENBLAS_NUM_THREADS'])")
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.split(), ['2', '2'])
+        self.assertNotIn('numpy', subprocess.run(
+            [sys.executable, '-c', "import sys, backend.threads; print(list(sys.modules))"],
+            capture_output=True, text=True, check=True).stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
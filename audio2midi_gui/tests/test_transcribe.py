@@ -1,15 +1,18 @@
 import unittest
 import os
+import tempfile
 from backend.transcribe import transcribe_stem_to_midi
 
 class TestTranscribe(unittest.TestCase):
 
     def test_transcribe_sine_notes(self):
         stem_path = 'tests/assets/sine_notes.wav'
-        midi_path, summary = transcribe_stem_to_midi(stem_path, instrument_hint='piano', model='crepe_monophonic')
+        with tempfile.TemporaryDirectory() as tmp:
+            midi_path, summary = transcribe_stem_to_midi(stem_path, instrument_hint='piano', model='crepe_monophonic',
+                                                         out_midi_path=os.path.join(tmp, 'sine_notes.mid'))
 
-        # Check MIDI exists
-        self.assertTrue(os.path.exists(midi_path))
+            # Check MIDI exists
+            self.assertTrue(os.path.exists(midi_path))
 
         # Check notes
         notes = summary['notes']
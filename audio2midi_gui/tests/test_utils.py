@@ -0,0 +1,45 @@
+import os
+import shutil
+import unittest
+import tempfile
+import numpy as np
+import soundfile as sf
+from pathlib import Path
+from backend.utils import normalize_wav
+
+class TestNormalizeWav(unittest.TestCase):
+
+    def test_matching_stem_untouched(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'vocals.wav'
+            shutil.copy('tests/assets/vocal_stem.wav', path)
+            os.utime(path, (0, 0))
+            info = normalize_wav(path)
+            self.assertEqual(os.path.getmtime(path), 0)
+            self.assertEqual(info['sample_rate'], 44100)
+            self.assertAlmostEqual(info['duration'], 2.0, places=3)
+
+    def test_resample_and_convert(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'other.wav'
+            sr = 22050
+            t = np.arange(2 * sr) / sr
+            tone = 0.5 * np.sin(2 * np.pi * 440 * t)
+            sf.write(str(path), np.stack([tone, tone], axis=1), sr, subtype='FLOAT')
+
+            info = normalize_wav(path, block_frames=1000)
+            file_info = sf.info(str(path))
+            self.assertEqual(file_info.samplerate, 44100)
+            self.assertEqual(file_info.subtype, 'PCM_16')
+            self.assertEqual(file_info.channels, 2)
+            self.assertAlmostEqual(info['duration'], file_info.duration, places=6)
+            self.assertAlmostEqual(file_info.duration, 2.0, delta=0.01)
+
+            audio, _ = sf.read(str(path))
+            spectrum = np.abs(np.fft.rfft(audio[4410:-4410, 0]))
+            peak_hz = np.argmax(spectrum) * 44100 / len(audio[4410:-4410])
+            self.assertAlmostEqual(peak_hz, 440, delta=2)
+            self.assertFalse(os.path.exists(str(path) + '.tmp'))
+
+if __name__ == '__main__':
+    unittest.main()
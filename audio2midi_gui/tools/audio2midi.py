@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Headless audio2midi entry point.
+
+Run from the project root:
+    python -m tools.audio2midi batch songs/ -o out/ --jobs 4
+    python -m tools.audio2midi serve --port 8765
+"""
+import argparse
+import logging
+import sys
+from backend.batch import run_batch
+from backend import profiling
+
+
+def print_record(record):
+    if record['status'] == 'done':
+        cached = sum(stem['cache'] == 'hit' for stem in record['stems'])
+        print(f"{record['input']}: {len(record['stems'])} stems ({cached} from cache, "
+              f"{len(record['silent_stems'])} silent skipped), "
+              f"{record['audio_seconds']:.1f}s audio in {record['seconds']:.1f}s "
+              f"({record['realtime_factor']:.2f}x realtime)", flush=True)
+    else:
+        print(f"{record['input']}: FAILED after {record['seconds']:.1f}s: {record['error']}", flush=True)
+
+
+def batch(args):
+    if args.profile:
+        # Before the workers start, so they inherit it
+        profiling.configure(args.profile)
+    totals = run_batch(args.inputs, args.out, manifest_path=args.manifest, jobs=args.jobs,
+                       policy=args.policy, gpu_slots=args.gpu_slots, resume=not args.no_resume, on_record=print_record,
+                       device=args.device, model=args.model, separation_backend=args.separation,
+                       metrics_path=args.metrics, cache_dir=args.cache_dir, notes_cache_dir=args.notes_cache,
+                       chunk_seconds=args.chunk_seconds)
+    print(f"{totals['done']} done, {totals['failed']} failed, {totals['skipped']} skipped of "
+          f"{totals['files']} files; {totals['audio_seconds']:.1f}s audio in {totals['seconds']:.1f}s "
+          f"({totals['realtime_factor']:.2f}x realtime)")
+    return 1 if totals['failed'] else 0
+
+
+def serve(args):
+    # Imported here: the batch command does not need the HTTP stack
+    from backend.server import ConversionService, make_server
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    service = ConversionService(args.work_dir, jobs=args.jobs, policy=args.policy, max_active=args.max_active,
+                                max_queued=args.max_queued, keep_jobs=args.keep_jobs, path_roots=args.path_root,
+                                device=args.device, model=args.model, separation_backend=args.separation,
+                                cache_dir=args.cache_dir, notes_cache_dir=args.notes_cache,
+                                chunk_seconds=args.chunk_seconds)
+    server = make_server(service, args.host, args.port)
+    logging.info(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="audio2midi", description="Audio to MIDI without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = commands.add_parser("batch", help="Convert files and directories of audio to MIDI")
+    batch_parser.add_argument("inputs", nargs="+", help="Audio files or directories (searched recursively)")
+    batch_parser.add_argument("-o", "--out", required=True, help="Output root; one directory per input")
+    batch_parser.add_argument("-j", "--jobs", type=int,
+                              help="CPU tasks run in parallel; stages of different files overlap "
+                                   "(default: chosen by --policy)")
+    batch_parser.add_argument("--policy", choices=["throughput", "latency", "balanced"], default="throughput",
+                              help="How cores are split between worker processes and intra-op threads")
+    batch_parser.add_argument("--gpu-slots", type=int, default=1, help="GPU tasks run in parallel on CUDA")
+    batch_parser.add_argument("--manifest", help="JSON-lines manifest (default: <out>/manifest.jsonl)")
+    batch_parser.add_argument("--no-resume", action="store_true", help="Redo inputs already in the manifest")
+    batch_parser.add_argument("--device", choices=["cpu", "cuda"], help="Default: auto-detect")
+    batch_parser.add_argument("--model", default="auto", help="Transcription model (default: per instrument)")
+    batch_parser.add_argument("--separation", choices=["demucs", "spleeter"], default="demucs")
+    batch_parser.add_argument("--cache-dir", help="Reuse separated stems across runs from this cache")
+    batch_parser.add_argument("--notes-cache",
+                              help="Reuse transcribed notes across runs from this cache (keyed by stem content, "
+                                   "model and parameters)")
+    batch_parser.add_argument("--metrics",
+                              help="Per-stage metrics as JSON lines (default: <out>/metrics.jsonl); "
+                                   "a Prometheus textfile is written next to it as .prom")
+    batch_parser.add_argument("--profile", nargs="?", const="all", choices=["all", *profiling.KINDS],
+                              help="Write cProfile, tracemalloc and sampled stack files next to the outputs of "
+                                   "every separate and/or transcribe call (slow; for one problem file)")
+    batch_parser.add_argument("--chunk-seconds", type=float, help="Separate long files in windows of this length")
+    batch_parser.set_defaults(func=batch)
+
+    serve_parser = commands.add_parser("serve", help="Run a local HTTP conversion service with warm models")
+    serve_parser.add_argument("--host", default="127.0.0.1",
+                              help="Address to bind (0.0.0.0 inside a container; there is no authentication)")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--work-dir", default="server_work", help="Uploads, stems, MIDI and metrics")
+    serve_parser.add_argument("-j", "--jobs", type=int,
+                              help="CPU worker processes, each keeping its models loaded "
+                                   "(default: chosen by --policy)")
+    serve_parser.add_argument("--policy", choices=["throughput", "latency", "balanced"], default="throughput",
+                              help="How cores are split between worker processes and intra-op threads")
+    serve_parser.add_argument("--max-active", type=int, default=2, help="Conversions running at once")
+    serve_parser.add_argument("--max-queued", type=int, default=32,
+                              help="Conversions waiting for a slot; further requests get 503 and Retry-After")
+    serve_parser.add_argument("--keep-jobs", type=int, default=100, help="Finished jobs whose outputs are kept")
+    serve_parser.add_argument("--path-root", action="append",
+                              help="Allow converting local files under this directory (repeatable; "
+                                   "default: any path)")
+    serve_parser.add_argument("--device", choices=["cpu", "cuda"], help="Default: auto-detect")
+    serve_parser.add_argument("--model", default="auto", help="Default transcription model (default: per instrument)")
+    serve_parser.add_argument("--separation", choices=["demucs", "spleeter"], default="demucs")
+    serve_parser.add_argument("--cache-dir", help="Reuse separated stems from this cache")
+    serve_parser.add_argument("--notes-cache", help="Reuse transcribed notes from this cache")
+    serve_parser.add_argument("--chunk-seconds", type=float, help="Separate long files in windows of this length")
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
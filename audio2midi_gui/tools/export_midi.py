@@ -2,10 +2,11 @@
 import argparse
 import json
 from backend.midi_writer import write_midi_from_notes
+from backend.notes import NoteArray
 
 def main():
-    parser = argparse.ArgumentParser(description="Export MIDI from JSON notes")
-    parser.add_argument("notes_json", help="Path to JSON file with notes")
+    parser = argparse.ArgumentParser(description="Export MIDI from JSON or .npz notes")
+    parser.add_argument("notes_json", help="Path to JSON file with notes, or a NoteArray .npz")
     parser.add_argument("out_path", help="Output MIDI path or directory")
     parser.add_argument("--tempo", type=float, default=120, help="Tempo BPM")
     parser.add_argument("--program", type=int, default=0, help="GM program")
@@ -13,8 +14,11 @@ def main():
 
     args = parser.parse_args()
 
-    with open(args.notes_json, 'r') as f:
-        notes = json.load(f)
+    if args.notes_json.endswith('.npz'):
+        notes = NoteArray.load(args.notes_json)
+    else:
+        with open(args.notes_json, 'r') as f:
+            notes = json.load(f)
 
     write_midi_from_notes(notes, args.out_path, args.tempo, args.program, args.separate)
 